@@ -6,19 +6,34 @@ import sys
 import threading
 import traceback
 import time
+import atexit
+import csv
+import io
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta
 from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from flask import Flask, render_template, request, jsonify, g, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, g, has_request_context, send_from_directory, stream_with_context
 from werkzeug.middleware.proxy_fix import ProxyFix
 import pyodbc
 import subprocess
 from dotenv import load_dotenv
-from functools import lru_cache
-from queue import Queue, Empty
 load_dotenv()
 
 import printed_db
+from connection_profile import ConnectionResolver, NoDriverError
+from db_pool import ConnectionPool, PoolManager, PoolError
+from circuit_breaker import CircuitBreaker
+from bulkhead import Bulkhead, BulkheadFull, WaitQueue
+from deadline import Deadline, DeadlineCounters, DeadlineExceeded, HEADER as DEADLINE_HEADER, parse_timeout_ms
+from print_engine import PrintEngine, PrintEngineError, PrintEngineTimeout, create_backend
+from print_jobs import PrintJobManager, PrintJobError
+from wave_print import WaveManager, WaveItemError
+from lookup_cache import TTLCache, BackgroundRefresher, SingleFlight, MISSING
+from quotation_mirror import QuotationMirror
+from quotation_index import QuotationIndex
+from party_master import PartyMaster
+from warmup import WarmUp
 from update_manager import UpdateManager, UpdateChecker
 
 IS_FROZEN = getattr(sys, 'frozen', False)
@@ -30,88 +45,121 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32).hex()
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max request size
     DATABASE_CONNECTION_TIMEOUT = 30
-    REQUEST_TIMEOUT = 60
+    REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', '60'))  # Upper bound for X-Request-Timeout-Ms
+    DEADLINE_LOOKUP = float(os.environ.get('DEADLINE_LOOKUP', '8'))  # Default budget for lookups
+    DEADLINE_PRINT = float(os.environ.get('DEADLINE_PRINT', '10'))  # /print and /scan-print up to queueing the job
+    
+    # Concurrent requests per endpoint class; BULKHEAD_QUEUE more per class (BULKHEAD_QUEUE_TOTAL
+    # across all classes) may wait BULKHEAD_QUEUE_TIMEOUT seconds
+    BULKHEAD_LOOKUP = int(os.environ.get('BULKHEAD_LOOKUP', '4'))
+    BULKHEAD_PRINT = int(os.environ.get('BULKHEAD_PRINT', '2'))
+    BULKHEAD_HISTORY = int(os.environ.get('BULKHEAD_HISTORY', '2'))
+    BULKHEAD_ADMIN = int(os.environ.get('BULKHEAD_ADMIN', '1'))
+    BULKHEAD_WAVE = int(os.environ.get('BULKHEAD_WAVE', '2'))  # Open wave progress streams
+    BULKHEAD_QUEUE = int(os.environ.get('BULKHEAD_QUEUE', '2'))
+    BULKHEAD_QUEUE_TOTAL = int(os.environ.get('BULKHEAD_QUEUE_TOTAL', '4'))
+    BULKHEAD_QUEUE_TIMEOUT = float(os.environ.get('BULKHEAD_QUEUE_TIMEOUT', '2'))
+    # Waitress threads: every bulkhead's running requests and the shared wait queue,
+    # plus 4 for unclassified endpoints (health, job status polling, static files)
+    THREADS = int(os.environ.get('THREADS') or (
+        BULKHEAD_LOOKUP + BULKHEAD_PRINT + BULKHEAD_HISTORY + BULKHEAD_ADMIN + BULKHEAD_WAVE
+        + BULKHEAD_QUEUE_TOTAL + 4))
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
     ENVIRONMENT = os.environ.get('FLASK_ENV', 'production')
     # Connection pool settings
     DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
     DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '2'))  # DB_POOL_SIZE is the maximum
+    DB_POOL_VALIDATE_IDLE = int(os.environ.get('DB_POOL_VALIDATE_IDLE', '30'))  # Seconds idle before a checkout pings
+    DB_POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))
+    DB_POOL_IDLE_TIMEOUT = int(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+    DB_POOL_KEEPALIVE_INTERVAL = int(os.environ.get('DB_POOL_KEEPALIVE_INTERVAL', '60'))
+    DB_POOL_GROW_AFTER_MS = int(os.environ.get('DB_POOL_GROW_AFTER_MS', '20'))
+    # Circuit breaker for SQL Server outages
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '3'))
+    CIRCUIT_PROBE_INTERVAL = int(os.environ.get('CIRCUIT_PROBE_INTERVAL', '10'))
+    CIRCUIT_PROBE_TIMEOUT = int(os.environ.get('CIRCUIT_PROBE_TIMEOUT', '3'))
+    # Print engine settings
+    PRINT_BACKEND = os.environ.get('PRINT_BACKEND', 'bartender').lower()
+    PRINT_ENGINE_MAX_JOBS = int(os.environ.get('PRINT_ENGINE_MAX_JOBS', '500'))
+    PRINT_ENGINE_TIMEOUT = int(os.environ.get('PRINT_ENGINE_TIMEOUT', '60'))
+    # Print job queue settings
+    PRINT_WORKERS = int(os.environ.get('PRINT_WORKERS', '2'))
+    PRINT_JOB_HISTORY = int(os.environ.get('PRINT_JOB_HISTORY', '500'))
+    PRINT_MAX_ATTEMPTS = int(os.environ.get('PRINT_MAX_ATTEMPTS', '4'))
+    PRINT_RETRY_BASE_DELAY = float(os.environ.get('PRINT_RETRY_BASE_DELAY', '1'))
+    PRINT_RETRY_MAX_DELAY = float(os.environ.get('PRINT_RETRY_MAX_DELAY', '30'))
+    PRINT_JOB_TTL = float(os.environ.get('PRINT_JOB_TTL', '0'))  # Seconds a queued job may take to print (0 = no limit)
+    # Wave printing: lookup batches run this many at a time (stays below DB_POOL_SIZE so /lookup keeps a connection)
+    WAVE_LOOKUP_CONCURRENCY = int(os.environ.get('WAVE_LOOKUP_CONCURRENCY') or max(1, int(os.environ.get('DB_POOL_SIZE', '5')) - 1))
+    WAVE_LOOKUP_BATCH = int(os.environ.get('WAVE_LOOKUP_BATCH', '25'))  # Quotations per lookup query
+    WAVE_PRINT_TIMEOUT = int(os.environ.get('WAVE_PRINT_TIMEOUT', '600'))  # Seconds a wave waits for one label's job
+    WAVE_MAX_ITEMS = int(os.environ.get('WAVE_MAX_ITEMS', '500'))
+    WAVE_HISTORY = int(os.environ.get('WAVE_HISTORY', '20'))
+    # Quotation lookup cache
+    LOOKUP_CACHE_SIZE = int(os.environ.get('LOOKUP_CACHE_SIZE', '1000'))
+    LOOKUP_CACHE_TTL = int(os.environ.get('LOOKUP_CACHE_TTL', '300'))
+    LOOKUP_CACHE_NEGATIVE_TTL = int(os.environ.get('LOOKUP_CACHE_NEGATIVE_TTL', '30'))
+    LOOKUP_CACHE_HARD_TTL = int(os.environ.get('LOOKUP_CACHE_HARD_TTL', '3600'))
+    LOOKUP_REFRESH_CONCURRENCY = int(os.environ.get('LOOKUP_REFRESH_CONCURRENCY', '2'))
+    LOOKUP_BATCH_MAX = int(os.environ.get('LOOKUP_BATCH_MAX', '200'))
+    LOOKUP_BATCH_CHUNK = int(os.environ.get('LOOKUP_BATCH_CHUNK', '500'))  # SQL Server allows 2100 parameters
+    # Party details cached per customer code
+    PARTY_MASTER_SIZE = int(os.environ.get('PARTY_MASTER_SIZE', '20000'))
+    PARTY_MASTER_REFRESH_INTERVAL = int(os.environ.get('PARTY_MASTER_REFRESH_INTERVAL', '900'))
+    # Local mirror of ERP quotations (answers lookups while SQL Server is unreachable)
+    QUOTATION_MIRROR_ENABLED = os.environ.get('QUOTATION_MIRROR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    QUOTATION_MIRROR_INTERVAL = int(os.environ.get('QUOTATION_MIRROR_INTERVAL', '60'))
+    QUOTATION_MIRROR_BATCH = int(os.environ.get('QUOTATION_MIRROR_BATCH', '5000'))
+    QUOTATION_MIRROR_INITIAL_ROWS = int(os.environ.get('QUOTATION_MIRROR_INITIAL_ROWS', '50000'))
+    QUOTATION_MIRROR_FULL_RESYNC_HOURS = float(os.environ.get('QUOTATION_MIRROR_FULL_RESYNC_HOURS', '24'))
+    # Bloom filter of existing quotation numbers (answers definite misses from memory)
+    QUOTATION_INDEX_ENABLED = os.environ.get('QUOTATION_INDEX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    QUOTATION_INDEX_INTERVAL = int(os.environ.get('QUOTATION_INDEX_INTERVAL', '30'))
+    QUOTATION_INDEX_CAPACITY = int(os.environ.get('QUOTATION_INDEX_CAPACITY', '500000'))
+    QUOTATION_INDEX_FP_RATE = float(os.environ.get('QUOTATION_INDEX_FP_RATE', '0.01'))
+    QUOTATION_INDEX_BATCH = int(os.environ.get('QUOTATION_INDEX_BATCH', '50000'))
+    QUOTATION_INDEX_REBUILD_HOURS = float(os.environ.get('QUOTATION_INDEX_REBUILD_HOURS', '24'))
+    # Print history listing/export
+    PRINTED_RECORDS_MAX_PAGE_SIZE = int(os.environ.get('PRINTED_RECORDS_MAX_PAGE_SIZE', '500'))
+    # Start-up warm-up (pool connections and lookup cache preload, in the background)
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    WARMUP_RECENT_QUOTATIONS = int(os.environ.get('WARMUP_RECENT_QUOTATIONS', '500'))
+    WARMUP_PRINTED_QUOTATIONS = int(os.environ.get('WARMUP_PRINTED_QUOTATIONS', '200'))
+
+def _create_db_pool():
+    return ConnectionPool(
+        pyodbc.connect,
+        min_size=Config.DB_POOL_MIN_SIZE,
+        max_size=Config.DB_POOL_SIZE,
+        validate_idle=Config.DB_POOL_VALIDATE_IDLE,
+        max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+        idle_timeout=Config.DB_POOL_IDLE_TIMEOUT,
+        keepalive_interval=Config.DB_POOL_KEEPALIVE_INTERVAL,
+        grow_after=Config.DB_POOL_GROW_AFTER_MS / 1000
+    )
 
-# Database Connection Pool
-class DatabaseConnectionPool:
-    """Thread-safe connection pool for SQL Server"""
-    def __init__(self, pool_size=5):
-        self.pool_size = pool_size
-        self.pool = Queue(maxsize=pool_size)
-        self.lock = threading.Lock()
-        self.active_connections = 0
-        self.conn_string = None
-        
-    def initialize(self, conn_string):
-        """Initialize the connection pool with a connection string"""
-        self.conn_string = conn_string
-        # Pre-create connections
-        for _ in range(self.pool_size):
-            try:
-                conn = pyodbc.connect(conn_string)
-                self.pool.put(conn)
-                self.active_connections += 1
-            except Exception as e:
-                print(f"Failed to create pooled connection: {e}")
-                break
-    
-    def get_connection(self, timeout=30):
-        """Get a connection from the pool"""
-        try:
-            conn = self.pool.get(timeout=timeout)
-            # Test if connection is still valid
-            try:
-                cursor = conn.cursor()
-                cursor.execute("SELECT 1")
-                cursor.fetchone()
-                cursor.close()
-                return conn
-            except:
-                # Connection is stale, create a new one
-                try:
-                    conn.close()
-                except:
-                    pass
-                if self.conn_string:
-                    conn = pyodbc.connect(self.conn_string)
-                    return conn
-                else:
-                    raise Exception("Connection pool not initialized")
-        except Empty:
-            # Pool is empty, create a temporary connection
-            if self.conn_string:
-                return pyodbc.connect(self.conn_string)
-            else:
-                raise Exception("Connection pool not initialized and no connection string available")
-    
-    def return_connection(self, conn):
-        """Return a connection to the pool"""
+# Global connection pool (see db_pool.py); replaced in the background when the database changes
+db_pool = PoolManager(_create_db_pool, on_switch=lambda: _reset_database_state())
+atexit.register(db_pool.shutdown)
+
+def _on_driver_changed():
+    """Another driver connected where the preferred one failed; move the pool over to it."""
+    if db_pool.conn_string is not None:
         try:
-            # Try to return to pool, but don't block if full
-            self.pool.put_nowait(conn)
-        except:
-            # Pool is full, close the connection
-            try:
-                conn.close()
-            except:
-                pass
-    
-    def close_all(self):
-        """Close all connections in the pool"""
-        while not self.pool.empty():
-            try:
-                conn = self.pool.get_nowait()
-                conn.close()
-            except:
-                pass
+            db_pool.switch(_build_conn_str(), notify=False)
+        except PartyLookupError:
+            pass
+
+# One place for ODBC driver detection and connection strings
+conn_resolver = ConnectionResolver(pyodbc.drivers, pyodbc.connect, on_change=_on_driver_changed)
 
-# Global connection pool
-db_pool = DatabaseConnectionPool(pool_size=Config.DB_POOL_SIZE)
+# Global BarTender print engine (one long-lived BarTender instance on its own STA thread)
+print_engine = PrintEngine(
+    create_backend(Config.PRINT_BACKEND),
+    max_jobs_per_engine=Config.PRINT_ENGINE_MAX_JOBS
+)
+atexit.register(print_engine.stop)
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -179,6 +227,11 @@ def setup_comprehensive_logging():
     access_logger = logging.getLogger('access')
     for handler in access_logger.handlers[:]:
         access_logger.removeHandler(handler)
+
+    component_loggers = [logging.getLogger(name) for name in ('print_engine', 'print_jobs', 'lookup_cache', 'db_pool', 'connection_profile', 'circuit_breaker', 'quotation_mirror', 'quotation_index', 'party_master', 'warmup')]
+    for component_logger in component_loggers:
+        for handler in component_logger.handlers[:]:
+            component_logger.removeHandler(handler)
     
     # Create formatters
     detailed_formatter = logging.Formatter(
@@ -253,6 +306,12 @@ def setup_comprehensive_logging():
     access_logger.addHandler(access_handler)
     access_logger.setLevel(logging.INFO)
     access_logger.propagate = False
+
+    for component_logger in component_loggers:
+        component_logger.addHandler(app_handler)
+        component_logger.addHandler(error_handler)
+        component_logger.setLevel(logging.INFO)
+        component_logger.propagate = False
     
     # Suppress noisy third-party loggers
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
@@ -264,12 +323,81 @@ def setup_comprehensive_logging():
 db_logger, access_logger = setup_comprehensive_logging()
 app.logger.info('Label Print Server starting up in %s mode', Config.ENVIRONMENT)
 
+# Default deadline per endpoint; the X-Request-Timeout-Ms header overrides it
+# (for any endpoint), capped at REQUEST_TIMEOUT
+ENDPOINT_DEADLINES = {
+    'lookup': Config.DEADLINE_LOOKUP,
+    'lookup_batch': Config.DEADLINE_LOOKUP,
+    'print_label_route': Config.DEADLINE_PRINT,
+    'scan_print': Config.DEADLINE_PRINT,
+}
+deadline_counters = DeadlineCounters()
+
+# Endpoint classes with their own concurrency limit (see bulkhead.py); cheap
+# endpoints (health, metrics, job status polling, static files) are not limited
+bulkhead_queue = WaitQueue(Config.BULKHEAD_QUEUE_TOTAL)
+bulkheads = {
+    name: Bulkhead(name, limit, Config.BULKHEAD_QUEUE, Config.BULKHEAD_QUEUE_TIMEOUT, bulkhead_queue)
+    for name, limit in (
+        ('lookup', Config.BULKHEAD_LOOKUP),
+        ('print', Config.BULKHEAD_PRINT),
+        ('history', Config.BULKHEAD_HISTORY),
+        ('admin', Config.BULKHEAD_ADMIN),
+        ('wave', Config.BULKHEAD_WAVE),
+    )
+}
+ENDPOINT_BULKHEADS = {
+    'lookup': 'lookup',
+    'lookup_batch': 'lookup',
+    'preview_label': 'lookup',
+    'print_label_route': 'print',
+    'scan_print': 'print',
+    'retry_print_job': 'print',
+    'dismiss_print_job': 'print',
+    'start_wave': 'print',
+    'cancel_wave': 'print',
+    'wave_events': 'wave',
+    'printed_records': 'history',
+    'printed_records_export': 'history',
+    'printed_records_search': 'history',
+    'dead_letter_jobs': 'history',
+    'get_printers': 'admin',
+    'save_settings': 'admin',
+    'test_connection': 'admin',
+    'check_updates': 'admin',
+    'install_update': 'admin',
+    'update_config': 'admin',
+    'lookup_cache_invalidate': 'admin',
+    'quotation_mirror_resync': 'admin',
+}
+_bulkhead_threads = min(
+    sum(bulkhead.capacity for bulkhead in bulkheads.values()),
+    sum(bulkhead.max_concurrent for bulkhead in bulkheads.values()) + bulkhead_queue.max_waiting
+)
+if Config.THREADS < _bulkhead_threads:
+    app.logger.warning(f'THREADS={Config.THREADS} is below the {_bulkhead_threads} threads the bulkheads '
+                       f'can hold; slow lookups or history queries may still delay other requests')
+
+def _request_deadline():
+    """Deadline of the current request, or None (background work has none)."""
+    return g.get('deadline') if has_request_context() else None
+
 # Production middleware and error handling
 @app.before_request
 def before_request():
     """Log request and set up request context"""
     g.start_time = time.time()
     g.request_id = os.urandom(8).hex()
+    seconds = parse_timeout_ms(request.headers.get(DEADLINE_HEADER), Config.REQUEST_TIMEOUT)
+    if seconds is None:
+        seconds = ENDPOINT_DEADLINES.get(request.endpoint)
+    g.deadline = Deadline(seconds, deadline_counters) if seconds else None
+    
+    bulkhead = bulkheads.get(ENDPOINT_BULKHEADS.get(request.endpoint))
+    if bulkhead is not None:
+        # Never queue longer than the request is willing to wait
+        bulkhead.acquire(timeout=g.deadline.remaining() if g.deadline else None)
+        g.bulkhead = bulkhead
     
     # Only log non-health-check requests in production to reduce noise
     if Config.LOG_LEVEL == 'DEBUG' or (request.endpoint and request.endpoint not in ['static', 'health_check', 'metrics']):
@@ -321,6 +449,13 @@ def after_request(response):
     
     return response
 
+@app.teardown_request
+def release_bulkhead(error=None):
+    """Free the request's bulkhead slot (after streamed responses finish)."""
+    bulkhead = g.pop('bulkhead', None)
+    if bulkhead is not None:
+        bulkhead.release()
+
 @app.errorhandler(404)
 def not_found_error(error):
     app.logger.warning('404 error: %s requested %s', request.remote_addr, request.url)
@@ -331,6 +466,24 @@ def internal_error(error):
     app.logger.error('500 error on %s: %s', request.url, str(error), exc_info=True)
     return jsonify({'error': 'Internal server error'}), 500
 
+@app.errorhandler(BulkheadFull)
+def bulkhead_full(error):
+    app.logger.warning('Rejected %s %s: %s bulkhead full', request.method, request.path, error.name)
+    response = jsonify({
+        'status': 'error',
+        'error': str(error),
+        'message': f'Server busy, please retry in {error.retry_after}s',
+        'bulkhead': error.name,
+        'retry_after': error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(error):
+    app.logger.warning('Deadline exceeded (%s) on %s %s', error.stage, request.method, request.path)
+    return jsonify({'error': str(error), 'stage': error.stage, 'deadline_exceeded': True}), 504
+
 @app.errorhandler(Exception)
 def unhandled_exception(error):
     app.logger.error('Unhandled exception: %s', str(error), exc_info=True)
@@ -482,6 +635,14 @@ def has_db_settings():
     """Return True when the SQL Server settings are available."""
     return bool(DB_SERVER and DB_NAME)
 
+def _reset_database_state():
+    """Drop cached lookups, the quotation mirror and index of the previous database."""
+    invalidate_party_info()
+    if quotation_mirror is not None:
+        quotation_mirror.reset()
+    if quotation_index is not None:
+        quotation_index.reset()
+
 def save_db_settings(server, database, printer=None, bartender_template=None, bartender_heavy_template=None):
     """Save database, printer and BarTender settings to file and update cache"""
     global DB_SERVER, DB_NAME, SELECTED_PRINTER, BARTENDER_TEMPLATE, BARTENDER_HEAVY_TEMPLATE, _settings_cache
@@ -497,6 +658,12 @@ def save_db_settings(server, database, printer=None, bartender_template=None, ba
         with open(SETTINGS_FILE, 'w') as f:
             json.dump(settings, f)
         
+        templates_changed = (
+            bartender_template != BARTENDER_TEMPLATE
+            or bartender_heavy_template != BARTENDER_HEAVY_TEMPLATE
+        )
+        database_changed = server != DB_SERVER or database != DB_NAME
+        
         # Update global variables and cache atomically
         with _settings_lock:
             DB_SERVER = server
@@ -511,6 +678,18 @@ def save_db_settings(server, database, printer=None, bartender_template=None, ba
             _settings_cache['bartender_heavy_template'] = bartender_heavy_template
             _settings_cache['last_loaded'] = time.time()
         
+        # Reopen BarTender formats so saved template changes take effect immediately
+        if templates_changed:
+            print_engine.invalidate_formats()
+        # Build a pool for the new database in the background; cached lookups
+        # are dropped once it is in place (see _reset_database_state)
+        if database_changed:
+            try:
+                db_pool.switch(_build_conn_str())
+            except PartyLookupError as e:
+                print(f"Server: Connection pool not switched: {e}")
+                _reset_database_state()
+        
         print(f"Server: Saved settings - Server: {server}, DB: {database}, Printer: {printer}")
         print(f"Server: BarTender Template: {bartender_template}")
         print(f"Server: BarTender Heavy Items Template: {bartender_heavy_template}")
@@ -529,6 +708,9 @@ try:
 except Exception as e:
     print(f'Server: Failed initializing printed DB: {e}')
 
+# Flush queued history/journal writes on exit (runs after the print workers stop)
+atexit.register(printed_db.shutdown)
+
 # Log startup configuration
 startup_msg = [
     "="*50,
@@ -568,186 +750,667 @@ for line in startup_msg:
                     app.logger.name, logging.INFO, __file__, 0, line, (), None
                 ))
 
-# LRU cache for quotation lookups (cache up to 100 recent lookups for 5 minutes)
-@lru_cache(maxsize=100)
-def _get_party_info_cached(quotation_number, cache_key):
-    """Internal cached function for party info lookup - cache_key forces cache refresh"""
-    return _get_party_info_impl(quotation_number)
+class PartyLookupError(Exception):
+    """The quotation could not be looked up (configuration or database error).
 
-def _get_party_info_impl(quotation_number):
-    """Implementation of party info lookup with connection pooling"""
-    start_time = time.time()
-    
-    # Format quotation number as 25-character string with 'G-' prefix, right-aligned
-    formatted_vch_no = f"G-{quotation_number}".rjust(25)
-    
-    if Config.LOG_LEVEL == 'DEBUG':
-        db_logger.debug('Database lookup started: quotation=%s, formatted=%s', quotation_number, formatted_vch_no)
-    
+    Distinguishes failures, which must not be cached, from "not found".
+    """
+
+# Quotation lookups, cached per quotation (see lookup_cache.py)
+party_cache = TTLCache(
+    maxsize=Config.LOOKUP_CACHE_SIZE,
+    ttl=Config.LOOKUP_CACHE_TTL,
+    negative_ttl=Config.LOOKUP_CACHE_NEGATIVE_TTL,
+    stale_ttl=max(0, Config.LOOKUP_CACHE_HARD_TTL - Config.LOOKUP_CACHE_TTL)
+)
+
+# Concurrent lookups of the same VchNo share one query
+party_lookups = SingleFlight()
+
+def _format_vch_no(quotation_number):
+    """Tran2.VchNo for a quotation: 'G-' prefix, right-aligned to 25 characters."""
+    return f"G-{quotation_number}".rjust(25)
+
+def _build_conn_str():
+    """Connection string for the configured database using the preferred driver.
+
+    Raises PartyLookupError when the database is not configured or no SQL
+    Server ODBC driver is installed.
+    """
     # Check if database settings are configured
     if not DB_SERVER or not DB_NAME:
         load_db_settings(force_reload=True)
 
     if not DB_SERVER or not DB_NAME:
         db_logger.error('Database configuration missing: server=%s, database=%s', DB_SERVER, DB_NAME)
-        return None
+        raise PartyLookupError('Database is not configured')
     
-    # Use the most compatible ODBC driver available
-    available_drivers = pyodbc.drivers()
-    driver = None
-    
-    # Prioritize drivers and use appropriate authentication
-    if 'ODBC Driver 18 for SQL Server' in available_drivers:
-        driver = 'ODBC Driver 18 for SQL Server'
-        conn_str = (
-            f"DRIVER={{{driver}}};"
-            f"SERVER={DB_SERVER};"
-            f"DATABASE={DB_NAME};"
-            f"Trusted_Connection=yes;"
-            f"TrustServerCertificate=yes;"
-            f"Connection Timeout={Config.DATABASE_CONNECTION_TIMEOUT};"
-        )
-    elif 'ODBC Driver 17 for SQL Server' in available_drivers:
-        driver = 'ODBC Driver 17 for SQL Server'
-        conn_str = (
-            f"DRIVER={{{driver}}};"
-            f"SERVER={DB_SERVER};"
-            f"DATABASE={DB_NAME};"
-            f"Integrated Security=SSPI;"
-            f"Connection Timeout={Config.DATABASE_CONNECTION_TIMEOUT};"
-        )
-    elif 'SQL Server' in available_drivers:
-        driver = 'SQL Server'
-        conn_str = (
-            f"DRIVER={{{driver}}};"
-            f"SERVER={DB_SERVER};"
-            f"DATABASE={DB_NAME};"
-            f"Trusted_Connection=yes;"
-            f"Connection Timeout={Config.DATABASE_CONNECTION_TIMEOUT};"
-        )
+    # Driver detection and the connection string are memoized (see connection_profile.py)
+    try:
+        return conn_resolver.resolve(DB_SERVER, DB_NAME, Config.DATABASE_CONNECTION_TIMEOUT).conn_str
+    except NoDriverError as e:
+        raise PartyLookupError(str(e)) from e
+
+# Login/network failures that mean SQL Server is unreachable (HYT00: login timeout)
+CONNECTIVITY_SQLSTATES = ('08001', '08S01', 'HYT00')
+
+def _is_connectivity_error(e):
+    return bool(e.args) and str(e.args[0]) in CONNECTIVITY_SQLSTATES
+
+def _probe_sql_server():
+    """Circuit breaker probe: a short-timeout connect and SELECT 1, outside the pool."""
+    conn, _ = conn_resolver.connect(DB_SERVER, DB_NAME, timeout=Config.CIRCUIT_PROBE_TIMEOUT, fallback=False)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    finally:
+        conn.close()
+
+# Called with the new state ('open'/'closed'), e.g. by the tray app
+circuit_listeners = []
+
+def _on_circuit_change(state):
+    if state == 'open':
+        db_logger.error('SQL Server unreachable: lookups fail fast and use the cache/mirror until it recovers')
     else:
-        db_logger.error('No SQL Server ODBC drivers found. Available drivers: %s', available_drivers)
-        return None
-    
-    # Initialize connection pool if needed
-    if db_pool.conn_string != conn_str:
-        db_pool.close_all()
-        db_pool.initialize(conn_str)
+        db_logger.info('SQL Server reachable again: lookups resumed')
+    for listener in list(circuit_listeners):
+        try:
+            listener(state)
+        except Exception as e:
+            db_logger.warning('Circuit listener failed: %s', e)
+
+# Fast-fail for SQL Server outages (see circuit_breaker.py)
+db_breaker = CircuitBreaker(
+    _probe_sql_server,
+    failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+    probe_interval=Config.CIRCUIT_PROBE_INTERVAL,
+    on_change=_on_circuit_change
+)
+atexit.register(db_breaker.stop)
+
+@contextmanager
+def _lookup_connection(timeout=5):
+    """Check out a pooled SQL Server connection, falling back to a direct one.
+
+    Inside a request the checkout, the login of a direct connection and the
+    queries (Connection.timeout) are limited to the request's remaining
+    deadline; DeadlineExceeded is raised once it is spent.
+    """
+    conn_str = _build_conn_str()
+    
+    # Fail in milliseconds while SQL Server is known to be unreachable
+    if not db_breaker.allow():
+        raise PartyLookupError('SQL Server is unreachable (circuit open)')
+    
+    deadline = _request_deadline()
+    if deadline is not None:
+        timeout = deadline.cap(timeout, 'pool')
     
     conn = None
     use_pool = True
+    connection_start = time.time()
     
     try:
-        connection_start = time.time()
+        # Create the first pool (once, even if warm-up and a request race); later
+        # database changes switch pools from save_db_settings
+        db_pool.start(conn_str)
         
-        # Try to get connection from pool
+        # Try to get connection from pool; with a deadline, growing the pool
+        # may not spend longer logging in than the budget that is left
         try:
-            conn = db_pool.get_connection(timeout=5)
+            conn = db_pool.get_connection(timeout=timeout, limit_login=deadline is not None)
             connection_time = time.time() - connection_start
             if Config.LOG_LEVEL == 'DEBUG':
                 db_logger.debug('Got pooled connection in %.3f seconds', connection_time)
-        except:
-            # Fallback to direct connection if pool fails
-            conn = pyodbc.connect(conn_str)
+        except PoolError:
+            if deadline is None:
+                # Fallback to direct connection if the pool is exhausted
+                conn = pyodbc.connect(conn_str)
+            else:
+                # pyodbc's timeout argument is the login timeout
+                conn = pyodbc.connect(conn_str, timeout=deadline.whole_seconds('pool'))
             use_pool = False
             connection_time = time.time() - connection_start
             db_logger.warning('Used direct connection (pool unavailable) in %.3f seconds', connection_time)
-        
-        cursor = conn.cursor()
-        
-        # Optimized: Use a single JOIN query instead of 3 sequential queries
-        query_start = time.time()
-        optimized_query = """
-            SELECT 
-                m.Name, m.Code,
-                a.Address1, a.Address2, a.Address3, a.Address4,
-                a.Telno, a.Mobile
-            FROM dbo.Tran2 t
-            INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
-            LEFT JOIN MasterAddressInfo a ON m.Code = a.MasterCode
-            WHERE t.VchType = '26' AND t.MasterCode2 = '201' AND t.VchNo = ?
-        """
-        
-        if Config.LOG_LEVEL == 'DEBUG':
-            db_logger.debug('Executing optimized query with parameter: %s', formatted_vch_no)
-        
-        cursor.execute(optimized_query, formatted_vch_no)
-        row = cursor.fetchone()
-        query_time = time.time() - query_start
-        
-        if not row:
-            if Config.LOG_LEVEL == 'DEBUG':
-                db_logger.info('No quotation found for %s (query completed in %.3fs)', quotation_number, query_time)
-            return None
-        
-        # Compile party information from single query result
-        party_info = {
-            'name': row.Name if row.Name else '',
-            'code': row.Code if row.Code else '',
-            'address1': row.Address1 if row.Address1 else '',
-            'address2': row.Address2 if row.Address2 else '',
-            'address3': row.Address3 if row.Address3 else '',
-            'address4': row.Address4 if row.Address4 else '',
-            'phone': row.Telno if row.Telno else '',
-            'mobile': row.Mobile if row.Mobile else ''
-        }
-        
-        total_time = time.time() - start_time
-        db_logger.info('Retrieved customer info for quotation %s in %.3fs: %s', 
-                      quotation_number, total_time, party_info['name'])
-        
-        return party_info
-        
     except pyodbc.Error as e:
-        error_code = e.args[0] if e.args else 'Unknown'
-        error_msg = e.args[1] if len(e.args) > 1 else str(e)
-        elapsed_time = time.time() - start_time
-        
-        # Log detailed error information
+        if deadline is not None and str(e.args[0] if e.args else '') == 'HYT00' and deadline.expired():
+            # Login cut short by our own deadline, not a sign that SQL Server is down
+            deadline.exceeded('pool')
+        if _is_connectivity_error(e):
+            db_breaker.record_failure(e)
+        raise
+    
+    broken = False
+    try:
+        if deadline is not None:
+            conn.timeout = deadline.whole_seconds('query')
+        yield conn
+    except pyodbc.Error as e:
+        error_code = str(e.args[0]) if e.args else ''
+        if deadline is not None and error_code == 'HYT00' and deadline.expired():
+            # Our own query timeout, not a sign that SQL Server is down
+            deadline.exceeded('query')
+        # SQLSTATE class 08: the connection itself is gone, do not pool it again
+        broken = error_code.startswith('08')
+        if _is_connectivity_error(e):
+            db_breaker.record_failure(e)
+        raise
+    else:
+        db_breaker.record_success()
+    finally:
+        try:
+            if deadline is not None and not broken:
+                conn.timeout = 0
+            if use_pool:
+                # Return connection to pool
+                db_pool.return_connection(conn, discard=broken)
+            else:
+                # Close direct connection
+                conn.close()
+        except Exception as close_error:
+            db_logger.warning('Error handling connection cleanup: %s', close_error)
+
+def _log_lookup_error(e, what, elapsed_time):
+    """Log a failed lookup and return the PartyLookupError to raise."""
+    if not isinstance(e, pyodbc.Error):
         db_logger.error(
-            'Database error for quotation %s (%.3fs): Code=%s, Message=%s',
-            quotation_number, elapsed_time, error_code, error_msg
+            'Unexpected database error for %s (%.3fs): %s',
+            what, elapsed_time, str(e), exc_info=True
         )
-        
-        # Provide specific error messages based on error codes
-        if error_code in ['08001', '08S01']:
-            db_logger.error('Network connectivity issue to SQL Server %s', DB_SERVER)
-        elif error_code == '18456':
-            db_logger.error('Authentication failed for database %s', DB_NAME)
-        elif error_code == '28000':
-            db_logger.error('Login failed - likely authentication method issue')
-        elif error_code == 'IM002':
-            db_logger.error('ODBC driver compatibility issue')
+        return PartyLookupError(str(e))
+
+    error_code = e.args[0] if e.args else 'Unknown'
+    error_msg = e.args[1] if len(e.args) > 1 else str(e)
+    
+    # Log detailed error information
+    db_logger.error(
+        'Database error for %s (%.3fs): Code=%s, Message=%s',
+        what, elapsed_time, error_code, error_msg
+    )
+    
+    # Provide specific error messages based on error codes
+    if error_code in ['08001', '08S01']:
+        db_logger.error('Network connectivity issue to SQL Server %s', DB_SERVER)
+    elif error_code == '18456':
+        db_logger.error('Authentication failed for database %s', DB_NAME)
+    elif error_code == '28000':
+        db_logger.error('Login failed - likely authentication method issue')
+    elif error_code == 'IM002':
+        db_logger.error('ODBC driver compatibility issue')
+    else:
+        db_logger.error('Unhandled database error: %s', error_msg)
+    
+    return PartyLookupError(f'Database error {error_code}: {error_msg}')
+
+# Per quotation only the VchNo -> party code mapping is queried; party
+# details come from party_master (one shared record per customer)
+PARTY_CODE_QUERY = """
+    SELECT t.CM1
+    FROM dbo.Tran2 t
+    INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201' AND t.VchNo = ?
+"""
+
+# Set-based variant for /lookup-batch; the IN list is filled per chunk
+PARTY_CODE_BATCH_QUERY = """
+    SELECT t.VchNo, t.CM1
+    FROM dbo.Tran2 t
+    INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201' AND t.VchNo IN ({placeholders})
+"""
+
+# Party details for the codes not yet in party_master
+PARTY_MASTER_QUERY = """
+    SELECT 
+        m.Name, m.Code,
+        a.Address1, a.Address2, a.Address3, a.Address4,
+        a.Telno, a.Mobile
+    FROM Master1 m
+    LEFT JOIN MasterAddressInfo a ON m.Code = a.MasterCode
+    WHERE m.MasterType = 2 AND m.Code IN ({placeholders})
+"""
+
+def _party_info_from_row(row):
+    """Compile party information from a lookup query row."""
+    return {
+        'name': row.Name if row.Name else '',
+        'code': row.Code if row.Code else '',
+        'address1': row.Address1 if row.Address1 else '',
+        'address2': row.Address2 if row.Address2 else '',
+        'address3': row.Address3 if row.Address3 else '',
+        'address4': row.Address4 if row.Address4 else '',
+        'phone': row.Telno if row.Telno else '',
+        'mobile': row.Mobile if row.Mobile else ''
+    }
+
+def _query_party_masters(cursor, codes, chunk_size=None):
+    """Fetch party details for codes; returns a list of party info dicts."""
+    chunk_size = chunk_size or Config.LOOKUP_BATCH_CHUNK
+    codes = list(codes)
+    found = {}
+    for i in range(0, len(codes), chunk_size):
+        chunk = codes[i:i + chunk_size]
+        cursor.execute(PARTY_MASTER_QUERY.format(placeholders=', '.join('?' * len(chunk))), *chunk)
+        for row in cursor.fetchall():
+            # First address row per party wins, as in the original single JOIN
+            found.setdefault(str(row.Code).strip(), _party_info_from_row(row))
+    return list(found.values())
+
+def _resolve_parties(cursor, codes, reload=False):
+    """Map party codes to shared PartyRecords, loading unknown ones (or all, with reload) in one query."""
+    records = {}
+    unknown = []
+    for code in set(codes):
+        record = None if reload else party_master.get(code)
+        if record is None:
+            unknown.append(code)
         else:
-            db_logger.error('Unhandled database error: %s', error_msg)
-        
-        return None
-        
+            records[code] = record
+    if unknown:
+        by_key = {str(code).strip(): code for code in unknown}
+        for info in _query_party_masters(cursor, unknown):
+            code = by_key.get(str(info['code']).strip())
+            if code is not None:
+                records[code] = party_master.put(info)
+    return records
+
+def _fetch_party_masters(codes):
+    """party_master refresh loader: reload details for resident codes."""
+    start_time = time.time()
+    try:
+        with _lookup_connection(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            return _query_party_masters(conn.cursor(), codes)
+    except PartyLookupError:
+        raise
     except Exception as e:
-        elapsed_time = time.time() - start_time
-        db_logger.error(
-            'Unexpected database error for quotation %s (%.3fs): %s',
-            quotation_number, elapsed_time, str(e), exc_info=True
-        )
+        raise _log_lookup_error(e, 'party master refresh', time.time() - start_time) from e
+
+# Party details cached per customer code (see party_master.py)
+party_master = PartyMaster(
+    _fetch_party_masters,
+    refresh_interval=Config.PARTY_MASTER_REFRESH_INTERVAL,
+    maxsize=Config.PARTY_MASTER_SIZE
+)
+party_master.start()
+atexit.register(party_master.stop)
+
+def _get_party_info_impl(quotation_number, reload_party=False):
+    """Implementation of party info lookup with connection pooling.
+
+    Returns the shared PartyRecord, or None if the quotation does not exist.
+    Raises PartyLookupError when the lookup itself failed. reload_party
+    reads the party details again even when party_master has them.
+    """
+    start_time = time.time()
+    
+    # Format quotation number as 25-character string with 'G-' prefix, right-aligned
+    formatted_vch_no = _format_vch_no(quotation_number)
+    
+    if Config.LOG_LEVEL == 'DEBUG':
+        db_logger.debug('Database lookup started: quotation=%s, formatted=%s', quotation_number, formatted_vch_no)
+    
+    try:
+        with _lookup_connection() as conn:
+            cursor = conn.cursor()
+            
+            query_start = time.time()
+            if Config.LOG_LEVEL == 'DEBUG':
+                db_logger.debug('Executing party code query with parameter: %s', formatted_vch_no)
+            
+            cursor.execute(PARTY_CODE_QUERY, formatted_vch_no)
+            row = cursor.fetchone()
+            record = _resolve_parties(cursor, [row.CM1], reload=reload_party).get(row.CM1) if row else None
+            query_time = time.time() - query_start
+    except (PartyLookupError, DeadlineExceeded):
+        raise
+    except Exception as e:
+        raise _log_lookup_error(e, f'quotation {quotation_number}', time.time() - start_time) from e
+    
+    if record is None:
+        if Config.LOG_LEVEL == 'DEBUG':
+            db_logger.info('No quotation found for %s (query completed in %.3fs)', quotation_number, query_time)
         return None
-        
-    finally:
-        if conn:
-            try:
-                if use_pool:
-                    # Return connection to pool
-                    db_pool.return_connection(conn)
-                else:
-                    # Close direct connection
-                    conn.close()
-            except Exception as close_error:
-                db_logger.warning('Error handling connection cleanup: %s', close_error)
+    
+    total_time = time.time() - start_time
+    db_logger.info('Retrieved customer info for quotation %s in %.3fs: %s', 
+                  quotation_number, total_time, record.name)
+    
+    return record
+
+# Mirror sync: newest quotations first, then everything above the high-water mark
+MIRROR_LATEST_QUERY = """
+    SELECT DISTINCT TOP (?)
+        t.VchNo, m.Name, m.Code,
+        a.Address1, a.Address2, a.Address3, a.Address4,
+        a.Telno, a.Mobile
+    FROM dbo.Tran2 t
+    INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
+    LEFT JOIN MasterAddressInfo a ON m.Code = a.MasterCode
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201'
+    ORDER BY t.VchNo DESC
+"""
+
+MIRROR_AFTER_QUERY = """
+    SELECT DISTINCT TOP (?)
+        t.VchNo, m.Name, m.Code,
+        a.Address1, a.Address2, a.Address3, a.Address4,
+        a.Telno, a.Mobile
+    FROM dbo.Tran2 t
+    INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
+    LEFT JOIN MasterAddressInfo a ON m.Code = a.MasterCode
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201' AND t.VchNo > ?
+    ORDER BY t.VchNo
+"""
+
+def _fetch_mirror_rows(after_vch_no, limit):
+    """Quotation rows for the local mirror (see quotation_mirror.QuotationMirror)."""
+    start_time = time.time()
+    try:
+        with _lookup_connection(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            cursor = conn.cursor()
+            if after_vch_no is None:
+                cursor.execute(MIRROR_LATEST_QUERY, limit)
+            else:
+                cursor.execute(MIRROR_AFTER_QUERY, limit, after_vch_no)
+            return [(row.VchNo, _party_info_from_row(row)) for row in cursor.fetchall()]
+    except PartyLookupError:
+        raise
+    except Exception as e:
+        raise _log_lookup_error(e, 'quotation mirror sync', time.time() - start_time) from e
+
+# Every quotation number, ascending, for the in-memory quotation index
+QUOTATION_INDEX_QUERY = """
+    SELECT DISTINCT TOP (?) t.VchNo
+    FROM dbo.Tran2 t
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201' AND t.VchNo > ?
+    ORDER BY t.VchNo
+"""
+
+def _fetch_quotation_numbers(after_vch_no, limit):
+    """VchNo values for the quotation index (see quotation_index.QuotationIndex)."""
+    start_time = time.time()
+    try:
+        with _lookup_connection(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            cursor = conn.cursor()
+            cursor.execute(QUOTATION_INDEX_QUERY, limit, after_vch_no)
+            return [row.VchNo for row in cursor.fetchall() if row.VchNo]
+    except PartyLookupError:
+        raise
+    except Exception as e:
+        raise _log_lookup_error(e, 'quotation index refresh', time.time() - start_time) from e
+
+def _get_party_info_batch_impl(quotation_numbers, chunk_size=None):
+    """Look up many quotations with one pooled connection and chunked IN queries.
+
+    Returns {quotation: PartyRecord or None}. Raises PartyLookupError when
+    the lookup failed.
+    """
+    chunk_size = chunk_size or Config.LOOKUP_BATCH_CHUNK
+    start_time = time.time()
+    by_vch_no = {_format_vch_no(q).strip(): q for q in quotation_numbers}
+    codes = {}
+    vch_nos = [_format_vch_no(q) for q in by_vch_no.values()]
+    
+    try:
+        with _lookup_connection() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(vch_nos), chunk_size):
+                chunk = vch_nos[i:i + chunk_size]
+                cursor.execute(PARTY_CODE_BATCH_QUERY.format(placeholders=', '.join('?' * len(chunk))), *chunk)
+                for row in cursor.fetchall():
+                    # Same as the single lookup: the first matching row wins
+                    quotation = by_vch_no.get((row.VchNo or '').strip())
+                    if quotation is not None:
+                        codes.setdefault(quotation, row.CM1)
+            records = _resolve_parties(cursor, codes.values())
+    except (PartyLookupError, DeadlineExceeded):
+        raise
+    except Exception as e:
+        raise _log_lookup_error(e, f'{len(vch_nos)} quotations', time.time() - start_time) from e
+    
+    results = {q: records.get(codes[q]) if q in codes else None for q in quotation_numbers}
+    db_logger.info('Batch lookup of %d quotations (%d found) in %.3fs',
+                   len(vch_nos), sum(1 for v in results.values() if v), time.time() - start_time)
+    return results
 
 def get_party_info(quotation_number):
-    """Look up customer information from database with caching and connection pooling"""
-    # Use cache with 5-minute TTL (cache_key changes every 5 minutes)
-    cache_key = int(time.time() / 300)  # 300 seconds = 5 minutes
-    return _get_party_info_cached(quotation_number, cache_key)
+    """Look up customer information from database with caching and connection pooling.
+
+    Returns None both for unknown quotations (cached briefly) and for failed
+    lookups (not cached, so the next call retries). Entries past
+    LOOKUP_CACHE_TTL are served stale (up to LOOKUP_CACHE_HARD_TTL) while
+    they are refreshed in the background. Raises DeadlineExceeded when the
+    request's deadline runs out before SQL Server answered.
+    """
+    key = str(quotation_number).strip()
+    record, stale = party_cache.get_with_state(key)
+    if record is MISSING:
+        try:
+            record = _load_party_info(key)
+        except PartyLookupError:
+            return None
+        party_cache.set(key, record)
+    elif stale:
+        party_refresher.schedule(key)
+    return party_master.current(record).to_dict() if record is not None else None
+
+def _load_party_info(quotation_number):
+    """Read the local mirror, else query SQL Server (shared with concurrent lookups of the same VchNo)."""
+    vch_no = _format_vch_no(quotation_number)
+    if _definitely_missing(vch_no):
+        return None
+    party_info = _mirror_get(vch_no)
+    if party_info is not None:
+        # Mirror rows can be a day old: never let them overwrite a resident record
+        return party_master.setdefault(party_info)
+    deadline = _request_deadline()
+    if deadline is None:
+        record = party_lookups.do(vch_no, lambda: _get_party_info_impl(quotation_number))
+    else:
+        try:
+            # Waiting for someone else's query of the same VchNo is bounded too
+            record = party_lookups.do(vch_no, lambda: _get_party_info_impl(quotation_number),
+                                      timeout=deadline.cap(None, 'lookup'))
+        except TimeoutError:
+            deadline.exceeded('lookup')
+    if record is None and quotation_index is not None:
+        quotation_index.record_miss(vch_no)
+    return record
+
+def _definitely_missing(vch_no):
+    """True when the quotation index knows vch_no does not exist."""
+    return quotation_index is not None and quotation_index.definitely_missing(vch_no)
+
+def _mirror_get(vch_no):
+    if quotation_mirror is None:
+        return None
+    try:
+        return quotation_mirror.get(vch_no)
+    except Exception as e:
+        db_logger.warning('Quotation mirror lookup failed: %s', e)
+        return None
+
+# Local SQLite mirror of recent ERP quotations, kept next to the print history
+quotation_mirror = None
+if Config.QUOTATION_MIRROR_ENABLED:
+    try:
+        quotation_mirror = QuotationMirror(
+            os.path.join(os.path.dirname(printed_db.DB_FILE), 'quotation_mirror.db'),
+            _fetch_mirror_rows,
+            interval=Config.QUOTATION_MIRROR_INTERVAL,
+            batch_size=Config.QUOTATION_MIRROR_BATCH,
+            initial_rows=Config.QUOTATION_MIRROR_INITIAL_ROWS,
+            full_resync_interval=Config.QUOTATION_MIRROR_FULL_RESYNC_HOURS * 3600
+        )
+        quotation_mirror.start()
+        atexit.register(quotation_mirror.stop)
+    except Exception as e:
+        quotation_mirror = None
+        print(f'Server: Quotation mirror disabled: {e}')
+
+# Bloom filter of every quotation number, refreshed incrementally from SQL Server
+quotation_index = None
+if Config.QUOTATION_INDEX_ENABLED:
+    quotation_index = QuotationIndex(
+        _fetch_quotation_numbers,
+        interval=Config.QUOTATION_INDEX_INTERVAL,
+        capacity=Config.QUOTATION_INDEX_CAPACITY,
+        fp_rate=Config.QUOTATION_INDEX_FP_RATE,
+        batch_size=Config.QUOTATION_INDEX_BATCH,
+        full_rebuild_interval=Config.QUOTATION_INDEX_REBUILD_HOURS * 3600
+    )
+    quotation_index.start()
+    atexit.register(quotation_index.stop)
+
+party_refresher = BackgroundRefresher(
+    party_cache,
+    _load_party_info,
+    max_concurrent=Config.LOOKUP_REFRESH_CONCURRENCY
+)
+
+def get_party_info_batch(quotation_numbers, count=True):
+    """Look up many quotations: cached ones from memory, the rest in one set-based query.
+
+    Returns (results, stats) where results maps each quotation to its party
+    info or None. Raises PartyLookupError if the uncached ones could not be
+    looked up. count=False keeps warm-up traffic out of the cache hit rate.
+    """
+    results = {}
+    missing = []
+    stats = {'cached': 0, 'known_missing': 0, 'mirrored': 0, 'queried': 0}
+    for quotation in quotation_numbers:
+        key = str(quotation).strip()
+        if not key or key in results:
+            continue
+        party_info, stale = party_cache.get_with_state(key, count)
+        if party_info is MISSING:
+            results[key] = None
+            missing.append(key)
+            continue
+        if stale:
+            party_refresher.schedule(key)
+        results[key] = party_info
+        stats['cached'] += 1
+
+    if missing:
+        for key in list(missing):
+            if _definitely_missing(_format_vch_no(key)):
+                party_cache.set(key, None)
+                missing.remove(key)
+                stats['known_missing'] += 1
+                continue
+            party_info = _mirror_get(_format_vch_no(key))
+            if party_info is not None:
+                record = party_master.setdefault(party_info)
+                party_cache.set(key, record)
+                results[key] = record
+                missing.remove(key)
+                stats['mirrored'] += 1
+    if missing:
+        fetched = _get_party_info_batch_impl(missing)
+        for key, record in fetched.items():
+            party_cache.set(key, record)
+            if record is None and quotation_index is not None:
+                quotation_index.record_miss(_format_vch_no(key))
+            results[key] = record
+        stats['queried'] = len(missing)
+    results = {key: party_master.current(record).to_dict() if record is not None else None
+               for key, record in results.items()}
+    return results, stats
+
+def invalidate_party_info(quotation_number=None):
+    """Forget the cached lookup and party details for one quotation, or for all of them.
+
+    One quotation is read again from SQL Server right away, party details
+    included, so its next label shows edited customer details. Returns the
+    number of cached lookups removed.
+    """
+    if quotation_number is None:
+        party_master.invalidate()
+        return party_cache.invalidate()
+    key = str(quotation_number).strip()
+    record, _ = party_cache.get_with_state(key, count=False)
+    if record is not MISSING and record is not None:
+        party_master.invalidate(record.code)
+    removed = party_cache.invalidate(key)
+    try:
+        party_cache.set(key, _get_party_info_impl(key, reload_party=True))
+    except (PartyLookupError, DeadlineExceeded) as e:
+        db_logger.warning('Could not reload quotation %s after invalidation: %s', key, e)
+    return removed
+
+# Newest quotations, preloaded into the lookup cache at start-up
+RECENT_QUOTATIONS_QUERY = """
+    SELECT DISTINCT TOP (?) t.VchNo, t.CM1
+    FROM dbo.Tran2 t
+    INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201'
+    ORDER BY t.VchNo DESC
+"""
+
+def _warm_connection_pool(progress):
+    """Warm-up stage: open the pooled SQL Server connections."""
+    progress(0, Config.DB_POOL_MIN_SIZE)
+    with _lookup_connection(timeout=Config.DB_POOL_TIMEOUT):
+        pass
+    stats = db_pool.get_stats()
+    progress(stats['total'], stats['min_size'])
+    if not stats['total']:
+        raise PartyLookupError('No pooled connection could be opened')
+
+def _warm_recent_quotations(progress):
+    """Warm-up stage: cache party info for the newest ERP quotations."""
+    if Config.WARMUP_RECENT_QUOTATIONS <= 0:
+        return
+    start_time = time.time()
+    try:
+        with _lookup_connection(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            cursor = conn.cursor()
+            cursor.execute(RECENT_QUOTATIONS_QUERY, Config.WARMUP_RECENT_QUOTATIONS)
+            codes = {}
+            for row in cursor.fetchall():
+                vch_no = (row.VchNo or '').strip()
+                key = vch_no[2:] if vch_no.startswith('G-') else vch_no
+                # First row per VchNo wins, as in the single lookup
+                codes.setdefault(key, row.CM1)
+            progress(0, len(codes))
+            records = _resolve_parties(cursor, codes.values())
+    except PartyLookupError:
+        raise
+    except Exception as e:
+        raise _log_lookup_error(e, 'warm-up of recent quotations', time.time() - start_time) from e
+    
+    loaded = 0
+    for key, code in codes.items():
+        record = records.get(code)
+        if record is not None and party_cache.get_with_state(key, count=False)[0] is MISSING:
+            party_cache.set(key, record)
+        loaded += 1
+    progress(loaded, len(codes))
+
+def _warm_printed_quotations(progress):
+    """Warm-up stage: cache party info for recently printed quotations."""
+    if Config.WARMUP_PRINTED_QUOTATIONS <= 0:
+        return
+    page = printed_db.get_page(limit=Config.WARMUP_PRINTED_QUOTATIONS, with_total=False)
+    quotations = list(dict.fromkeys(
+        str(record['quotation']).strip() for record in page['records'] if record.get('quotation')
+    ))
+    progress(0, len(quotations))
+    for i in range(0, len(quotations), Config.LOOKUP_BATCH_MAX):
+        chunk = quotations[i:i + Config.LOOKUP_BATCH_MAX]
+        get_party_info_batch(chunk, count=False)
+        progress(i + len(chunk), len(quotations))
+
+# Runs once per process, off the request path; progress is reported on /health
+warmup = WarmUp()
+warmup.add_stage('connection_pool', _warm_connection_pool)
+warmup.add_stage('recent_quotations', _warm_recent_quotations)
+warmup.add_stage('printed_quotations', _warm_printed_quotations)
+if Config.WARMUP_ENABLED:
+    warmup.start()
 
 def format_label(quotation, party_info, copy_number=None, total_copies=None):
     """Format label with crisp 5-line layout"""
@@ -804,8 +1467,13 @@ def format_label(quotation, party_info, copy_number=None, total_copies=None):
     
     return '\n'.join(label_lines)
 
-def print_label_bartender(quotation, party_info, bartender_template_path, copies=1):
-    """Print label using BarTender with template and data - simple copy count"""
+def print_label_bartender(quotation, party_info, bartender_template_path, copies=1, deadline=None):
+    """Print label using BarTender with template and data - simple copy count
+
+    With a deadline, BarTender is only waited for until it runs out
+    (DeadlineExceeded is raised). PrintEngineTimeout is raised as is: the
+    label may still come out of the printer, so it must not be retried.
+    """
     global SELECTED_PRINTER
     
     # Validate copies
@@ -848,66 +1516,41 @@ def print_label_bartender(quotation, party_info, bartender_template_path, copies
         print(f"Server: Customer: {customer_name}")
         print(f"Server: Combined contact: {combined_contact}")
         
-        # # Method 1: Try BarTender COM Interface (Primary)
+        # Method 1: Persistent BarTender print engine (Primary)
         try:
-            import win32com.client
-            import pythoncom
+            print(f"Server: Using BarTender print engine - {copies} copies")
             
-            # Initialize COM for this thread
-            pythoncom.CoInitialize()
-            
-            print(f"Server: Using BarTender COM interface - {copies} copies")
-            
-            # Create BarTender application object
-            bt_app = win32com.client.Dispatch("BarTender.Application")
-            
-            # bt_app.Visible = True # Make BarTender visible for debugging
-            
-            bt_format = bt_app.Formats.Open(bartender_template_path, False, "")
-            
-            # Set data sources/variables
-            bt_format.SetNamedSubStringValue("quotation_number", quotation_display)
-            bt_format.SetNamedSubStringValue("customer_name", customer_name)
-            bt_format.SetNamedSubStringValue("address", address)
-            bt_format.SetNamedSubStringValue("mobile", combined_contact)
-            bt_format.SetNamedSubStringValue("packed_time", packed_time)
-            bt_format.SetNamedSubStringValue("no_of_copies", 1)
-            bt_format.SetNamedSubStringValue("no_of_serialized_labels", copies)
+            print_engine.print_label(
+                bartender_template_path,
+                [
+                    ("quotation_number", quotation_display),
+                    ("customer_name", customer_name),
+                    ("address", address),
+                    ("mobile", combined_contact),
+                    ("packed_time", packed_time),
+                    ("no_of_copies", 1),
+                    ("no_of_serialized_labels", copies),
+                ],
+                printer=SELECTED_PRINTER,
+                timeout=deadline.cap(Config.PRINT_ENGINE_TIMEOUT, 'print') if deadline else Config.PRINT_ENGINE_TIMEOUT
+            )
             
-            # Print with specified number of copies
             if SELECTED_PRINTER:
-                # Set the printer for this format
-                bt_format.Printer = SELECTED_PRINTER
                 print(f"Server: BarTender printer set to: {SELECTED_PRINTER}")
-                
-                # Set number of serialized labels (user input for copies)
-                # bt_format.PrintSetup.NumberOfSerializedLabels = copies
-                # bt_format.PrintSetup.IdenticalCopiesOfLabel = 1
-                bt_format.PrintOut(False, False)
-            else:
-                # bt_format.PrintSetup.NumberOfSerializedLabels = copies
-                # bt_format.PrintSetup.IdenticalCopiesOfLabel = 1
-                bt_format.PrintOut(False, False)
-            
-            # Close the format and application
-            bt_format.Close(0)  # 0 = don't save changes
-            bt_app.Quit(0)      # 0 = don't save changes
-            
-            # Uninitialize COM
-            pythoncom.CoUninitialize()
-            
             if copies > 1:
                 print(f"Server: BarTender COM print successful - {copies} copies")
             else:
                 print(f"Server: BarTender COM print successful")
             return True
-                
-        except Exception as com_error:
-            # Make sure to uninitialize COM even on error
-            try:
-                pythoncom.CoUninitialize()
-            except:
-                pass
+        
+        except PrintEngineTimeout as timeout_error:
+            # The job may still come out of the printer, so don't print it again via the CLI
+            print(f"Server: BarTender print engine timed out: {timeout_error}")
+            if deadline is not None and deadline.expired():
+                deadline.exceeded('print')
+            app.logger.error(f"BarTender print engine timed out: {timeout_error}")
+            raise
+        except PrintEngineError as com_error:
             print(f"Server: BarTender COM method failed: {com_error}")
             app.logger.warning(f"BarTender COM failed, trying CLI fallback: {com_error}")
         
@@ -944,7 +1587,7 @@ def print_label_bartender(quotation, party_info, bartender_template_path, copies
             
             # Set a short timeout for immediate response
             try:
-                stdout, stderr = process.communicate(timeout=3)  # 3 second max wait
+                stdout, stderr = process.communicate(timeout=deadline.cap(3, 'print') if deadline else 3)  # 3 second max wait
                 if process.returncode == 0:
                     app.logger.info(f"BarTender CLI print dispatched - {copies} copies")
                     return True
@@ -956,36 +1599,42 @@ def print_label_bartender(quotation, party_info, bartender_template_path, copies
                 app.logger.info(f"BarTender print job dispatched (background processing) - {copies} copies")
                 return True  # Don't wait for completion
                 
+        except DeadlineExceeded:
+            raise
         except Exception as cli_error:
             print(f"Server: BarTender CLI method also failed: {cli_error}")
         return False
+    except (DeadlineExceeded, PrintEngineTimeout):
+        raise
     except Exception as e:
         print(f"Server: BarTender print error: {e}")
         return False
 
-def print_label(quotation, party, address='', phone='', mobile='', copies=1):
+def _split_heavy_quotation(quotation):
+    """Heavy items mode: "9171.5" -> ("9171", True); other quotations are returned unchanged."""
+    parts = quotation.split('.')
+    if len(parts) == 2 and parts[1].isdigit():
+        return parts[0], True
+    return quotation, False
+
+def print_label(quotation, party, address='', phone='', mobile='', copies=1, deadline=None):
     """Print label using BarTender only - template required (with serialization for multiple copies)"""
     global BARTENDER_TEMPLATE, BARTENDER_HEAVY_TEMPLATE
     
     try:
         # Detect heavy items mode: quotation contains .number (e.g., "9171.5")
         template_to_use = BARTENDER_TEMPLATE
-        is_heavy_mode = False
         
-        if '.' in quotation:
-            parts = quotation.split('.')
-            if len(parts) == 2 and parts[1].isdigit():
-                is_heavy_mode = True
-                # Remove the .number suffix for the actual quotation
-                quotation = parts[0]
-                
-                # Use heavy template if configured
-                if BARTENDER_HEAVY_TEMPLATE and os.path.exists(BARTENDER_HEAVY_TEMPLATE):
-                    template_to_use = BARTENDER_HEAVY_TEMPLATE
-                    app.logger.info(f"Heavy items mode detected - using template: {BARTENDER_HEAVY_TEMPLATE}")
-                else:
-                    app.logger.warning(f"Heavy items mode detected but template not configured or not found")
-                    is_heavy_mode = False
+        # Remove the .number suffix for the actual quotation
+        quotation, is_heavy_mode = _split_heavy_quotation(quotation)
+        if is_heavy_mode:
+            # Use heavy template if configured
+            if BARTENDER_HEAVY_TEMPLATE and os.path.exists(BARTENDER_HEAVY_TEMPLATE):
+                template_to_use = BARTENDER_HEAVY_TEMPLATE
+                app.logger.info(f"Heavy items mode detected - using template: {BARTENDER_HEAVY_TEMPLATE}")
+            else:
+                app.logger.warning(f"Heavy items mode detected but template not configured or not found")
+                is_heavy_mode = False
         
         # Check if BarTender template is configured
         if not template_to_use:
@@ -1014,7 +1663,7 @@ def print_label(quotation, party, address='', phone='', mobile='', copies=1):
         else:
             app.logger.info(f"Printing with BarTender template{mode_str}: {template_to_use}")
         
-        success = print_label_bartender(quotation, party_info, template_to_use, copies)
+        success = print_label_bartender(quotation, party_info, template_to_use, copies, deadline)
         
         if success:
             if copies > 1:
@@ -1026,6 +1675,8 @@ def print_label(quotation, party, address='', phone='', mobile='', copies=1):
             app.logger.error(f"BarTender print failed for quotation {quotation}")
             return False
         
+    except (DeadlineExceeded, PrintEngineTimeout):
+        raise
     except Exception as e:
         app.logger.error(f"Print error: {e}")
         return False
@@ -1140,6 +1791,67 @@ def print_label_text(quotation, party_info, copy_number=None, total_copies=None)
         print(f"Server: Text print error: {e}")
         return False
 
+def _process_print_job(job):
+    """Run one queued print job with BarTender; history is recorded when the journal completes it"""
+    data = job.payload
+    quotation = data['quotation']
+    copies = data['copies']
+    
+    # Configuration problems won't fix themselves - fail without retrying
+    if not BARTENDER_TEMPLATE or not os.path.exists(BARTENDER_TEMPLATE):
+        raise PrintJobError('BarTender template not configured or not found. Please check Settings.')
+    
+    try:
+        if job.deadline is not None:
+            # Queued behind slow jobs for longer than PRINT_JOB_TTL
+            job.deadline.check('print_queue')
+        with job.stage('print'):
+            success = print_label(quotation, data['party'], data['address'], data['phone'], data['mobile'],
+                                  copies, job.deadline)
+    except DeadlineExceeded as e:
+        raise PrintJobError(f'Not printed within PRINT_JOB_TTL ({e.stage}). '
+                            'Retry the job from the failed jobs list if the label is still needed.') from e
+    except PrintEngineTimeout as e:
+        # Unlike a failure the label may have printed; retrying could print it twice
+        raise PrintJobError(f'BarTender timed out, the label may have printed ({e}). '
+                            'Check the printer before retrying the job.') from e
+    
+    if not success:
+        raise PrintJobError('Print job failed. Check BarTender template and printer configuration.', transient=True)
+    
+    job.record = {
+        'quotation': quotation,
+        'party': data['party'],
+        'address': data['address'],
+        'phone': data['phone'],
+        'mobile': data['mobile']
+    }
+    
+    if copies > 1:
+        return f'{copies} copies sent to printer successfully'
+    return 'Print job sent to printer successfully'
+
+# Global print job queue (drained by a small worker pool, journaled in printed_records.db)
+print_jobs = PrintJobManager(
+    _process_print_job,
+    workers=Config.PRINT_WORKERS,
+    max_retained=Config.PRINT_JOB_HISTORY,
+    journal=printed_db,
+    max_attempts=Config.PRINT_MAX_ATTEMPTS,
+    retry_base_delay=Config.PRINT_RETRY_BASE_DELAY,
+    retry_max_delay=Config.PRINT_RETRY_MAX_DELAY
+)
+atexit.register(print_jobs.stop)
+
+# Replay print jobs that were still pending when the server last stopped
+try:
+    recovered_jobs = print_jobs.recover()
+    if recovered_jobs:
+        print(f'Server: Re-queued {recovered_jobs} unfinished print job(s) from journal')
+    printed_db.purge_jobs()
+except Exception as e:
+    print(f'Server: Failed recovering print jobs: {e}')
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -1153,6 +1865,17 @@ def favicon():
         mimetype='image/x-icon'
     )
 
+def _lookup_response(party_info):
+    """Shape party info the way the /lookup clients expect it."""
+    if not party_info:
+        return {'party': None}
+    return {
+        'party': party_info['name'],
+        'address': f"{party_info['address1']} {party_info['address2']} {party_info['address3']} {party_info['address4']}".strip(),
+        'phone': party_info['phone'],
+        'mobile': party_info['mobile']
+    }
+
 @app.route('/lookup', methods=['POST'])
 def lookup():
     data = request.json
@@ -1161,16 +1884,66 @@ def lookup():
         
     quotation = data.get('quotation')
     party_info = get_party_info(quotation)
-    
-    if party_info:
+    response = _lookup_response(party_info)
+    if party_info is None and db_breaker.is_open:
+        # Not necessarily unknown: SQL Server is down and nothing local had it
+        response['offline'] = True
+    return jsonify(response)
+
+@app.route('/db-status')
+def db_status():
+    """Circuit breaker state for the web UI (cheap; does not touch SQL Server)."""
+    status = db_breaker.get_status()
+    return jsonify({
+        'success': True,
+        'state': status['state'],
+        'open_for_seconds': status['open_for_seconds'],
+        'mirror_enabled': quotation_mirror is not None
+    })
+
+@app.route('/lookup-batch', methods=['POST'])
+def lookup_batch():
+    """Look up many quotations at once: {"quotations": ["9171", "9172"]}."""
+    data = request.get_json(silent=True) or {}
+    quotations = data.get('quotations')
+    if not isinstance(quotations, list) or not quotations:
+        return jsonify({'success': False, 'error': 'quotations must be a non-empty list'}), 400
+    if len(quotations) > Config.LOOKUP_BATCH_MAX:
         return jsonify({
-            'party': party_info['name'],
-            'address': f"{party_info['address1']} {party_info['address2']} {party_info['address3']} {party_info['address4']}".strip(),
-            'phone': party_info['phone'],
-            'mobile': party_info['mobile']
-        })
-    else:
-        return jsonify({'party': None})
+            'success': False,
+            'error': f'At most {Config.LOOKUP_BATCH_MAX} quotations per request'
+        }), 400
+
+    start = time.time()
+    try:
+        results, stats = get_party_info_batch(quotations)
+    except PartyLookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return jsonify({
+        'success': True,
+        'results': {quotation: _lookup_response(info) for quotation, info in results.items()},
+        'cached': stats['cached'],
+        'known_missing': stats['known_missing'],
+        'mirrored': stats['mirrored'],
+        'queried': stats['queried'],
+        'took_ms': round((time.time() - start) * 1000, 2)
+    })
+
+@app.route('/lookup-cache/invalidate', methods=['POST'])
+def lookup_cache_invalidate():
+    """Drop cached lookups for one quotation ({"quotation": "9171"}) or all of them."""
+    data = request.get_json(silent=True) or {}
+    quotation = data.get('quotation')
+    removed = invalidate_party_info(quotation or None)
+    return jsonify({'success': True, 'removed': removed})
+
+@app.route('/quotation-mirror/resync', methods=['POST'])
+def quotation_mirror_resync():
+    """Reload the local quotation mirror from SQL Server in the background."""
+    if quotation_mirror is None:
+        return jsonify({'success': False, 'error': 'Quotation mirror is disabled'}), 400
+    quotation_mirror.request_full_resync()
+    return jsonify({'success': True, 'message': 'Full resync started'})
 
 @app.route('/preview-label', methods=['POST'])
 def preview_label():
@@ -1207,6 +1980,39 @@ def preview_label():
         'preview': label_preview
     })
 
+def _print_setup_error():
+    """Message explaining why nothing can be printed, or None if the template is ready."""
+    if not BARTENDER_TEMPLATE:
+        return 'BarTender template not configured. Please set template path in Settings.'
+    if not os.path.exists(BARTENDER_TEMPLATE):
+        return f'BarTender template file not found: {BARTENDER_TEMPLATE}'
+    return None
+
+def _print_job_deadline():
+    """Deadline for a new print job: PRINT_JOB_TTL, or None.
+
+    Not the request's deadline: the client got its 202 and is not waiting for
+    the label, so a job behind a long queue must still print.
+    """
+    return Deadline(Config.PRINT_JOB_TTL, deadline_counters) if Config.PRINT_JOB_TTL > 0 else None
+
+def _queue_print_job(quotation, party, address, phone, mobile, copies):
+    """Queue a label for the print workers."""
+    # Log with performance timing
+    if copies > 1:
+        app.logger.info(f"Print request received for quotation {quotation} ({copies} copies)")
+    else:
+        app.logger.info(f"Print request received for quotation {quotation}")
+    
+    return print_jobs.submit({
+        'quotation': quotation,
+        'party': party,
+        'address': address,
+        'phone': phone,
+        'mobile': mobile,
+        'copies': copies
+    }, deadline=_print_job_deadline())
+
 @app.route('/print', methods=['POST'])
 def print_label_route():
     """Handle print requests - BarTender only"""
@@ -1217,17 +2023,9 @@ def print_label_route():
         return jsonify({'status': 'error', 'message': 'No data provided'})
     
     # Check if BarTender template is configured before proceeding
-    if not BARTENDER_TEMPLATE:
-        return jsonify({
-            'status': 'error', 
-            'message': 'BarTender template not configured. Please set template path in Settings.'
-        })
-    
-    if not os.path.exists(BARTENDER_TEMPLATE):
-        return jsonify({
-            'status': 'error',
-            'message': f'BarTender template file not found: {BARTENDER_TEMPLATE}'
-        })
+    setup_error = _print_setup_error()
+    if setup_error:
+        return jsonify({'status': 'error', 'message': setup_error})
         
     quotation = data.get('quotation')
     party = data.get('party')
@@ -1245,50 +2043,21 @@ def print_label_route():
     elif copies > 100:
         return jsonify({'status': 'error', 'message': 'Maximum 100 copies allowed'})
     
-    # Log with performance timing
-    if copies > 1:
-        app.logger.info(f"Print request received for quotation {quotation} ({copies} copies)")
-    else:
-        app.logger.info(f"Print request received for quotation {quotation}")
-    
-    # Try to print synchronously to catch errors
+    # Queue the job; a print worker runs it so this request thread is released immediately
     try:
-        success = print_label(quotation, party, address, phone, mobile, copies)
-        
-        if not success:
-            return jsonify({
-                'status': 'error',
-                'message': 'Print job failed. Check BarTender template and printer configuration.',
-                'quotation': quotation
-            })
-        
-        # Record in database asynchronously
-        def async_record():
-            try:
-                printed_db.record_print(quotation, party=party, address=address, phone=phone, mobile=mobile)
-                app.logger.info(f"Recorded print job for quotation {quotation}")
-            except Exception as e:
-                app.logger.error(f"Failed to record print job: {e}")
+        job = _queue_print_job(quotation, party, address, phone, mobile, copies)
         
-        record_thread = threading.Thread(target=async_record, daemon=True)
-        record_thread.start()
-        
-        # Return success response
         response_time = (time.time() - start_time) * 1000
-        app.logger.info(f"Print request processed in {response_time:.2f}ms")
-        
-        if copies > 1:
-            message = f'{copies} copies sent to printer successfully'
-        else:
-            message = 'Print job sent to printer successfully'
+        app.logger.info(f"Print job {job.id} queued in {response_time:.2f}ms")
         
         return jsonify({
-            'status': 'success', 
-            'message': message,
+            'status': 'queued',
+            'job_id': job.id,
+            'message': 'Print job queued',
             'quotation': quotation,
             'copies': copies,
             'response_time_ms': round(response_time, 2)
-        })
+        }), 202
         
     except Exception as e:
         app.logger.error(f"Print error: {e}")
@@ -1298,6 +2067,273 @@ def print_label_route():
             'quotation': quotation
         })
 
+@app.route('/scan-print', methods=['POST'])
+def scan_print():
+    """Look up a scanned quotation and queue its label in one request.
+
+    Replaces /lookup followed by /print with the party details sent back: the
+    label fields come straight from the lookup. A ".N" suffix selects the
+    heavy-items template, as with /print.
+    """
+    start_time = time.time()
+    
+    data = request.get_json(silent=True) or {}
+    quotation = str(data.get('quotation') or '').strip()
+    try:
+        copies = int(data.get('copies', 1))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Copies must be a number'}), 400
+    
+    if not quotation:
+        return jsonify({'status': 'error', 'message': 'Quotation is required'}), 400
+    if copies < 1:
+        copies = 1
+    elif copies > 100:
+        return jsonify({'status': 'error', 'message': 'Maximum 100 copies allowed'}), 400
+    
+    setup_error = _print_setup_error()
+    if setup_error:
+        return jsonify({'status': 'error', 'message': setup_error})
+    
+    lookup_quotation, _ = _split_heavy_quotation(quotation)
+    party_info = get_party_info(lookup_quotation)
+    lookup_time = (time.time() - start_time) * 1000
+    response = _lookup_response(party_info)
+    
+    if party_info is None:
+        response.update({'status': 'error', 'quotation': quotation})
+        if db_breaker.is_open:
+            response['offline'] = True
+            response['message'] = f'ERP database unreachable - quotation {lookup_quotation} is not saved locally'
+        else:
+            response['message'] = f'No customer found for quotation {lookup_quotation}'
+        return jsonify(response), 404
+    
+    try:
+        job = _queue_print_job(quotation, response['party'], response['address'],
+                               response['phone'], response['mobile'], copies)
+    except Exception as e:
+        app.logger.error(f"Print error: {e}")
+        response.update({'status': 'error', 'message': f'Print job failed: {str(e)}', 'quotation': quotation})
+        return jsonify(response)
+    
+    response_time = (time.time() - start_time) * 1000
+    app.logger.info(f"Scan-print job {job.id} queued in {response_time:.2f}ms (lookup {lookup_time:.2f}ms)")
+    
+    response.update({
+        'status': 'queued',
+        'job_id': job.id,
+        'message': 'Print job queued',
+        'quotation': quotation,
+        'copies': copies,
+        'lookup_ms': round(lookup_time, 2),
+        'response_time_ms': round(response_time, 2)
+    })
+    return jsonify(response), 202
+
+def _wave_lookup(quotations):
+    """Label fields for a batch of wave items, looked up with one batch query.
+
+    Maps each quotation to its fields, or to a WaveItemError when there are none.
+    """
+    bases = {quotation: _split_heavy_quotation(quotation)[0] for quotation in quotations}
+    results, _ = get_party_info_batch(list(bases.values()))
+    fields = {}
+    for quotation, lookup_quotation in bases.items():
+        party_info = results.get(lookup_quotation)
+        if party_info is not None:
+            fields[quotation] = _lookup_response(party_info)
+        elif db_breaker.is_open:
+            fields[quotation] = WaveItemError(f'ERP database unreachable - quotation {lookup_quotation} is not saved locally')
+        else:
+            fields[quotation] = WaveItemError(f'No customer found for quotation {lookup_quotation}')
+    return fields
+
+def _wave_submit(quotation, fields, copies):
+    """Queue one wave label."""
+    return print_jobs.submit({
+        'quotation': quotation,
+        'party': fields['party'],
+        'address': fields['address'],
+        'phone': fields['phone'],
+        'mobile': fields['mobile'],
+        'copies': copies
+    }, deadline=_print_job_deadline())
+
+# Wave printing: a list of quotations looked up in concurrent batches and printed in order
+waves = WaveManager(
+    _wave_lookup,
+    _wave_submit,
+    lookup_workers=Config.WAVE_LOOKUP_CONCURRENCY,
+    batch_size=min(Config.WAVE_LOOKUP_BATCH, Config.LOOKUP_BATCH_MAX),
+    print_timeout=Config.WAVE_PRINT_TIMEOUT,
+    max_retained=Config.WAVE_HISTORY
+)
+atexit.register(waves.stop)
+
+@app.route('/waves', methods=['POST'])
+def start_wave():
+    """Start printing a list of quotations.
+
+    Body: {"items": [{"quotation": "9171", "copies": 2}, "9172", ...]}. The
+    wave runs in the background; follow it with /waves/<id>/events.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'status': 'error', 'message': 'items must be a non-empty list of quotations'}), 400
+    if len(items) > Config.WAVE_MAX_ITEMS:
+        return jsonify({'status': 'error', 'message': f'Maximum {Config.WAVE_MAX_ITEMS} quotations per wave'}), 400
+    
+    entries = []
+    for position, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            item = {'quotation': item}
+        quotation = str(item.get('quotation') or '').strip()
+        try:
+            copies = int(item.get('copies', 1))
+        except (TypeError, ValueError):
+            copies = 0
+        if not quotation:
+            return jsonify({'status': 'error', 'message': f'Item {position}: quotation is required'}), 400
+        if copies < 1 or copies > 100:
+            return jsonify({'status': 'error', 'message': f'Item {position} ({quotation}): copies must be 1-100'}), 400
+        entries.append((quotation, copies))
+    
+    setup_error = _print_setup_error()
+    if setup_error:
+        return jsonify({'status': 'error', 'message': setup_error})
+    
+    wave = waves.start(entries)
+    app.logger.info(f"Wave {wave.id} started with {len(entries)} quotation(s)")
+    return jsonify({'status': 'started', **wave.to_dict()}), 202
+
+@app.route('/waves', methods=['GET'])
+def list_waves():
+    """Recent waves (newest first) without their items"""
+    return jsonify({'status': 'success', 'waves': [wave.to_dict(include_items=False) for wave in waves.list_waves()]})
+
+@app.route('/waves/<wave_id>', methods=['GET'])
+def get_wave(wave_id):
+    """Snapshot of one wave with every item's status"""
+    wave = waves.get(wave_id)
+    if wave is None:
+        return jsonify({'status': 'error', 'message': 'Wave not found'}), 404
+    return jsonify({'status': 'success', **wave.to_dict()})
+
+@app.route('/waves/<wave_id>/events', methods=['GET'])
+def wave_events(wave_id):
+    """Server-sent events: a wave snapshot on every change until the wave ends"""
+    wave = waves.get(wave_id)
+    if wave is None:
+        return jsonify({'status': 'error', 'message': 'Wave not found'}), 404
+    
+    def events():
+        version = None
+        while True:
+            if wave.finished_at is not None:
+                # Final snapshot; the browser closes the stream on this event
+                yield f"event: end\ndata: {json.dumps(wave.to_dict())}\n\n"
+                return
+            if wave.version != version:
+                version = wave.version
+                yield f"data: {json.dumps(wave.to_dict())}\n\n"
+            if wave.wait_for_change(version, timeout=15) == version:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/waves/<wave_id>/cancel', methods=['POST'])
+def cancel_wave(wave_id):
+    """Stop a wave; the label being printed finishes, the rest are skipped"""
+    if waves.cancel(wave_id):
+        return jsonify({'status': 'success', 'message': 'Wave cancelled'})
+    if waves.get(wave_id) is None:
+        return jsonify({'status': 'error', 'message': 'Wave not found'}), 404
+    return jsonify({'status': 'error', 'message': 'Wave already finished'}), 409
+
+@app.route('/jobs', methods=['GET'])
+def list_print_jobs():
+    """List recent print jobs (newest first), optionally filtered by status"""
+    try:
+        limit = int(request.args.get('limit', '50'))
+    except ValueError:
+        limit = 50
+    limit = max(1, min(limit, Config.PRINT_JOB_HISTORY))
+    status = request.args.get('status')
+    
+    jobs = print_jobs.list_jobs(limit=limit, status=status)
+    return jsonify({
+        'success': True,
+        'jobs': [job.to_dict() for job in jobs],
+        'stats': print_jobs.get_stats()
+    })
+
+@app.route('/jobs/dead-letter', methods=['GET'])
+def dead_letter_jobs():
+    """List print jobs that failed permanently and still need attention"""
+    try:
+        jobs = printed_db.dead_letter_jobs(limit=50)
+        return jsonify({
+            'success': True,
+            'jobs': [
+                {
+                    'job_id': job['id'],
+                    'quotation': job['payload'].get('quotation'),
+                    'party': job['payload'].get('party'),
+                    'copies': job['payload'].get('copies', 1),
+                    'attempts': job['attempts'],
+                    'error': job['last_error'],
+                    'failed_at': job['updated_at']
+                }
+                for job in jobs
+            ]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_print_job(job_id):
+    """Report the status and stage timings of one print job"""
+    job = print_jobs.get(job_id)
+    if job:
+        return jsonify({'success': True, 'job': job.to_dict()})
+    
+    # Fall back to the journal for jobs from before a restart
+    row = printed_db.get_job(job_id)
+    if not row:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': {
+        'job_id': row['id'],
+        'status': row['status'],
+        'message': row['last_error'] or '',
+        'quotation': row['payload'].get('quotation'),
+        'copies': row['payload'].get('copies', 1),
+        'attempts': row['attempts'],
+        'timings': {}
+    }})
+
+@app.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_print_job(job_id):
+    """Re-queue a dead-letter print job"""
+    job = print_jobs.retry(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found or not failed'}), 404
+    app.logger.info(f"Dead-letter print job {job_id} re-queued")
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/jobs/<job_id>/dismiss', methods=['POST'])
+def dismiss_print_job(job_id):
+    """Remove a failed print job from the dead-letter list"""
+    if not print_jobs.dismiss(job_id):
+        return jsonify({'success': False, 'error': 'Job not found or not failed'}), 404
+    return jsonify({'success': True})
+
 @app.route('/get-settings', methods=['GET'])
 def get_settings():
     """Get current database, printer and BarTender settings"""
@@ -1328,6 +2364,8 @@ def print_status():
         return jsonify({
             'status': 'success',
             'active_threads': active_threads,
+            'print_jobs': print_jobs.get_stats(),
+            'waves': waves.get_stats(),
             'recent_prints_count': len(recent_prints.get('records', [])),
             'server_uptime': getattr(g, 'request_start_time', time.time()),
             'performance': 'optimized'
@@ -1341,6 +2379,13 @@ def print_status():
 
 @app.route('/printed-records', methods=['GET'])
 def printed_records():
+    """Print history.
+
+    Pass before_id/after_id (the next_before_id/prev_after_id of the previous
+    response, or an empty before_id for the newest page) for keyset paging;
+    page/page_size still works for old clients.
+    include_total=0 skips the total for filtered searches.
+    """
     try:
         # Pagination params
         try:
@@ -1350,17 +2395,105 @@ def printed_records():
                 page = 1
             if page_size < 1:
                 page_size = 50
+            page_size = min(page_size, Config.PRINTED_RECORDS_MAX_PAGE_SIZE)
         except Exception:
             page = 1
             page_size = 50
 
         q = request.args.get('q')
+        before_id = request.args.get('before_id', type=int)
+        after_id = request.args.get('after_id', type=int)
+        if 'before_id' in request.args or 'after_id' in request.args:
+            with_total = request.args.get('include_total', '1') != '0'
+            data = printed_db.get_page(limit=page_size, q=q, before_id=before_id,
+                                       after_id=after_id, with_total=with_total)
+            return jsonify({'success': True, 'page_size': page_size, **data})
+
         offset = (page - 1) * page_size
         data = printed_db.get_recent(limit=page_size, q=q, offset=offset)
         total = data.get('total', 0)
         records = data.get('records', [])
         has_more = (offset + len(records)) < total
-        return jsonify({'success': True, 'records': records, 'total': total, 'page': page, 'page_size': page_size, 'has_more': has_more})
+        next_before_id = records[-1]['id'] if records and has_more else None
+        return jsonify({'success': True, 'records': records, 'total': total, 'page': page, 'page_size': page_size,
+                        'has_more': has_more, 'next_before_id': next_before_id})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+EXPORT_FIELDS = ['id', 'quotation', 'party', 'address', 'phone', 'mobile', 'printed_at']
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def _export_csv(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _export_ndjson(records):
+    chunk = []
+    size = 0
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    yield ''.join(chunk)
+
+@app.route('/printed-records/export', methods=['GET'])
+def printed_records_export():
+    """Stream print history as CSV or NDJSON.
+
+    Filters: from/to (inclusive YYYY-MM-DD) and q. Rows are streamed from a
+    SQLite cursor, so memory use is the same for a day or for years.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+    date_from = request.args.get('from') or None
+    date_to = request.args.get('to') or None
+    try:
+        for value in (date_from, date_to):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+
+    records = printed_db.iter_records(q=request.args.get('q') or None, date_from=date_from, date_to=date_to)
+    body = _export_csv(records) if fmt == 'csv' else _export_ndjson(records)
+    filename = f"printed_records_{date_from or 'start'}_{date_to or datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/printed-records/search', methods=['GET'])
+def printed_records_search():
+    """Ranked full-text search over print history."""
+    try:
+        q = request.args.get('q', '').strip()
+        try:
+            limit = min(max(int(request.args.get('limit', '20')), 1), 200)
+        except ValueError:
+            limit = 20
+        start = time.time()
+        records = printed_db.search(q, limit=limit)
+        return jsonify({
+            'success': True,
+            'records': records,
+            'backend': printed_db.get_storage_stats()['search_backend'],
+            'took_ms': round((time.time() - start) * 1000, 2)
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1452,36 +2585,8 @@ def save_settings():
     
     # Test the database connection before saving
     try:
-        # Use the same driver selection logic as the main app
-        available_drivers = pyodbc.drivers()
-        
-        if 'ODBC Driver 18 for SQL Server' in available_drivers:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 18 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE={database};"
-                f"Trusted_Connection=yes;"
-                f"TrustServerCertificate=yes;"
-                f"Connection Timeout=10;"
-            )
-        elif 'ODBC Driver 17 for SQL Server' in available_drivers:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE={database};"
-                f"Integrated Security=SSPI;"
-                f"Connection Timeout=10;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE={database};"
-                f"Trusted_Connection=yes;"
-                f"Connection Timeout=10;"
-            )
-            
-        conn = pyodbc.connect(conn_str)
+        # Same driver selection as lookups (tries the other drivers if the preferred one fails)
+        conn, _ = conn_resolver.connect(server, database, timeout=10)
         conn.close()
         
         # Connection successful, save all settings (bartender_template is now required)
@@ -1521,80 +2626,21 @@ def test_connection():
             'details': 'Please configure database settings first'
         })
     
-    # Get available drivers
-    available_drivers = pyodbc.drivers()
-    sql_drivers = [d for d in available_drivers if 'SQL Server' in d]
-    
-    if not sql_drivers:
+    # Scan for drivers again in case one was installed since start-up
+    conn_resolver.invalidate()
+    try:
+        profiles = conn_resolver.candidates(test_server, test_database, timeout=10)
+    except NoDriverError:
         return jsonify({
             'success': False,
             'error': 'No SQL Server ODBC drivers found',
             'details': 'Please install SQL Server ODBC drivers'
         })
+    sql_drivers = [profile.driver for profile in profiles]
     
-    # Try multiple drivers in order of preference with correct authentication
+    # Try each driver, the one that last worked first
     results = []
-    
-    # Test ODBC Driver 18 for SQL Server (with proper authentication)
-    if 'ODBC Driver 18 for SQL Server' in available_drivers:
-        driver = 'ODBC Driver 18 for SQL Server'
-        conn_str = (
-            f"DRIVER={{{driver}}};"
-            f"SERVER={test_server};"
-            f"DATABASE={test_database};"
-            f"Trusted_Connection=yes;"
-            f"TrustServerCertificate=yes;"
-            f"Connection Timeout=10;"
-        )
-        
-        try:
-            conn = pyodbc.connect(conn_str)
-            cursor = conn.cursor()
-            
-            # Test basic connectivity
-            cursor.execute("SELECT 1")
-            basic_test = cursor.fetchone()[0] == 1
-            
-            # Test required tables
-            cursor.execute("""
-                SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES 
-                WHERE TABLE_NAME IN ('Tran2', 'Master1', 'MasterAddressInfo')
-            """)
-            table_count = cursor.fetchone()[0]
-            
-            # Get SQL Server version
-            cursor.execute("SELECT @@VERSION")
-            version_info = cursor.fetchone()[0].split('\n')[0]
-            
-            conn.close()
-            
-            return jsonify({
-                'success': True,
-                'driver': driver,
-                'version': version_info,
-                'tables_found': f"{table_count}/3 required tables",
-                'message': f'Successfully connected using {driver}',
-                'connection_string': conn_str.replace(test_server, '[SERVER]').replace(test_database, '[DATABASE]')
-            })
-            
-        except Exception as e:
-            results.append({
-                'driver': driver,
-                'success': False,
-                'error': str(e)
-            })
-    
-    # Test ODBC Driver 17 for SQL Server
-    if 'ODBC Driver 17 for SQL Server' in available_drivers:
-        driver = 'ODBC Driver 17 for SQL Server'
-        conn_str = (
-            f"DRIVER={{{driver}}};"
-            f"SERVER={test_server};"
-            f"DATABASE={test_database};"
-            f"Integrated Security=SSPI;"
-            f"Connection Timeout=10;"
-        )
-        
+    for driver, conn_str in profiles:
         try:
             conn = pyodbc.connect(conn_str)
             cursor = conn.cursor()
@@ -1615,6 +2661,7 @@ def test_connection():
             version_info = cursor.fetchone()[0].split('\n')[0]
             
             conn.close()
+            conn_resolver.mark_working(driver)
             
             return jsonify({
                 'success': True,
@@ -1632,55 +2679,6 @@ def test_connection():
                 'error': str(e)
             })
     
-    # Test legacy SQL Server driver
-    if 'SQL Server' in available_drivers:
-        driver = 'SQL Server'
-        conn_str = (
-            f"DRIVER={{{driver}}};"
-            f"SERVER={test_server};"
-            f"DATABASE={test_database};"
-            f"Trusted_Connection=yes;"
-            f"Connection Timeout=10;"
-        )
-        
-        try:
-            conn = pyodbc.connect(conn_str)
-            cursor = conn.cursor()
-            
-            # Test basic connectivity
-            cursor.execute("SELECT 1")
-            basic_test = cursor.fetchone()[0] == 1
-            
-            # Test required tables
-            cursor.execute("""
-                SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES 
-                WHERE TABLE_NAME IN ('Tran2', 'Master1', 'MasterAddressInfo')
-            """)
-            table_count = cursor.fetchone()[0]
-            
-            # Get SQL Server version
-            cursor.execute("SELECT @@VERSION")
-            version_info = cursor.fetchone()[0].split('\n')[0]
-            
-            conn.close()
-            
-            return jsonify({
-                'success': True,
-                'driver': driver,
-                'version': version_info,
-                'tables_found': f"{table_count}/3 required tables",
-                'message': f'Successfully connected using {driver}',
-                'connection_string': conn_str.replace(test_server, '[SERVER]').replace(test_database, '[DATABASE]')
-            })
-            
-        except Exception as e:
-            error_details = str(e)
-            results.append({
-                'driver': driver,
-                'success': False,
-                'error': error_details
-            })
-    
     # If all drivers failed, return detailed error information
     return jsonify({
         'success': False,
@@ -1837,11 +2835,16 @@ def health_check():
         }
         
         # Quick database connectivity test
-        if DB_SERVER and DB_NAME:
+        health_info['circuit_breaker'] = db_breaker.get_status()
+        if DB_SERVER and DB_NAME and db_breaker.is_open:
+            # Known outage: report it without another connect attempt
+            health_info['database'] = 'unreachable'
+            health_info['status'] = 'degraded'
+        elif DB_SERVER and DB_NAME:
             try:
-                # Quick connection test with minimal timeout
-                test_conn_str = f"DRIVER={{SQL Server}};SERVER={DB_SERVER};DATABASE={DB_NAME};Trusted_Connection=yes;Connection Timeout=5;"
-                with pyodbc.connect(test_conn_str) as test_conn:
+                # Quick connection test with minimal timeout, using the preferred driver
+                test_conn, _ = conn_resolver.connect(DB_SERVER, DB_NAME, timeout=5, fallback=False)
+                with test_conn:
                     test_cursor = test_conn.cursor()
                     test_cursor.execute("SELECT 1")
                     test_cursor.fetchone()
@@ -1853,10 +2856,13 @@ def health_check():
             health_info['database'] = 'not_configured'
             health_info['status'] = 'degraded'
         
+        # Start-up warm-up progress (informational, does not affect status)
+        health_info['warmup'] = warmup.get_status()
+        
         # Check printed database
         try:
-            # Test if printed_db module is accessible
-            printed_db.init_db()  # This should be safe to call multiple times
+            # Cheap read through the read pool; the schema is created at start-up
+            health_info['print_history_records'] = printed_db.get_printed_count()
             health_info['printed_db'] = 'connected'
         except Exception as e:
             health_info['printed_db'] = f'error: {str(e)}'
@@ -1906,6 +2912,25 @@ def metrics():
                 'database': DB_NAME,
                 'configured': bool(DB_SERVER and DB_NAME)
             },
+            'db_pool': db_pool.get_stats(),
+            'circuit_breaker': db_breaker.get_status(),
+            'connection_profile': conn_resolver.get_stats(),
+            'deadlines': deadline_counters.get_stats(),
+            'bulkheads': {name: bulkhead.get_stats() for name, bulkhead in bulkheads.items()},
+            'bulkhead_queue': bulkhead_queue.get_stats(),
+            'server_threads': Config.THREADS,
+            'lookup_cache': party_cache.get_stats(),
+            'lookup_refresh': party_refresher.get_stats(),
+            'lookup_coalescing': party_lookups.get_stats(),
+            'party_master': party_master.get_stats(),
+            'quotation_mirror': quotation_mirror.get_stats() if quotation_mirror else {'enabled': False},
+            'quotation_index': quotation_index.get_stats() if quotation_index else {'enabled': False},
+            'warmup': warmup.get_status(),
+            'print_engine': print_engine.get_stats(),
+            'print_jobs': print_jobs.get_stats(),
+            'waves': waves.get_stats(),
+            'printed_db_writer': printed_db.get_writer_stats(),
+            'printed_db_storage': printed_db.get_storage_stats(),
             'logs': log_files,
             'system': {
                 'platform': os.name,
@@ -0,0 +1,75 @@
+"""
+Connection pool benchmark using the fake ODBC driver.
+
+Runs lookups (one statement each) from several threads against the pool with
+a simulated network round trip. Compares validating every checkout with
+SELECT 1, as the old DatabaseConnectionPool did, with validating only
+connections that sat idle, and shows how the pool grows under load:
+
+    python benchmarks/db_pool_benchmark.py --lookups 400 --threads 8 --rtt-ms 5
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db_pool import ConnectionPool, FakeDriver
+
+
+def run(pool, driver, lookups, threads):
+    per_thread = lookups // threads
+
+    def worker():
+        for _ in range(per_thread):
+            conn = pool.get_connection(timeout=30)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT CM1 FROM dbo.Tran2 WHERE VchNo = ?", "G-1")
+                cursor.fetchone()
+            finally:
+                pool.return_connection(conn)
+
+    statements = driver.statements
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, (driver.statements - statements) / (per_thread * threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark connection pool checkout overhead")
+    parser.add_argument("--lookups", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rtt-ms", type=float, default=5, help="Simulated round trip per statement")
+    parser.add_argument("--connect-ms", type=float, default=50, help="Simulated connect + login time")
+    parser.add_argument("--min-size", type=int, default=2)
+    parser.add_argument("--max-size", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for label, validate_idle in (("Validate every checkout", 0), ("Validate after 30s idle", 30)):
+        driver = FakeDriver(latency=args.rtt_ms / 1000, connect_latency=args.connect_ms / 1000)
+        pool = ConnectionPool(driver.connect, min_size=args.min_size, max_size=args.max_size,
+                              validate_idle=validate_idle, keepalive_interval=0)
+        pool.initialize("fake")
+        elapsed, trips = run(pool, driver, args.lookups, args.threads)
+        stats = pool.get_stats()
+        results[label] = elapsed
+        print(f"{label:24}: {elapsed * 1000:8.1f} ms, {trips:.2f} round trips/lookup, "
+              f"pool grew {args.min_size} -> {stats['total']}, avg wait {stats['wait_ms_avg']} ms")
+        pool.shutdown()
+
+    old, new = results.values()
+    print(f"Speed-up                : x{old / new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
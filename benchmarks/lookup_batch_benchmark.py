@@ -0,0 +1,150 @@
+"""
+Batch lookup benchmark against a SQLite stand-in for the ERP database.
+
+Builds Tran2 / Master1 / MasterAddressInfo in SQLite (Tran2 in an attached
+"dbo" schema so the production SQL runs unchanged) and adds a simulated
+network round trip to every statement. Compares one JOIN per quotation, as
+N /lookup calls used to do, with /lookup-batch: a chunked IN query for the
+VchNo -> party code mapping plus one query for the distinct parties:
+
+    python benchmarks/lookup_batch_benchmark.py --quotations 60 --rtt-ms 25
+"""
+
+import argparse
+import sqlite3
+import time
+
+
+# Single-quotation JOIN (what every /lookup used to run)
+PARTY_QUERY = """
+    SELECT
+        m.Name, m.Code,
+        a.Address1, a.Address2, a.Address3, a.Address4,
+        a.Telno, a.Mobile
+    FROM dbo.Tran2 t
+    INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
+    LEFT JOIN MasterAddressInfo a ON m.Code = a.MasterCode
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201' AND t.VchNo = ?
+"""
+
+# Same statements as app.PARTY_CODE_BATCH_QUERY / app.PARTY_MASTER_QUERY
+PARTY_CODE_BATCH_QUERY = """
+    SELECT t.VchNo, t.CM1
+    FROM dbo.Tran2 t
+    INNER JOIN Master1 m ON t.CM1 = m.Code AND m.MasterType = 2
+    WHERE t.VchType = '26' AND t.MasterCode2 = '201' AND t.VchNo IN ({placeholders})
+"""
+
+PARTY_MASTER_QUERY = """
+    SELECT
+        m.Name, m.Code,
+        a.Address1, a.Address2, a.Address3, a.Address4,
+        a.Telno, a.Mobile
+    FROM Master1 m
+    LEFT JOIN MasterAddressInfo a ON m.Code = a.MasterCode
+    WHERE m.MasterType = 2 AND m.Code IN ({placeholders})
+"""
+
+
+def format_vch_no(quotation):
+    return f"G-{quotation}".rjust(25)
+
+
+class RemoteConnection:
+    """SQLite connection that sleeps rtt seconds per statement, like a WAN link."""
+
+    def __init__(self, conn, rtt):
+        self.conn = conn
+        self.rtt = rtt
+        self.round_trips = 0
+
+    def execute(self, sql, params=()):
+        time.sleep(self.rtt)
+        self.round_trips += 1
+        return self.conn.execute(sql, params)
+
+
+def build_database(quotations, parties=500):
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("ATTACH DATABASE ':memory:' AS dbo")
+    conn.executescript("""
+        CREATE TABLE dbo.Tran2 (VchNo TEXT, VchType TEXT, MasterCode2 TEXT, CM1 INTEGER);
+        CREATE INDEX dbo.idx_tran2_vchno ON Tran2 (VchNo);
+        CREATE TABLE Master1 (Code INTEGER PRIMARY KEY, Name TEXT, MasterType INTEGER);
+        CREATE TABLE MasterAddressInfo (
+            MasterCode INTEGER PRIMARY KEY, Address1 TEXT, Address2 TEXT, Address3 TEXT,
+            Address4 TEXT, Telno TEXT, Mobile TEXT
+        );
+    """)
+    conn.executemany("INSERT INTO Master1 VALUES (?, ?, 2)",
+                     [(code, f"Party {code}") for code in range(parties)])
+    conn.executemany("INSERT INTO MasterAddressInfo VALUES (?, ?, ?, '', '', ?, ?)",
+                     [(code, f"{code} Main Road", "City", "0000", "9999999999") for code in range(parties)])
+    conn.executemany("INSERT INTO dbo.Tran2 VALUES (?, '26', '201', ?)",
+                     [(format_vch_no(q), q % parties) for q in range(quotations)])
+    conn.commit()
+    return conn
+
+
+def lookup_one_by_one(remote, quotations):
+    results = {}
+    for quotation in quotations:
+        row = remote.execute(PARTY_QUERY, (format_vch_no(quotation),)).fetchone()
+        results[quotation] = row[0] if row else None
+    return results
+
+
+def lookup_batch(remote, quotations, chunk_size):
+    by_vch_no = {format_vch_no(q).strip(): q for q in quotations}
+    codes = {}
+    vch_nos = [format_vch_no(q) for q in quotations]
+    for i in range(0, len(vch_nos), chunk_size):
+        chunk = vch_nos[i:i + chunk_size]
+        sql = PARTY_CODE_BATCH_QUERY.format(placeholders=", ".join("?" * len(chunk)))
+        for vch_no, code in remote.execute(sql, chunk).fetchall():
+            quotation = by_vch_no.get(vch_no.strip())
+            if quotation is not None:
+                codes.setdefault(quotation, code)
+
+    names = {}
+    distinct = list(set(codes.values()))
+    for i in range(0, len(distinct), chunk_size):
+        chunk = distinct[i:i + chunk_size]
+        sql = PARTY_MASTER_QUERY.format(placeholders=", ".join("?" * len(chunk)))
+        for row in remote.execute(sql, chunk).fetchall():
+            names.setdefault(row[1], row[0])
+    return {q: names.get(codes[q]) if q in codes else None for q in quotations}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /lookup-batch against per-quotation lookups")
+    parser.add_argument("--quotations", type=int, default=60, help="Quotations per wave")
+    parser.add_argument("--rtt-ms", type=float, default=25, help="Simulated round trip to SQL Server")
+    parser.add_argument("--chunk", type=int, default=500, help="Quotations per IN list")
+    parser.add_argument("--rows", type=int, default=200000, help="Rows in Tran2")
+    args = parser.parse_args()
+
+    conn = build_database(args.rows)
+    # Every tenth quotation does not exist
+    wave = [str(q * 7 if q % 10 else args.rows + q) for q in range(args.quotations)]
+
+    single = RemoteConnection(conn, args.rtt_ms / 1000)
+    start = time.perf_counter()
+    expected = lookup_one_by_one(single, wave)
+    single_elapsed = time.perf_counter() - start
+
+    batch = RemoteConnection(conn, args.rtt_ms / 1000)
+    start = time.perf_counter()
+    results = lookup_batch(batch, wave, args.chunk)
+    batch_elapsed = time.perf_counter() - start
+
+    assert results == expected, "batch lookup disagrees with single lookups"
+    found = sum(1 for name in results.values() if name)
+    print(f"Quotations           : {len(wave)} ({found} found), simulated RTT {args.rtt_ms:g} ms")
+    print(f"One JOIN each        : {single_elapsed * 1000:8.1f} ms, round trips={single.round_trips}")
+    print(f"Batch (codes+parties): {batch_elapsed * 1000:8.1f} ms, round trips={batch.round_trips}")
+    print(f"Speed-up             : x{single_elapsed / batch_elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Print engine benchmark using the fake BarTender backend.
+
+Compares the old per-label cycle (start BarTender, open format, print, quit)
+with the persistent PrintEngine. Also checks the format cache when normal and
+heavy labels alternate, and the restart behaviour after a failed job and after
+the per-engine job limit. Runs on any platform:
+
+    python benchmarks/print_engine_benchmark.py --jobs 50 --startup-delay 0.2
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from print_engine import FakeBarTenderBackend, PrintEngine, PrintEngineError
+
+
+VALUES = [
+    ("quotation_number", "9171"),
+    ("customer_name", "Test Customer"),
+    ("address", "1 Main Road"),
+    ("mobile", "9999999999"),
+    ("packed_time", "01/01/2025 10:00"),
+    ("no_of_copies", 1),
+    ("no_of_serialized_labels", 1),
+]
+
+
+TEMPLATE = None
+HEAVY_TEMPLATE = None
+
+
+def run_per_job(backend, jobs):
+    """Old behaviour: a fresh BarTender application for every label."""
+    start = time.perf_counter()
+    for _ in range(jobs):
+        bt_app = backend.create_application()
+        bt_format = bt_app.Formats.Open(TEMPLATE, False, "")
+        for name, value in VALUES:
+            bt_format.SetNamedSubStringValue(name, value)
+        bt_format.PrintOut(False, False)
+        bt_format.Close(0)
+        bt_app.Quit(0)
+    return time.perf_counter() - start
+
+
+def run_engine(backend, jobs, max_jobs_per_engine=500, alternate=False):
+    """New behaviour: one long-lived engine fed through its queue."""
+    engine = PrintEngine(backend, max_jobs_per_engine=max_jobs_per_engine)
+    start = time.perf_counter()
+    pending = [
+        engine.submit(HEAVY_TEMPLATE if alternate and i % 2 else TEMPLATE, VALUES)
+        for i in range(jobs)
+    ]
+    failures = 0
+    for job in pending:
+        try:
+            job.wait(timeout=60)
+        except PrintEngineError:
+            failures += 1
+    elapsed = time.perf_counter() - start
+    stats = engine.get_stats()
+    engine.stop()
+    return elapsed, failures, stats
+
+
+def main():
+    global TEMPLATE, HEAVY_TEMPLATE
+
+    parser = argparse.ArgumentParser(description="Benchmark the BarTender print engine")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--startup-delay", type=float, default=0.2, help="Simulated BarTender start time (s)")
+    parser.add_argument("--open-delay", type=float, default=0.02, help="Simulated format open time (s)")
+    parser.add_argument("--print-delay", type=float, default=0.01, help="Simulated PrintOut time (s)")
+    args = parser.parse_args()
+
+    template_dir = tempfile.mkdtemp(prefix="print_engine_bench_")
+    TEMPLATE = os.path.join(template_dir, "label.btw")
+    HEAVY_TEMPLATE = os.path.join(template_dir, "label_heavy.btw")
+    for path in (TEMPLATE, HEAVY_TEMPLATE):
+        with open(path, "w") as f:
+            f.write("template")
+
+    def backend(**kwargs):
+        return FakeBarTenderBackend(args.startup_delay, args.open_delay, args.print_delay, **kwargs)
+
+    per_job = run_per_job(backend(), args.jobs)
+    print(f"Per-job Dispatch/Quit : {args.jobs} labels in {per_job:.3f}s "
+          f"({args.jobs / per_job:.1f} labels/s)")
+
+    engine_backend = backend()
+    elapsed, failures, stats = run_engine(engine_backend, args.jobs)
+    print(f"Persistent engine     : {args.jobs} labels in {elapsed:.3f}s "
+          f"({args.jobs / elapsed:.1f} labels/s), BarTender starts: {stats['engine_starts']}, "
+          f"speed-up x{per_job / elapsed:.1f}")
+    assert failures == 0
+    assert engine_backend.applications_created == 1
+    assert len(engine_backend.thread_ids) == 1
+
+    cache_backend = backend()
+    _, failures, stats = run_engine(cache_backend, args.jobs, alternate=True)
+    cache = stats["format_cache"]
+    print(f"Alternating templates : formats opened={cache_backend.formats_opened}, "
+          f"hits={cache['hits']}, misses={cache['misses']}")
+    assert failures == 0 and cache_backend.formats_opened == 2
+
+    engine = PrintEngine(cache_backend)
+    engine.print_label(TEMPLATE, VALUES, timeout=10)
+    with open(TEMPLATE, "a") as f:
+        f.write(" edited")
+    engine.print_label(TEMPLATE, VALUES, timeout=10)
+    engine.invalidate_formats()
+    engine.print_label(TEMPLATE, VALUES, timeout=10)
+    cache = engine.get_stats()["format_cache"]
+    engine.stop()
+    print(f"Template invalidation : misses={cache['misses']}, invalidations={cache['invalidations']}")
+    assert cache["misses"] == 3 and cache["invalidations"] == 2
+
+    crash_backend = backend(fail_on={3})
+    _, failures, stats = run_engine(crash_backend, 6)
+    print(f"Crash recovery        : failures={failures}, restarts={stats['engine_restarts']}, "
+          f"BarTender starts={crash_backend.applications_created}")
+    assert failures == 1 and crash_backend.applications_created == 2
+
+    recycle_backend = backend()
+    _, failures, stats = run_engine(recycle_backend, 10, max_jobs_per_engine=4)
+    print(f"Recycle after 4 jobs  : BarTender starts={recycle_backend.applications_created}")
+    assert failures == 0 and recycle_backend.applications_created == 3
+
+    shutil.rmtree(template_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Printed DB benchmark: concurrent history searches while labels are recorded.
+
+Compares the old storage pattern (rollback journal, synchronous=FULL, one
+connection per thread, commit per row) with the current printed_db setup
+(WAL, synchronous=NORMAL, group-commit writer, read-only connection pool):
+
+    python benchmarks/printed_db_benchmark.py --writes 2000 --readers 4
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import printed_db
+
+
+def seed(db_file, rows):
+    printed_db.configure(db_file)
+    printed_db.init_db()
+    for i in range(rows):
+        printed_db.record_print(f"Q{i}", f"Party {i % 50}", "Addr", "", "", wait=False)
+    printed_db.flush()
+    printed_db.shutdown()
+
+
+def run_legacy(db_file, writes, readers, writers):
+    """Old behaviour: per-thread connections, rollback journal, commit per insert."""
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+    stop = threading.Event()
+    reads = [0]
+    errors = [0]
+    lock = threading.Lock()
+
+    def write(count):
+        c = sqlite3.connect(db_file, timeout=30)
+        c.execute("PRAGMA synchronous=FULL")
+        for i in range(count):
+            c.execute(
+                "INSERT INTO printed (quotation, party, address, phone, mobile, printed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (f"W{i}", "Bench", "Addr", "", "", datetime.now().isoformat()),
+            )
+            c.commit()
+        c.close()
+
+    def read():
+        c = sqlite3.connect(db_file, timeout=30)
+        while not stop.is_set():
+            try:
+                c.execute("SELECT * FROM printed WHERE quotation LIKE ? ORDER BY id DESC LIMIT 50",
+                          ("%12%",)).fetchall()
+                c.execute("SELECT COUNT(*) FROM printed WHERE quotation LIKE ?", ("%12%",)).fetchone()
+                with lock:
+                    reads[0] += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+        c.close()
+
+    return _drive(write, read, stop, writes, readers, writers, reads, errors)
+
+
+def run_current(db_file, writes, readers, writers):
+    """Current behaviour: printed_db with WAL, group commit and a reader pool."""
+    printed_db.configure(db_file, printed_db.StorageConfig(checkpoint_interval=1))
+    printed_db.init_db()
+    stop = threading.Event()
+    reads = [0]
+    errors = [0]
+    lock = threading.Lock()
+
+    def write(count):
+        for i in range(count):
+            printed_db.record_print(f"W{i}", "Bench", "Addr", "", "")
+
+    def read():
+        while not stop.is_set():
+            try:
+                printed_db.get_recent(50, q="12")
+                with lock:
+                    reads[0] += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+
+    result = _drive(write, read, stop, writes, readers, writers, reads, errors)
+    wal_file = db_file + "-wal"
+    result["wal_kb"] = round(os.path.getsize(wal_file) / 1024, 1) if os.path.exists(wal_file) else 0
+    result["checkpoints"] = printed_db.get_storage_stats()["checkpoint"]["runs"]
+    printed_db.shutdown()
+    return result
+
+
+def _drive(write, read, stop, writes, readers, writers, reads, errors):
+    read_threads = [threading.Thread(target=read) for _ in range(readers)]
+    write_threads = [threading.Thread(target=write, args=(writes // writers,)) for _ in range(writers)]
+    start = time.perf_counter()
+    for t in read_threads + write_threads:
+        t.start()
+    for t in write_threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in read_threads:
+        t.join()
+    return {
+        "elapsed": elapsed,
+        "writes_per_s": (writes // writers * writers) / elapsed,
+        "reads_per_s": reads[0] / elapsed,
+        "read_errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark printed_db storage settings")
+    parser.add_argument("--seed", type=int, default=20000, help="Rows in the history before the run")
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent print threads")
+    parser.add_argument("--readers", type=int, default=4, help="Concurrent search threads")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="printed_db_bench_")
+    try:
+        legacy_db = os.path.join(work_dir, "legacy.db")
+        current_db = os.path.join(work_dir, "current.db")
+        seed(legacy_db, args.seed)
+        seed(current_db, args.seed)
+
+        legacy = run_legacy(legacy_db, args.writes, args.readers, args.writers)
+        current = run_current(current_db, args.writes, args.readers, args.writers)
+
+        for name, result in (("Legacy (DELETE/FULL)", legacy), ("WAL + group commit", current)):
+            print(f"{name:21}: {result['writes_per_s']:8.1f} writes/s, "
+                  f"{result['reads_per_s']:8.1f} searches/s, read errors={result['read_errors']}")
+        print(f"WAL after run        : {current['wal_kb']} KB, checkpoints={current['checkpoints']}")
+        print(f"Write speed-up       : x{current['writes_per_s'] / legacy['writes_per_s']:.1f}, "
+              f"search speed-up: x{current['reads_per_s'] / max(legacy['reads_per_s'], 0.1):.1f}")
+        print(f"(database in {work_dir}; fsync cost, and so the gap, is larger on a real disk)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
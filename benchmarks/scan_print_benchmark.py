@@ -0,0 +1,106 @@
+"""
+Scan-to-print latency benchmark against a running Label Print Server.
+
+Compares the two ways the web page can print a scanned quotation, measured
+until the print job is queued (when the operator can scan the next one):
+- two-step: 300ms typing debounce, POST /lookup, then POST /print with the
+  party details sent back
+- scan-print: one POST /scan-print
+
+Start the server with PRINT_BACKEND=fake so no labels come out, then pass
+quotations that exist in the ERP database. --rtt-ms adds a simulated network
+round trip per request (e.g. a workstation on Wi-Fi):
+
+    python benchmarks/scan_print_benchmark.py --url http://localhost:5000 --rtt-ms 20 9171 9172 9173
+"""
+
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+
+
+def post(url, payload, rtt):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    time.sleep(rtt)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+def two_step(base, quotation, copies, rtt, debounce):
+    time.sleep(debounce)
+    found = post(f'{base}/lookup', {'quotation': quotation}, rtt)
+    if not found.get('party'):
+        raise RuntimeError(f'Quotation {quotation} not found')
+    result = post(f'{base}/print', {
+        'quotation': quotation,
+        'party': found['party'],
+        'address': found.get('address', ''),
+        'phone': found.get('phone', ''),
+        'mobile': found.get('mobile', ''),
+        'copies': copies,
+    }, rtt)
+    return result
+
+
+def scan_print(base, quotation, copies, rtt, debounce):
+    return post(f'{base}/scan-print', {'quotation': quotation, 'copies': copies}, rtt)
+
+
+def measure(flow, base, quotations, copies, rtt, debounce, rounds):
+    timings = []
+    for _ in range(rounds):
+        for quotation in quotations:
+            start = time.perf_counter()
+            result = flow(base, quotation, copies, rtt, debounce)
+            timings.append((time.perf_counter() - start) * 1000)
+            if result.get('status') != 'queued':
+                raise RuntimeError(f'{flow.__name__} {quotation}: {result.get("message") or result}')
+    return timings
+
+
+def summary(timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return statistics.median(timings), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /lookup + /print with /scan-print")
+    parser.add_argument("quotations", nargs="+", help="Existing quotation numbers")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--rtt-ms", type=float, default=0, help="Simulated network round trip per request")
+    parser.add_argument("--debounce-ms", type=float, default=300, help="Typing debounce before /lookup")
+    args = parser.parse_args()
+
+    base = args.url.rstrip('/')
+    rtt = args.rtt_ms / 1000
+    # Warm the lookup cache so both flows compare request overhead, not SQL Server
+    measure(scan_print, base, args.quotations, args.copies, 0, 0, 1)
+
+    results = {}
+    for label, flow, debounce in (
+        ("Two-step (with debounce)", two_step, args.debounce_ms / 1000),
+        ("Two-step (no debounce)", two_step, 0),
+        ("Scan-print", scan_print, 0),
+    ):
+        median, p95 = summary(measure(flow, base, args.quotations, args.copies, rtt, debounce, args.rounds))
+        results[label] = median
+        print(f"{label:26}: median {median:8.1f} ms, p95 {p95:8.1f} ms")
+
+    scan = results["Scan-print"]
+    print(f"Speed-up vs two-step      : x{results['Two-step (with debounce)'] / scan:.2f} "
+          f"(x{results['Two-step (no debounce)'] / scan:.2f} without the debounce)")
+    print(f"Labels queued             : {len(args.quotations) * (args.rounds * 3 + 1)} x {args.copies} copies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Bulkheads for Label Print Server endpoints.
+
+Waitress serves every endpoint from one thread pool, so a handful of slow
+lookups during an SQL Server hiccup or a large history export could occupy
+all of its threads and leave /print waiting. Each endpoint class (lookup,
+print, history, admin) gets a Bulkhead instead:
+- at most ``max_concurrent`` requests of the class run at once
+- up to ``max_queue`` more wait, each for at most ``queue_timeout`` seconds,
+  as long as the WaitQueue shared by all classes has a free slot
+- anything beyond that is refused straight away with BulkheadFull, which the
+  app answers with 503 and Retry-After, freeing the waitress thread
+
+Requests are admitted on the waitress thread rather than handed to a
+per-class executor: waitress would block a thread on the executor's result
+anyway. Waiting requests hold a waitress thread, so the shared WaitQueue
+bounds them across classes: the bulkheads occupy at most the sum of every
+``max_concurrent`` plus the shared queue size, and a server with a few
+threads more than that (for /health and other unclassified endpoints)
+keeps the classes isolated.
+"""
+
+import math
+import threading
+import time
+
+
+class BulkheadFull(Exception):
+    """The bulkhead has no free slot and its queue is full or the wait timed out."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Server busy ({name}), retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class WaitQueue:
+    """Waiting slots shared by every bulkhead (one per request waiting for a slot)."""
+
+    def __init__(self, max_waiting):
+        self.max_waiting = max(0, max_waiting)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.rejected = 0
+
+    def try_enter(self):
+        with self.lock:
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.waiting -= 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'peak_waiting': self.peak_waiting,
+                'rejected': self.rejected,
+            }
+
+
+class Bulkhead:
+    """Concurrency limit with a small bounded wait queue."""
+
+    def __init__(self, name, max_concurrent, max_queue=0, queue_timeout=1.0, shared_queue=None):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.shared_queue = shared_queue
+        self.retry_after = max(1, math.ceil(queue_timeout))
+        self.cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.stats = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected_full': 0,
+            'rejected_timeout': 0,
+            'peak_active': 0,
+            'peak_waiting': 0,
+            'wait_ms_total': 0.0,
+        }
+
+    @property
+    def capacity(self):
+        """Waitress threads this bulkhead can occupy at most (shared queue permitting)."""
+        return self.max_concurrent + self.max_queue
+
+    def acquire(self, timeout=None):
+        """Take a slot, waiting up to queue_timeout (or timeout if shorter).
+
+        Raises BulkheadFull when no slot is free in time.
+        """
+        wait = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        with self.cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue or (self.shared_queue is not None
+                                                      and not self.shared_queue.try_enter()):
+                    self.stats['rejected_full'] += 1
+                    raise BulkheadFull(self.name, self.retry_after)
+                self.waiting += 1
+                self.stats['queued'] += 1
+                self.stats['peak_waiting'] = max(self.stats['peak_waiting'], self.waiting)
+                start = time.monotonic()
+                try:
+                    while self.active >= self.max_concurrent:
+                        remaining = start + wait - time.monotonic()
+                        if remaining <= 0:
+                            self.stats['rejected_timeout'] += 1
+                            raise BulkheadFull(self.name, self.retry_after)
+                        self.cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    if self.shared_queue is not None:
+                        self.shared_queue.leave()
+                    self.stats['wait_ms_total'] += (time.monotonic() - start) * 1000
+            self.active += 1
+            self.stats['admitted'] += 1
+            self.stats['peak_active'] = max(self.stats['peak_active'], self.active)
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats['active'] = self.active
+            stats['waiting'] = self.waiting
+        stats['max_concurrent'] = self.max_concurrent
+        stats['max_queue'] = self.max_queue
+        stats['queue_timeout'] = self.queue_timeout
+        stats['saturation'] = round(stats['active'] / self.max_concurrent, 2)
+        stats['wait_ms_avg'] = round(stats.pop('wait_ms_total') / stats['queued'], 2) if stats['queued'] else 0.0
+        stats['rejected'] = stats['rejected_full'] + stats['rejected_timeout']
+        return stats
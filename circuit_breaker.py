@@ -0,0 +1,146 @@
+"""
+Circuit breaker for the SQL Server lookup source.
+
+While the ERP server is unreachable every lookup used to wait for the pool
+checkout and then a direct connect with a 30 second login timeout, tying up
+server threads. The breaker counts connectivity failures:
+- after ``failure_threshold`` consecutive failures it opens; lookups are then
+  refused immediately (callers answer from the cache or the local mirror)
+- while open, a background thread calls ``probe()`` every ``probe_interval``
+  seconds (it should use a short login timeout) and closes the breaker on the
+  first success
+- any successful query resets the failure count
+
+Only failures the caller classifies as connectivity errors should be recorded;
+a bad query says nothing about whether the server is up.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+
+logger = logging.getLogger("circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    """Opens after repeated connectivity failures, closes when a probe succeeds."""
+
+    def __init__(self, probe, failure_threshold=3, probe_interval=10, on_change=None):
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self.on_change = on_change
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.probe_thread = None
+        self.stats = {
+            'opened': 0,
+            'rejected': 0,
+            'failures': 0,
+            'probes': 0,
+            'probe_failures': 0,
+            'last_error': None,
+            'last_opened_at': None,
+            'last_closed_at': None,
+        }
+
+    def allow(self):
+        """True if a request may go to SQL Server; counts refusals."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    @property
+    def is_open(self):
+        return self.state == OPEN
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self, error):
+        """Record a connectivity failure; opens the breaker at the threshold."""
+        with self.lock:
+            self.consecutive_failures += 1
+            self.stats['failures'] += 1
+            self.stats['last_error'] = str(error)
+            if self.state == OPEN or self.consecutive_failures < self.failure_threshold:
+                return
+            self.state = OPEN
+            self.opened_at = time.time()
+            self.stats['opened'] += 1
+            self.stats['last_opened_at'] = datetime.now().isoformat()
+        logger.warning("SQL Server circuit opened after %d connectivity failures: %s",
+                       self.failure_threshold, error)
+        self._start_probing()
+        self._notify()
+
+    def _close(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.stats['last_closed_at'] = datetime.now().isoformat()
+            outage = time.time() - self.opened_at
+        logger.info("SQL Server circuit closed after %.1fs", outage)
+        self._notify()
+
+    def _notify(self):
+        if self.on_change:
+            try:
+                self.on_change(self.state)
+            except Exception as e:
+                logger.warning("Circuit breaker callback failed: %s", e)
+
+    # -------------------------------------------------------------------------
+    # Background probes
+    # -------------------------------------------------------------------------
+
+    def _start_probing(self):
+        with self.lock:
+            if self.probe_thread is not None:
+                return
+            self.probe_thread = threading.Thread(target=self._probe_loop, name="CircuitProbe", daemon=True)
+            self.probe_thread.start()
+
+    def _probe_loop(self):
+        while not self.stop_event.wait(self.probe_interval):
+            with self.lock:
+                self.stats['probes'] += 1
+            try:
+                self.probe()
+            except Exception as e:
+                with self.lock:
+                    self.stats['probe_failures'] += 1
+                    self.stats['last_error'] = str(e)
+            else:
+                self._close()
+            with self.lock:
+                # Checked under the lock so a breaker that reopens meanwhile keeps its prober
+                if self.state != OPEN:
+                    self.probe_thread = None
+                    return
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_status(self):
+        with self.lock:
+            status = dict(self.stats)
+            status['state'] = self.state
+            status['consecutive_failures'] = self.consecutive_failures
+            status['open_for_seconds'] = round(time.time() - self.opened_at, 1) if self.state == OPEN else None
+        status['failure_threshold'] = self.failure_threshold
+        status['probe_interval'] = self.probe_interval
+        return status
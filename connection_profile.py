@@ -0,0 +1,169 @@
+"""
+SQL Server connection profiles for Label Print Server.
+
+Every lookup used to call ``pyodbc.drivers()`` (a registry scan on Windows)
+and rebuild the connection string, and the same driver ladder was copied into
+/save-settings, /test-connection, /health and the tray app's start-up check.
+ConnectionResolver is the one place that:
+- detects the installed SQL Server ODBC drivers once (``invalidate()`` scans
+  again, e.g. when the connection is tested from the settings page)
+- builds connection strings per driver with the authentication that driver
+  needs, memoized per (server, database, timeout); the memo is versioned and
+  dropped when the preferred driver changes or drivers are scanned again
+- remembers the driver that last connected and tries it first; ``on_change``
+  is called when that moves the preference to another driver
+
+``list_drivers()`` returns installed ODBC driver names (``pyodbc.drivers``);
+``connect(conn_str, timeout=...)`` opens a connection (``pyodbc.connect``);
+the timeout is passed as the login timeout too, because some drivers ignore
+the ``Connection Timeout`` keyword of the connection string.
+"""
+
+import logging
+import threading
+from collections import namedtuple
+
+
+logger = logging.getLogger("connection_profile")
+
+# Preferred order, with the authentication keywords each driver understands
+SQL_SERVER_DRIVERS = (
+    ('ODBC Driver 18 for SQL Server', 'Trusted_Connection=yes;TrustServerCertificate=yes;'),
+    ('ODBC Driver 17 for SQL Server', 'Integrated Security=SSPI;'),
+    ('SQL Server', 'Trusted_Connection=yes;'),
+)
+
+ConnectionProfile = namedtuple('ConnectionProfile', 'driver conn_str')
+
+
+class NoDriverError(Exception):
+    """No SQL Server ODBC driver is installed."""
+
+
+def build_conn_str(driver, server, database, timeout):
+    """Connection string for one driver, server and database."""
+    auth = dict(SQL_SERVER_DRIVERS).get(driver, 'Trusted_Connection=yes;')
+    return (
+        f"DRIVER={{{driver}}};"
+        f"SERVER={server};"
+        f"DATABASE={database};"
+        f"{auth}"
+        f"Connection Timeout={timeout};"
+    )
+
+
+class ConnectionResolver:
+    """Detects ODBC drivers once and memoizes connection profiles."""
+
+    def __init__(self, list_drivers, connect, on_change=None):
+        self.list_drivers = list_drivers
+        self.connect_fn = connect
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.drivers = None          # installed SQL Server drivers, preferred first
+        self.working_driver = None   # driver of the last successful connect
+        self.version = 0
+        self.profiles = {}           # (version, server, database, timeout) -> [ConnectionProfile]
+        self.stats = {
+            'driver_scans': 0,
+            'resolves': 0,
+            'memo_hits': 0,
+            'connects': 0,
+            'connect_failures': 0,
+            'last_error': None,
+        }
+
+    def _detect_drivers(self):
+        installed = self.list_drivers()
+        with self.lock:
+            self.stats['driver_scans'] += 1
+        drivers = [name for name, _ in SQL_SERVER_DRIVERS if name in installed]
+        if not drivers:
+            logger.error("No SQL Server ODBC drivers found. Available drivers: %s", installed)
+        return drivers
+
+    def candidates(self, server, database, timeout):
+        """All profiles for server/database, last working driver first.
+
+        Raises NoDriverError when no SQL Server driver is installed.
+        """
+        with self.lock:
+            self.stats['resolves'] += 1
+            key = (self.version, server, database, timeout)
+            profiles = self.profiles.get(key)
+            if profiles is not None:
+                self.stats['memo_hits'] += 1
+                return profiles
+            drivers = self.drivers
+        if drivers is None:
+            drivers = self._detect_drivers()
+        if not drivers:
+            raise NoDriverError('No SQL Server ODBC driver installed')
+        with self.lock:
+            self.drivers = drivers
+            ordered = sorted(drivers, key=lambda name: name != self.working_driver)
+            profiles = [ConnectionProfile(name, build_conn_str(name, server, database, timeout)) for name in ordered]
+            if key[0] == self.version:
+                self.profiles[key] = profiles
+        return profiles
+
+    def resolve(self, server, database, timeout):
+        """Best profile for server/database (raises NoDriverError)."""
+        return self.candidates(server, database, timeout)[0]
+
+    def connect(self, server, database, timeout, fallback=True):
+        """Open a connection, trying the other drivers if the best one fails.
+
+        Returns (connection, profile) and remembers the driver that worked;
+        re-raises the last error when none connected.
+        """
+        profiles = self.candidates(server, database, timeout)
+        if not fallback:
+            profiles = profiles[:1]
+        last_error = None
+        for profile in profiles:
+            try:
+                conn = self.connect_fn(profile.conn_str, timeout=timeout)
+            except Exception as e:
+                last_error = e
+                with self.lock:
+                    self.stats['connect_failures'] += 1
+                    self.stats['last_error'] = f'{profile.driver}: {e}'
+                continue
+            with self.lock:
+                self.stats['connects'] += 1
+            self.mark_working(profile.driver)
+            return conn, profile
+        raise last_error
+
+    def mark_working(self, driver):
+        """Prefer driver from now on; returns True if the preference changed."""
+        with self.lock:
+            if driver == self.working_driver:
+                return False
+            # Changed if resolve() returned a different driver until now
+            best = self.working_driver or (self.drivers[0] if self.drivers else None)
+            changed = best is not None and driver != best
+            self.working_driver = driver
+            self.version += 1
+            self.profiles.clear()
+        logger.info("Using ODBC driver %s", driver)
+        if changed and self.on_change:
+            self.on_change()
+        return changed
+
+    def invalidate(self):
+        """Scan for drivers again and rebuild connection strings on next use."""
+        with self.lock:
+            self.drivers = None
+            self.version += 1
+            self.profiles.clear()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['drivers'] = list(self.drivers) if self.drivers is not None else None
+            stats['working_driver'] = self.working_driver
+            stats['version'] = self.version
+        stats['memo_hit_rate'] = round(stats['memo_hits'] / stats['resolves'], 3) if stats['resolves'] else 0.0
+        return stats
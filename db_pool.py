@@ -0,0 +1,615 @@
+"""
+SQL Server connection pool for Label Print Server.
+
+The first pool ran ``SELECT 1`` on every checkout (two round trips per
+lookup), could quietly start with fewer connections than configured and kept
+connections forever. This pool:
+- validates a connection only when it has been idle for ``validate_idle``
+  seconds; recently used connections are handed out as they are
+- retires connections older than ``max_lifetime`` seconds
+- keeps ``min_size`` connections open and grows up to ``max_size`` when a
+  checkout has waited ``grow_after`` seconds without a connection coming back
+- runs a keepalive thread that pings idle connections, closes those idle
+  longer than ``idle_timeout`` (down to ``min_size``) and refills to
+  ``min_size`` after failures
+- records checkout waits in a histogram, plus in-use/idle counts and
+  creation/validation failures, for /metrics
+
+PoolManager owns the active pool. When the database settings change it
+builds a pool for the new connection string in the background, swaps it in
+atomically and drains the old one: idle connections are closed at once,
+checked-out ones when they are returned.
+
+``connect(conn_string)`` opens a DB-API connection (``pyodbc.connect`` in
+production); ``FakeDriver`` stands in for it when SQL Server is not available.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger("db_pool")
+
+# Upper bounds (ms) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolError(Exception):
+    """The pool could not provide a connection."""
+
+
+class PoolTimeout(PoolError):
+    """No connection became available within the checkout timeout."""
+
+
+class _Entry:
+    __slots__ = ('conn', 'generation', 'created_at', 'last_used', 'last_checked')
+
+    def __init__(self, conn, generation):
+        self.conn = conn
+        self.generation = generation
+        # last_used: returned by a caller (idle timeout); last_checked: known good (validation)
+        self.created_at = self.last_used = self.last_checked = time.monotonic()
+
+
+class ConnectionPool:
+    """Thread-safe, elastic pool of SQL Server connections."""
+
+    def __init__(self, connect, min_size=2, max_size=5, validate_idle=30, max_lifetime=1800,
+                 idle_timeout=300, keepalive_interval=60, grow_after=0.02):
+        self.connect = connect
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.validate_idle = validate_idle
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.grow_after = grow_after
+        self.conn_string = None
+        self.generation = 0
+        self.closed = False
+        self.idle = deque()        # _Entry, most recently returned last
+        self.in_use = {}           # id(conn) -> _Entry
+        self.total = 0             # idle + in use + being opened
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.keepalive_thread = None
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'creation_failures': 0,
+            'validations': 0,
+            'validation_failures': 0,
+            'retired_lifetime': 0,
+            'retired_idle': 0,
+            'keepalive_pings': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'last_creation_error': None,
+        }
+
+    # -------------------------------------------------------------------------
+    # Setup
+    # -------------------------------------------------------------------------
+
+    def initialize(self, conn_string):
+        """Point the pool at conn_string and open min_size connections in parallel.
+
+        Returns the number of connections opened; failures are logged and
+        counted, and the keepalive thread keeps trying to reach min_size.
+        """
+        with self.cond:
+            self.conn_string = conn_string
+            self.generation += 1
+            generation = self.generation
+            needed = max(0, self.min_size - len(self.idle))
+            self.total += needed
+        opened = 0
+        if needed:
+            with ThreadPoolExecutor(max_workers=needed, thread_name_prefix='PoolConnect') as executor:
+                futures = [executor.submit(self._open, conn_string) for _ in range(needed)]
+            errors = []
+            for future in futures:
+                try:
+                    conn = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    with self.cond:
+                        self.total -= 1
+                    continue
+                with self.cond:
+                    self.idle.append(_Entry(conn, generation))
+                    self.cond.notify()
+                opened += 1
+            if errors:
+                logger.warning("Opened %d of %d pooled connection(s); first error: %s",
+                               opened, needed, errors[0])
+        self._start_keepalive()
+        return opened
+
+    def _open(self, conn_string, login_timeout=None):
+        try:
+            if login_timeout is None:
+                conn = self.connect(conn_string)
+            else:
+                # pyodbc's timeout argument is the login timeout (whole seconds)
+                conn = self.connect(conn_string, timeout=login_timeout)
+        except Exception as e:
+            with self.cond:
+                self.stats['creation_failures'] += 1
+                self.stats['last_creation_error'] = str(e)
+            raise
+        with self.cond:
+            self.stats['created'] += 1
+        return conn
+
+    def _close(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self.cond:
+            self.total -= 1
+            self.stats['closed'] += 1
+            self.cond.notify()
+
+    # -------------------------------------------------------------------------
+    # Checkout
+    # -------------------------------------------------------------------------
+
+    def get_connection(self, timeout=30, limit_login=False):
+        """Check out a connection, waiting up to timeout seconds.
+
+        With limit_login=True a connection opened for this checkout may only
+        spend the rest of timeout logging in (instead of the connection
+        string's own login timeout), for callers with a deadline.
+
+        Raises PoolTimeout when none became available, PoolError when the
+        pool is not initialized, and the driver's error when a new
+        connection could not be opened.
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            entry, reserved = self._acquire(start, deadline)
+            if reserved is not None:
+                conn_string, generation = reserved
+                login_timeout = None
+                if limit_login:
+                    login_timeout = max(1, math.ceil(deadline - time.monotonic()))
+                try:
+                    conn = self._open(conn_string, login_timeout)
+                except Exception:
+                    with self.cond:
+                        self.total -= 1
+                        self.cond.notify()
+                    # The driver's own error, so callers can tell an outage from other failures
+                    raise
+                entry = _Entry(conn, generation)
+                break
+            now = time.monotonic()
+            if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+                with self.cond:
+                    self.stats['retired_lifetime'] += 1
+                self._close(entry)
+                continue
+            if now - entry.last_checked > self.validate_idle and not self._validate(entry):
+                self._close(entry)
+                continue
+            break
+
+        waited_ms = (time.monotonic() - start) * 1000
+        with self.cond:
+            self.in_use[id(entry.conn)] = entry
+            self.stats['checkouts'] += 1
+            self.stats['wait_ms_total'] += waited_ms
+            self.stats['wait_ms_max'] = max(self.stats['wait_ms_max'], waited_ms)
+            self.wait_buckets[self._bucket(waited_ms)] += 1
+        return entry.conn
+
+    def _acquire(self, start, deadline):
+        """Return (idle entry, None) or (None, (conn_string, generation)) to open a new one."""
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise PoolError('Connection pool closed')
+                if self.conn_string is None:
+                    raise PoolError('Connection pool not initialized')
+                while self.idle:
+                    entry = self.idle.pop()
+                    if entry.generation == self.generation:
+                        return entry, None
+                    # Opened for a previous database; drop it
+                    self.total -= 1
+                    self.stats['closed'] += 1
+                    self._close_quietly(entry)
+                now = time.monotonic()
+                if self.total < self.max_size:
+                    # Brief bursts are absorbed by waiting for a return; grow when the wait drags on
+                    if self.total < self.min_size or now - start >= self.grow_after or now >= deadline:
+                        self.total += 1
+                        return None, (self.conn_string, self.generation)
+                    self.cond.wait(min(deadline, start + self.grow_after) - now)
+                    continue
+                if now >= deadline:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f'No pooled connection available within {deadline - start:.1f}s')
+                self.cond.wait(deadline - now)
+
+    def _validate(self, entry):
+        with self.cond:
+            self.stats['validations'] += 1
+        try:
+            cursor = entry.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            entry.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.info("Discarding pooled connection that failed validation: %s", e)
+            with self.cond:
+                self.stats['validation_failures'] += 1
+            return False
+
+    @staticmethod
+    def _close_quietly(entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def return_connection(self, conn, discard=False):
+        """Return a checked-out connection; discard=True closes it (e.g. after a network error)."""
+        with self.cond:
+            entry = self.in_use.pop(id(conn), None)
+            if entry is None:
+                # Not ours (e.g. a direct connection); just close it
+                self._close_quietly(_Entry(conn, 0))
+                return
+            now = time.monotonic()
+            expired = self.max_lifetime and now - entry.created_at > self.max_lifetime
+            if expired:
+                self.stats['retired_lifetime'] += 1
+            if not (discard or expired or entry.generation != self.generation):
+                entry.last_used = entry.last_checked = now
+                self.idle.append(entry)
+                self.cond.notify()
+                return
+        self._close(entry)
+
+    def close_all(self):
+        """Close idle connections; checked-out ones are closed when returned."""
+        with self.cond:
+            self.generation += 1
+            entries = list(self.idle)
+            self.idle.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def shutdown(self):
+        """Stop the keepalive and refuse new checkouts; returned connections are closed."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.stop_event.set()
+        if self.keepalive_thread and self.keepalive_thread is not threading.current_thread():
+            self.keepalive_thread.join(5)
+        self.close_all()
+
+    # -------------------------------------------------------------------------
+    # Keepalive
+    # -------------------------------------------------------------------------
+
+    def _start_keepalive(self):
+        if self.keepalive_interval <= 0:
+            return
+        with self.cond:
+            if self.keepalive_thread and self.keepalive_thread.is_alive():
+                return
+            self.keepalive_thread = threading.Thread(target=self._keepalive, name="DbPoolKeepalive", daemon=True)
+            self.keepalive_thread.start()
+
+    def _keepalive(self):
+        while not self.stop_event.wait(self.keepalive_interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                logger.warning("Connection pool keepalive failed: %s", e)
+
+    def maintain(self):
+        """One keepalive pass: retire old/surplus idle connections, ping the rest, refill to min_size."""
+        now = time.monotonic()
+        retire, ping = [], []
+        with self.cond:
+            keep = deque()
+            # Oldest-returned first; surplus idle connections above min_size are closed
+            while self.idle:
+                entry = self.idle.popleft()
+                if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+                    self.stats['retired_lifetime'] += 1
+                    retire.append(entry)
+                elif (self.idle_timeout and now - entry.last_used > self.idle_timeout
+                      and self.total - len(retire) > self.min_size):
+                    self.stats['retired_idle'] += 1
+                    retire.append(entry)
+                elif now - entry.last_checked > self.keepalive_interval:
+                    ping.append(entry)
+                else:
+                    keep.append(entry)
+            self.idle = keep
+        for entry in retire:
+            self._close(entry)
+        for entry in ping:
+            with self.cond:
+                self.stats['keepalive_pings'] += 1
+            if self._validate(entry):
+                with self.cond:
+                    self.idle.appendleft(entry)
+                    self.cond.notify()
+            else:
+                self._close(entry)
+
+        with self.cond:
+            conn_string, generation = self.conn_string, self.generation
+            needed = max(0, self.min_size - self.total) if conn_string else 0
+            self.total += needed
+        for _ in range(needed):
+            try:
+                conn = self._open(conn_string)
+            except Exception:
+                with self.cond:
+                    self.total -= 1
+                continue
+            with self.cond:
+                self.idle.appendleft(_Entry(conn, generation))
+                self.cond.notify()
+
+    # -------------------------------------------------------------------------
+    # Stats
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _bucket(waited_ms):
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                return i
+        return len(WAIT_BUCKETS_MS)
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats['idle'] = len(self.idle)
+            stats['in_use'] = len(self.in_use)
+            stats['total'] = self.total
+            buckets = list(self.wait_buckets)
+        stats['min_size'] = self.min_size
+        stats['max_size'] = self.max_size
+        stats['initialized'] = self.conn_string is not None
+        labels = [f'le_{bound}ms' for bound in WAIT_BUCKETS_MS] + ['gt_%dms' % WAIT_BUCKETS_MS[-1]]
+        stats['checkout_wait_histogram'] = dict(zip(labels, buckets))
+        stats['wait_ms_avg'] = round(stats['wait_ms_total'] / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 2)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 2)
+        return stats
+
+
+class PoolManager:
+    """Hands out connections from the active pool and replaces it without disruption.
+
+    ``factory()`` returns a new, uninitialized ConnectionPool. ``on_switch()``
+    is called after a switch, e.g. to drop data cached from the old database.
+    """
+
+    def __init__(self, factory, on_switch=None):
+        self.factory = factory
+        self.on_switch = on_switch
+        self.pool = None
+        self.owners = {}           # id(conn) -> pool it was checked out from
+        self.pending = None        # connection string waiting to be switched to
+        self.pending_notify = False
+        self.switch_thread = None
+        self.lock = threading.Lock()
+        self.init_lock = threading.Lock()
+        self.stats = {
+            'switches': 0,
+            'last_switch_at': None,
+            'last_switch_ms': None,
+            'last_switch_opened': None,
+        }
+
+    @property
+    def conn_string(self):
+        pool = self.pool
+        return pool.conn_string if pool else None
+
+    def start(self, conn_string):
+        """Create the first pool (no-op once a pool exists)."""
+        if self.pool is not None:
+            return
+        with self.init_lock:
+            if self.pool is None:
+                pool = self.factory()
+                pool.initialize(conn_string)
+                self.pool = pool
+
+    def switch(self, conn_string, notify=True):
+        """Build a pool for conn_string in the background and swap it in (returns immediately).
+
+        notify=False skips on_switch, for a new connection string to the same database.
+        """
+        with self.lock:
+            self.pending = conn_string
+            self.pending_notify = self.pending_notify or notify
+            if self.switch_thread is not None:
+                # The running switch picks up the latest connection string when it finishes
+                return
+            self.switch_thread = threading.Thread(target=self._switch_loop, name="DbPoolSwitch", daemon=True)
+            self.switch_thread.start()
+
+    def wait_for_switch(self, timeout=None):
+        thread = self.switch_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _switch_loop(self):
+        while True:
+            with self.lock:
+                conn_string, self.pending = self.pending, None
+                notify, self.pending_notify = self.pending_notify, False
+                if conn_string is None:
+                    self.switch_thread = None
+                    return
+            start = time.time()
+            new_pool = self.factory()
+            try:
+                opened = new_pool.initialize(conn_string)
+            except Exception as e:
+                # Still switch: the old pool points at the wrong database
+                logger.warning("New connection pool could not be initialized: %s", e)
+                opened = 0
+            with self.init_lock:
+                old_pool, self.pool = self.pool, new_pool
+            with self.lock:
+                self.stats['switches'] += 1
+                self.stats['last_switch_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                self.stats['last_switch_ms'] = round((time.time() - start) * 1000, 2)
+                self.stats['last_switch_opened'] = opened
+            if old_pool is not None:
+                old_pool.shutdown()
+            logger.info("Switched connection pool (%d connection(s) opened in %.2fs)", opened, time.time() - start)
+            if notify and self.on_switch:
+                try:
+                    self.on_switch()
+                except Exception as e:
+                    logger.warning("Connection pool switch callback failed: %s", e)
+
+    def get_connection(self, timeout=30, limit_login=False):
+        while True:
+            pool = self.pool
+            if pool is None:
+                raise PoolError('Connection pool not initialized')
+            try:
+                conn = pool.get_connection(timeout=timeout, limit_login=limit_login)
+            except PoolError:
+                if pool is not self.pool:
+                    # Swapped while this checkout waited; use the new pool
+                    continue
+                raise
+            with self.lock:
+                self.owners[id(conn)] = pool
+            return conn
+
+    def return_connection(self, conn, discard=False):
+        with self.lock:
+            pool = self.owners.pop(id(conn), None)
+        if pool is None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+        # A drained pool closes the connection instead of keeping it
+        pool.return_connection(conn, discard=discard)
+
+    def shutdown(self):
+        pool = self.pool
+        if pool is not None:
+            pool.shutdown()
+
+    def get_stats(self):
+        pool = self.pool
+        stats = pool.get_stats() if pool else {'initialized': False}
+        with self.lock:
+            stats.update(self.stats)
+            stats['switch_in_progress'] = self.switch_thread is not None
+            stats['draining_connections'] = sum(1 for owner in self.owners.values() if owner is not pool)
+        return stats
+
+
+class FakeDriverError(Exception):
+    """Raised by FakeDriver connections (stands in for pyodbc.Error)."""
+
+
+class FakeConnection:
+    def __init__(self, driver):
+        self.driver = driver
+        self.generation = driver.generation
+        self.closed = False
+
+    def cursor(self):
+        if self.closed:
+            raise FakeDriverError('Connection is closed')
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+        with self.driver.lock:
+            self.driver.open_connections -= 1
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.timeout = 0
+
+    def execute(self, sql, *params):
+        driver = self.conn.driver
+        time.sleep(driver.latency)
+        with driver.lock:
+            driver.statements += 1
+        if self.conn.generation != driver.generation:
+            raise FakeDriverError('08S01: Communication link failure')
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeDriver:
+    """In-memory stand-in for pyodbc: ``FakeDriver().connect`` can be passed as ``connect``.
+
+    ``latency`` is slept per connect and per statement (a network round
+    trip); ``fail_connects`` makes connects fail; ``restart_server()``
+    breaks every open connection, like a SQL Server restart. A connect
+    slower than its ``timeout`` fails with a login timeout, as in pyodbc.
+    """
+
+    def __init__(self, latency=0.0, connect_latency=None, fail_connects=False):
+        self.latency = latency
+        self.connect_latency = latency if connect_latency is None else connect_latency
+        self.fail_connects = fail_connects
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.connects = 0
+        self.statements = 0
+        self.open_connections = 0
+
+    def connect(self, conn_string, timeout=None):
+        if timeout and self.connect_latency > timeout:
+            time.sleep(timeout)
+            raise FakeDriverError('HYT00: Login timeout expired')
+        time.sleep(self.connect_latency)
+        if self.fail_connects:
+            raise FakeDriverError('08001: Server not reachable')
+        with self.lock:
+            self.connects += 1
+            self.open_connections += 1
+        return FakeConnection(self)
+
+    def restart_server(self):
+        with self.lock:
+            self.generation += 1
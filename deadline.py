@@ -0,0 +1,108 @@
+"""
+Per-request deadlines for Label Print Server.
+
+The browser gives up on a request after a few seconds, but the server used to
+keep working on it: waiting for a pooled connection, logging in to SQL
+Server, running the query or waiting for BarTender. A Deadline is created for
+each request (from the X-Request-Timeout-Ms header or a per-endpoint default)
+and every stage that can block asks it for the remaining budget:
+- ``cap(timeout, stage)`` shortens a stage timeout to what is left and raises
+  DeadlineExceeded if nothing is left
+- ``check(stage)`` raises DeadlineExceeded once the budget is spent
+- ``record(stage)`` only counts an expiry, for callers that stop without
+  raising (e.g. a print retry that would start too late)
+
+Expiries are counted per stage in DeadlineCounters (``deadlines`` in /metrics).
+"""
+
+import math
+import threading
+import time
+
+
+HEADER = "X-Request-Timeout-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline ran out during ``stage``; whoever asked has given up."""
+
+    def __init__(self, stage):
+        super().__init__(f"Request deadline exceeded ({stage})")
+        self.stage = stage
+
+
+class DeadlineCounters:
+    """Deadline-exceeded events per stage."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = 0
+        self.exceeded = {}
+
+    def created_one(self):
+        with self.lock:
+            self.created += 1
+
+    def record(self, stage):
+        with self.lock:
+            self.exceeded[stage] = self.exceeded.get(stage, 0) + 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'deadlines': self.created,
+                'exceeded': sum(self.exceeded.values()),
+                'exceeded_by_stage': dict(self.exceeded),
+            }
+
+
+class Deadline:
+    """A point in time after which the work for one request is abandoned."""
+
+    def __init__(self, seconds, counters=None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.counters = counters
+        if counters is not None:
+            counters.created_one()
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def record(self, stage):
+        if self.counters is not None:
+            self.counters.record(stage)
+
+    def exceeded(self, stage):
+        """Count the expiry and raise DeadlineExceeded."""
+        self.record(stage)
+        raise DeadlineExceeded(stage)
+
+    def check(self, stage):
+        if self.expired():
+            self.exceeded(stage)
+
+    def cap(self, timeout, stage):
+        """timeout shortened to the remaining budget (raises if none is left)."""
+        self.check(stage)
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def whole_seconds(self, stage):
+        """Remaining budget rounded up, for ODBC timeouts (whole seconds, 0 means none)."""
+        self.check(stage)
+        return max(1, math.ceil(self.remaining()))
+
+
+def parse_timeout_ms(value, maximum):
+    """Seconds from an X-Request-Timeout-Ms value, capped at maximum; None if invalid."""
+    try:
+        seconds = float(value) / 1000
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(seconds) or seconds <= 0:
+        return None
+    return min(seconds, maximum)
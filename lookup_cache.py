@@ -0,0 +1,250 @@
+"""
+In-memory cache for quotation lookups.
+
+Replaces the time-bucketed functools.lru_cache, where every entry expired at
+the same 5-minute boundary and failed lookups were cached like misses:
+- every entry has its own expiry, so entries age out independently
+- the least recently used entry is evicted once maxsize is reached
+- "not found" results are cached with a shorter negative TTL
+- callers only cache real answers; errors are never stored
+- entries can be invalidated one at a time or all at once
+- stale-while-revalidate: after ``ttl`` an entry is still served for up to
+  ``stale_ttl`` more seconds while BackgroundRefresher reloads it, so an
+  expiry costs the caller a memory hit instead of a database round trip
+- SingleFlight coalesces concurrent loads of the same key into one query
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger("lookup_cache")
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL.
+
+    ``get(key)`` returns the cached value (which may be None for a cached
+    negative result) or ``MISSING``. Entries older than ``ttl`` but younger
+    than ``ttl + stale_ttl`` are still returned; ``get_with_state`` tells the
+    caller they are stale so it can refresh them. Negative results are never
+    served stale.
+    """
+
+    def __init__(self, maxsize=1000, ttl=300, negative_ttl=30, stale_ttl=0, clock=time.monotonic):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = max(0, stale_ttl)
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (fresh_until, expires_at, value)
+        self.lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'expirations': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, key):
+        return self.get_with_state(key)[0]
+
+    def get_with_state(self, key, count=True):
+        """Return (value, stale); value is MISSING when nothing usable is cached.
+
+        With count=False (warm-up traffic) the hit/miss counters are left alone.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if count:
+                    self.stats['misses'] += 1
+                return MISSING, False
+            fresh_until, expires_at, value = entry
+            now = self.clock()
+            if expires_at <= now:
+                del self.entries[key]
+                self.stats['expirations'] += 1
+                if count:
+                    self.stats['misses'] += 1
+                return MISSING, False
+            self.entries.move_to_end(key)
+            stale = fresh_until <= now
+            if count:
+                if value is None:
+                    self.stats['negative_hits'] += 1
+                else:
+                    self.stats['stale_hits' if stale else 'hits'] += 1
+            return value, stale
+
+    def set(self, key, value, ttl=None):
+        """Cache value; None is stored as a negative result with negative_ttl."""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        stale_ttl = 0 if value is None else self.stale_ttl
+        with self.lock:
+            now = self.clock()
+            self.entries[key] = (now + ttl, now + ttl + stale_ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None. Returns entries removed."""
+        with self.lock:
+            if key is None:
+                removed = len(self.entries)
+                self.entries.clear()
+            else:
+                removed = 1 if self.entries.pop(key, None) is not None else 0
+            self.stats['invalidations'] += removed
+            return removed
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self.entries)
+        stats['maxsize'] = self.maxsize
+        stats['ttl'] = self.ttl
+        stats['negative_ttl'] = self.negative_ttl
+        stats['stale_ttl'] = self.stale_ttl
+        served = stats['hits'] + stats['stale_hits'] + stats['negative_hits']
+        lookups = served + stats['misses']
+        stats['hit_rate'] = round(served / lookups, 3) if lookups else 0.0
+        return stats
+
+
+class BackgroundRefresher:
+    """Reloads stale cache entries off the request path.
+
+    ``loader(key)`` returns the new value (None for "not found") or raises;
+    on error the stale value is kept until it hard-expires. At most
+    ``max_concurrent`` refreshes run at once and each key is refreshed once
+    at a time, so a wave of expiries cannot exhaust the database pool:
+    refreshes beyond the limit are skipped and retried on a later hit.
+    """
+
+    def __init__(self, cache, loader, max_concurrent=2):
+        self.cache = cache
+        self.loader = loader
+        self.max_concurrent = max(1, max_concurrent)
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        self.lock = threading.Lock()
+        self.in_flight = set()
+        self.stats = {
+            'started': 0,
+            'completed': 0,
+            'failed': 0,
+            'skipped': 0,
+        }
+
+    def schedule(self, key):
+        """Start a background refresh of key. Returns False if it was not started."""
+        with self.lock:
+            if key in self.in_flight:
+                return False
+            if not self.slots.acquire(blocking=False):
+                self.stats['skipped'] += 1
+                return False
+            self.in_flight.add(key)
+            self.stats['started'] += 1
+        thread = threading.Thread(target=self._refresh, args=(key,), name="LookupRefresh", daemon=True)
+        thread.start()
+        return True
+
+    def _refresh(self, key):
+        try:
+            value = self.loader(key)
+        except Exception as exc:
+            logger.warning("Background refresh of %s failed: %s", key, exc)
+            with self.lock:
+                self.stats['failed'] += 1
+        else:
+            self.cache.set(key, value)
+            with self.lock:
+                self.stats['completed'] += 1
+        finally:
+            with self.lock:
+                self.in_flight.discard(key)
+            self.slots.release()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self.in_flight)
+        stats['max_concurrent'] = self.max_concurrent
+        return stats
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight wait for it and get the same result (or the same exception)
+    instead of issuing a duplicate query. A waiting caller gives up after
+    ``timeout`` seconds with TimeoutError; the call itself carries on.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {
+            'calls': 0,
+            'executions': 0,
+            'deduplicated': 0,
+        }
+
+    def do(self, key, fn, timeout=None):
+        with self.lock:
+            self.stats['calls'] += 1
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.stats['executions'] += 1
+            else:
+                self.stats['deduplicated'] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Gave up waiting for in-flight call {key!r}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self.calls)
+        stats['dedup_rate'] = round(stats['deduplicated'] / stats['calls'], 3) if stats['calls'] else 0.0
+        return stats
@@ -0,0 +1,201 @@
+"""
+In-memory party master store for Label Print Server.
+
+Thousands of quotations belong to a few hundred repeat customers, so party
+details (Master1 + MasterAddressInfo) are cached once per party code instead
+of once per quotation:
+- each party is one compact ``PartyRecord`` (``__slots__``, no per-instance
+  dict); quotation caches hold references to the shared record
+- a background cycle reloads resident parties in chunks; a reload stores a
+  new record instead of editing the old one, so a reader never sees half of
+  an update, and ``current(record)`` gives cached quotations the latest one
+- the least recently used party is dropped beyond ``maxsize``
+
+``load(codes)`` returns party info dicts (with a ``code`` key) for the codes
+that still exist.
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger("party_master")
+
+
+def _value(info, field):
+    value = info.get(field)
+    return '' if value is None else value
+
+
+class PartyRecord:
+    """Name, address and phone numbers of one party (Master1.Code)."""
+
+    __slots__ = ('code', 'name', 'address1', 'address2', 'address3', 'address4', 'phone', 'mobile')
+
+    def __init__(self, code, name='', address1='', address2='', address3='', address4='',
+                 phone='', mobile=''):
+        self.code = code
+        self.name = name
+        self.address1 = address1
+        self.address2 = address2
+        self.address3 = address3
+        self.address4 = address4
+        self.phone = phone
+        self.mobile = mobile
+
+    @classmethod
+    def from_dict(cls, info):
+        return cls(**{field: _value(info, field) for field in cls.__slots__})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"PartyRecord(code={self.code!r}, name={self.name!r})"
+
+
+class PartyMaster:
+    """Party records keyed by code, refreshed in the background."""
+
+    def __init__(self, load=None, refresh_interval=900, maxsize=20000, chunk_size=500):
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.maxsize = max(1, maxsize)
+        self.chunk_size = chunk_size
+        self.records = OrderedDict()  # code -> PartyRecord
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'loaded': 0,
+            'evictions': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'last_refresh_at': None,
+            'last_refresh_ms': None,
+        }
+
+    @staticmethod
+    def _key(code):
+        return str(code).strip()
+
+    def get(self, code):
+        """Return the cached record for code, or None."""
+        key = self._key(code)
+        with self.lock:
+            record = self.records.get(key)
+            if record is None:
+                self.stats['misses'] += 1
+                return None
+            self.records.move_to_end(key)
+            self.stats['hits'] += 1
+            return record
+
+    def put(self, info):
+        """Store party info as a new record (replacing a known one) and return it."""
+        key = self._key(info.get('code'))
+        record = PartyRecord.from_dict(info)
+        with self.lock:
+            known = key in self.records
+            self.records[key] = record
+            if known:
+                self.records.move_to_end(key)
+            while len(self.records) > self.maxsize:
+                self.records.popitem(last=False)
+                self.stats['evictions'] += 1
+            self.stats['loaded'] += 1
+            return record
+
+    def current(self, record):
+        """The resident record for record's party (newer after a reload), else record itself."""
+        with self.lock:
+            return self.records.get(self._key(record.code), record)
+
+    def setdefault(self, info):
+        """Return the record for info's code, storing info only if the code is not known yet.
+
+        For sources that may be older than the resident record (the
+        quotation mirror), so they never overwrite fresher party details.
+        """
+        key = self._key(info.get('code'))
+        with self.lock:
+            record = self.records.get(key)
+            if record is not None:
+                self.records.move_to_end(key)
+                return record
+        return self.put(info)
+
+    def invalidate(self, code=None):
+        with self.lock:
+            if code is None:
+                self.records.clear()
+            else:
+                self.records.pop(self._key(code), None)
+
+    # -------------------------------------------------------------------------
+    # Refresh cycle
+    # -------------------------------------------------------------------------
+
+    def start(self):
+        if self.load is None or self.refresh_interval <= 0:
+            return
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="PartyMasterRefresh", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _run(self):
+        while not self.stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Party master refresh failed: %s", e)
+
+    def refresh(self):
+        """Reload every resident party from the source. Returns the number refreshed."""
+        start = time.time()
+        with self.lock:
+            codes = list(self.records)
+        refreshed = 0
+        try:
+            for i in range(0, len(codes), self.chunk_size):
+                for info in self.load(codes[i:i + self.chunk_size]):
+                    self.put(info)
+                    refreshed += 1
+        except Exception:
+            with self.lock:
+                self.stats['refresh_errors'] += 1
+            raise
+        with self.lock:
+            self.stats['refreshes'] += 1
+            self.stats['last_refresh_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            self.stats['last_refresh_ms'] = round((time.time() - start) * 1000, 2)
+        return refreshed
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            records = list(self.records.values())
+        stats['size'] = len(records)
+        stats['maxsize'] = self.maxsize
+        stats['refresh_interval'] = self.refresh_interval
+        # Approximate footprint: slotted record plus its field values
+        stats['approx_bytes'] = sum(
+            sys.getsizeof(record) + sum(sys.getsizeof(getattr(record, f)) for f in PartyRecord.__slots__)
+            for record in records
+        )
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
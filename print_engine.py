@@ -0,0 +1,517 @@
+"""
+Persistent BarTender print engine for Label Print Server.
+
+Starting BarTender through COM takes seconds, so instead of a
+Dispatch/Open/PrintOut/Quit cycle per label one dedicated worker thread owns a
+single BarTender application and takes print jobs from a queue:
+- COM is initialised once on the worker thread (single-threaded apartment)
+- the BarTender application is started lazily on the first job
+- the application is restarted after a failed job or after N jobs
+- opened formats stay resident in a cache keyed by (path, mtime, size)
+- the backend is pluggable; FakeBarTenderBackend runs without Windows/BarTender
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue, Empty
+
+
+logger = logging.getLogger("print_engine")
+
+
+class PrintEngineError(Exception):
+    """Raised when the print engine could not print a job."""
+
+
+class PrintEngineTimeout(PrintEngineError):
+    """Raised when a job did not finish in time (it may still be printing)."""
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class BarTenderComBackend:
+    """Creates BarTender COM applications on the engine thread."""
+
+    name = "bartender"
+
+    def initialize_thread(self):
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def uninitialize_thread(self):
+        import pythoncom
+        pythoncom.CoUninitialize()
+
+    def create_application(self):
+        import win32com.client
+        return win32com.client.Dispatch("BarTender.Application")
+
+
+class FakeBarTenderFormat:
+    """In-memory stand-in for a BarTender format object."""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.values = {}
+        self.Printer = None
+        self.closed = False
+
+    def SetNamedSubStringValue(self, name, value):
+        self.values[name] = value
+
+    def PrintOut(self, show_status_window, wait_for_completion):
+        if self.closed:
+            raise RuntimeError("Format is closed")
+        self.backend._on_print(self)
+
+    def Close(self, save_option):
+        self.closed = True
+
+
+class FakeBarTenderFormats:
+    def __init__(self, application):
+        self.application = application
+
+    def Open(self, path, close_outstanding, printer):
+        if self.application.quit:
+            raise RuntimeError("BarTender application has quit")
+        return self.application.backend._on_open(path)
+
+
+class FakeBarTenderApplication:
+    """In-memory stand-in for the BarTender.Application COM object."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.Formats = FakeBarTenderFormats(self)
+        self.Visible = False
+        self.quit = False
+
+    def Quit(self, save_option):
+        self.quit = True
+
+
+class FakeBarTenderBackend:
+    """Backend that simulates BarTender so the engine can run on any platform.
+
+    Delays emulate the cost of starting BarTender, opening a format and
+    printing; ``fail_on`` makes the given (1-based) print calls raise so the
+    restart logic can be exercised.
+    """
+
+    name = "fake"
+
+    def __init__(self, startup_delay=0.0, open_delay=0.0, print_delay=0.0, fail_on=None):
+        self.startup_delay = startup_delay
+        self.open_delay = open_delay
+        self.print_delay = print_delay
+        self.fail_on = set(fail_on or ())
+        self.lock = threading.Lock()
+        self.applications_created = 0
+        self.formats_opened = 0
+        self.print_calls = 0
+        self.printed = []
+        self.thread_ids = set()
+
+    def initialize_thread(self):
+        self.thread_ids.add(threading.get_ident())
+
+    def uninitialize_thread(self):
+        pass
+
+    def create_application(self):
+        if self.startup_delay:
+            time.sleep(self.startup_delay)
+        with self.lock:
+            self.applications_created += 1
+        return FakeBarTenderApplication(self)
+
+    def _on_open(self, path):
+        if self.open_delay:
+            time.sleep(self.open_delay)
+        with self.lock:
+            self.formats_opened += 1
+        return FakeBarTenderFormat(self, path)
+
+    def _on_print(self, bt_format):
+        if self.print_delay:
+            time.sleep(self.print_delay)
+        with self.lock:
+            self.print_calls += 1
+            if self.print_calls in self.fail_on:
+                raise RuntimeError(f"Simulated BarTender failure on print {self.print_calls}")
+            self.printed.append((bt_format.path, dict(bt_format.values), bt_format.Printer))
+
+
+def create_backend(name):
+    """Return a print backend by name ('bartender' or 'fake')."""
+    if name == "fake":
+        return FakeBarTenderBackend()
+    return BarTenderComBackend()
+
+
+# =============================================================================
+# FORMAT CACHE
+# =============================================================================
+
+class FormatCache:
+    """Keeps opened BarTender formats resident between jobs.
+
+    Entries are keyed by template path and validated against the file's
+    (mtime, size) on every lookup, so a template edited on disk is reopened.
+    COM objects belong to the engine thread: get()/close_all() must only be
+    called there, while invalidate() may be called from any thread and is
+    applied on the next get().
+    """
+
+    def __init__(self, max_formats=4):
+        self.max_formats = max_formats
+        self.formats = OrderedDict()  # path -> (key, format)
+        self.lock = threading.Lock()
+        self.pending_invalidations = set()
+        self.invalidate_all = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _file_key(path):
+        stat = os.stat(path)
+        return (os.path.normcase(os.path.abspath(path)), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, application, path):
+        """Return an open format for path, opening it on a miss."""
+        self._apply_invalidations()
+        key = self._file_key(path)
+
+        entry = self.formats.get(path)
+        if entry is not None:
+            if entry[0] == key:
+                self.formats.move_to_end(path)
+                with self.lock:
+                    self.hits += 1
+                return entry[1]
+            # Template changed on disk since it was opened
+            self._close(path)
+            with self.lock:
+                self.invalidations += 1
+
+        bt_format = application.Formats.Open(path, False, "")
+        with self.lock:
+            self.misses += 1
+        self.formats[path] = (key, bt_format)
+        while len(self.formats) > self.max_formats:
+            oldest = next(iter(self.formats))
+            self._close(oldest)
+            with self.lock:
+                self.evictions += 1
+        return bt_format
+
+    def discard(self, path):
+        """Close and forget a single format (e.g. after a failed print)."""
+        if path in self.formats:
+            self._close(path)
+
+    def invalidate(self, path=None):
+        """Schedule a template (or every template when path is None) for reopening."""
+        with self.lock:
+            if path is None:
+                self.invalidate_all = True
+            else:
+                self.pending_invalidations.add(path)
+
+    def close_all(self):
+        """Close every resident format (engine thread only)."""
+        for path in list(self.formats):
+            self._close(path)
+        with self.lock:
+            self.pending_invalidations.clear()
+            self.invalidate_all = False
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "resident": len(self.formats),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+    def _apply_invalidations(self):
+        with self.lock:
+            invalidate_all = self.invalidate_all
+            paths = self.pending_invalidations
+            self.invalidate_all = False
+            self.pending_invalidations = set()
+        targets = list(self.formats) if invalidate_all else [p for p in paths if p in self.formats]
+        for path in targets:
+            self._close(path)
+            with self.lock:
+                self.invalidations += 1
+
+    def _close(self, path):
+        _, bt_format = self.formats.pop(path)
+        try:
+            bt_format.Close(0)  # 0 = don't save changes
+        except Exception as exc:
+            logger.warning("Error closing BarTender format %s: %s", path, exc)
+
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+class PrintJob:
+    """A single label print handed to the engine thread."""
+
+    def __init__(self, template_path, values, printer=None):
+        self.template_path = template_path
+        self.values = list(values)
+        self.printer = printer
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Cancel the job if the engine has not started it yet."""
+        with self._lock:
+            if self.started_at is None:
+                self.cancelled = True
+            return self.cancelled
+
+    def _begin(self):
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.started_at = time.time()
+            return True
+
+    def wait(self, timeout=None):
+        """Wait for the job and raise if it failed or did not finish in time."""
+        if not self.done.wait(timeout):
+            if self.cancel():
+                raise PrintEngineTimeout("Print job timed out before BarTender picked it up")
+            raise PrintEngineTimeout("Print job timed out while BarTender was printing")
+        if self.error is not None:
+            raise PrintEngineError(str(self.error)) from self.error
+        return True
+
+
+class PrintEngine:
+    """Owns one BarTender application on a dedicated STA worker thread."""
+
+    def __init__(self, backend=None, max_jobs_per_engine=500, idle_timeout=None, max_formats=4):
+        self.backend = backend or BarTenderComBackend()
+        self.max_jobs_per_engine = max_jobs_per_engine
+        self.idle_timeout = idle_timeout
+        self.format_cache = FormatCache(max_formats)
+        self.jobs = Queue()
+        self.lock = threading.Lock()
+        self.control_lock = threading.Lock()  # serializes start() and stop()
+        self.running = False
+        self.thread = None
+        self.application = None
+        self.jobs_since_start = 0
+        self.last_job_at = None
+        self.stats = {
+            "engine_starts": 0,
+            "engine_restarts": 0,
+            "jobs_completed": 0,
+            "jobs_failed": 0,
+            "jobs_cancelled": 0,
+            "last_error": None,
+        }
+
+    def start(self, timeout=10):
+        """Start the engine thread if it is not running.
+
+        A thread that is still stopping is waited for first, so two STA threads
+        never share the engine; raises PrintEngineError if it does not end.
+        """
+        with self.control_lock:
+            with self.lock:
+                if self.running and self.thread and self.thread.is_alive():
+                    return
+                previous = self.thread
+            if previous and previous is not threading.current_thread() and previous.is_alive():
+                previous.join(timeout)
+                if previous.is_alive():
+                    raise PrintEngineError("Previous print engine thread is still stopping")
+            with self.lock:
+                self.running = True
+                self.thread = threading.Thread(target=self._run, name="PrintEngine", daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=10):
+        """Stop the engine thread and quit BarTender."""
+        with self.control_lock:
+            with self.lock:
+                if not self.running:
+                    return
+                self.running = False
+                thread = self.thread
+            self.jobs.put(None)
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def submit(self, template_path, values, printer=None):
+        """Queue a print job and return it without waiting."""
+        self.start()
+        job = PrintJob(template_path, values, printer)
+        self.jobs.put(job)
+        return job
+
+    def print_label(self, template_path, values, printer=None, timeout=None):
+        """Queue a print job and wait for BarTender to print it."""
+        return self.submit(template_path, values, printer).wait(timeout)
+
+    def invalidate_formats(self, path=None):
+        """Reopen a template (or all templates) before their next print."""
+        self.format_cache.invalidate(path)
+
+    def get_stats(self):
+        """Return engine counters for monitoring."""
+        with self.lock:
+            stats = dict(self.stats)
+            stats.update({
+                "backend": getattr(self.backend, "name", type(self.backend).__name__),
+                "running": self.running,
+                "engine_loaded": self.application is not None,
+                "jobs_since_start": self.jobs_since_start,
+                "queued": self.jobs.qsize(),
+            })
+        stats["format_cache"] = self.format_cache.get_stats()
+        return stats
+
+    def _run(self):
+        """Engine loop: all COM calls happen on this thread."""
+        try:
+            self.backend.initialize_thread()
+        except Exception as exc:
+            logger.error("Print engine could not initialise COM: %s", exc)
+            with self.lock:
+                self.running = False
+                self.stats["last_error"] = str(exc)
+            self._fail_pending(exc)
+            return
+
+        try:
+            while self.running:
+                try:
+                    job = self.jobs.get(timeout=1)
+                except Empty:
+                    self._quit_if_idle()
+                    continue
+                if job is None:
+                    break
+                self._process(job)
+        finally:
+            self._quit_application()
+            self._fail_pending(PrintEngineError("Print engine stopped"))
+            try:
+                self.backend.uninitialize_thread()
+            except Exception:
+                pass
+
+    def _process(self, job):
+        if not job._begin():
+            with self.lock:
+                self.stats["jobs_cancelled"] += 1
+            job.done.set()
+            return
+
+        try:
+            self._ensure_application()
+            self._print(job)
+            with self.lock:
+                self.jobs_since_start += 1
+                self.stats["jobs_completed"] += 1
+        except Exception as exc:
+            job.error = exc
+            logger.warning("Print engine job failed, restarting BarTender: %s", exc)
+            with self.lock:
+                self.stats["jobs_failed"] += 1
+                self.stats["last_error"] = str(exc)
+            self._restart_application()
+        finally:
+            job.finished_at = time.time()
+            self.last_job_at = job.finished_at
+            job.done.set()
+
+        if self.max_jobs_per_engine and self.jobs_since_start >= self.max_jobs_per_engine:
+            logger.info("Recycling BarTender after %d jobs", self.jobs_since_start)
+            self._restart_application()
+
+    def _print(self, job):
+        bt_format = self.format_cache.get(self.application, job.template_path)
+        try:
+            for name, value in job.values:
+                bt_format.SetNamedSubStringValue(name, value)
+            if job.printer:
+                bt_format.Printer = job.printer
+            bt_format.PrintOut(False, False)
+        except Exception:
+            self.format_cache.discard(job.template_path)
+            raise
+
+    def _ensure_application(self):
+        if self.application is not None:
+            return
+        start = time.time()
+        application = self.backend.create_application()
+        with self.lock:
+            self.application = application
+            self.jobs_since_start = 0
+            self.stats["engine_starts"] += 1
+        logger.info("BarTender engine started in %.3fs", time.time() - start)
+
+    def _restart_application(self):
+        # Only count a restart that quit a running BarTender (not a failed start)
+        if self._quit_application():
+            with self.lock:
+                self.stats["engine_restarts"] += 1
+
+    def _quit_application(self):
+        """Quit BarTender; returns False when no application was loaded."""
+        application = self.application
+        if application is None:
+            return False
+        self.format_cache.close_all()
+        with self.lock:
+            self.application = None
+            self.jobs_since_start = 0
+        try:
+            application.Quit(0)  # 0 = don't save changes
+        except Exception as exc:
+            logger.warning("Error quitting BarTender: %s", exc)
+        return True
+
+    def _quit_if_idle(self):
+        if (self.idle_timeout and self.application is not None and self.last_job_at
+                and time.time() - self.last_job_at > self.idle_timeout):
+            logger.info("Releasing idle BarTender engine")
+            self._quit_application()
+
+    def _fail_pending(self, error):
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except Empty:
+                return
+            if job is not None and not job.done.is_set():
+                job.error = error
+                job.done.set()
@@ -0,0 +1,371 @@
+"""
+Asynchronous print job queue for Label Print Server.
+
+/print validates a request, submits it here and returns a job id straight
+away; a small worker pool drains the queue and runs the actual print so slow
+BarTender jobs never pin a waitress request thread:
+- jobs move through queued -> printing -> done / failed
+- each job records how long it spent in every stage
+- finished jobs are kept in memory (bounded) for /jobs and /jobs/<id>
+- with a journal attached, jobs are persisted before /print answers and
+  unfinished jobs are replayed on startup (at-least-once printing)
+- transient failures are retried with bounded exponential backoff; jobs that
+  still fail end up in the journal's dead-letter list
+- a job may carry a deadline (PRINT_JOB_TTL, see deadline.py); no retry is
+  scheduled to start after it
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from queue import Queue, Empty
+
+
+logger = logging.getLogger("print_jobs")
+
+QUEUED = "queued"
+PRINTING = "printing"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+DISMISSED = "dismissed"
+FINISHED_STATES = (DONE, FAILED, DISMISSED)
+
+
+class PrintJobError(Exception):
+    """Raised by a print handler to fail a job with a user-facing message.
+
+    Transient errors (BarTender/spooler hiccups) are retried; permanent ones
+    (e.g. missing template) fail the job immediately.
+    """
+
+    def __init__(self, message, transient=False):
+        super().__init__(message)
+        self.transient = transient
+
+
+class PrintJob:
+    """A print request tracked from submission to completion."""
+
+    def __init__(self, payload, job_id=None, deadline=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.payload = dict(payload)
+        self.deadline = deadline  # not journaled: recovered jobs have none
+        self.status = QUEUED
+        self.message = "Queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = OrderedDict()  # stage name -> duration in ms
+        self.attempts = 0
+        self.record = None  # history row written atomically with completion
+        self.done = threading.Event()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a named stage of the job (e.g. 'print', 'record')."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.time() - start) * 1000, 2)
+
+    def to_dict(self):
+        timings = {'queue_ms': None, 'total_ms': None}
+        if self.started_at:
+            timings['queue_ms'] = round((self.started_at - self.created_at) * 1000, 2)
+        for name, duration in self.stages.items():
+            timings[f'{name}_ms'] = duration
+        if self.finished_at:
+            timings['total_ms'] = round((self.finished_at - self.created_at) * 1000, 2)
+
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'message': self.message,
+            'quotation': self.payload.get('quotation'),
+            'copies': self.payload.get('copies', 1),
+            'attempts': self.attempts,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'timings': timings,
+        }
+
+
+class PrintJobManager:
+    """Queue plus worker pool that runs print jobs in the background.
+
+    ``handler(job)`` does the work for one job; it returns a success message
+    (or None) and raises to fail the job. It may set ``job.record`` to a
+    history row that the journal stores in the same transaction as the job's
+    completion, so replaying a finished job never records it twice.
+
+    ``journal`` is optional; when given it must provide add_job, update_job
+    (with ``expected``, returning the rows changed), complete_job, get_job and
+    pending_jobs (see printed_db).
+    """
+
+    def __init__(self, handler, workers=2, max_retained=500, journal=None,
+                 max_attempts=4, retry_base_delay=1.0, retry_max_delay=30.0):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_retained = max_retained
+        self.journal = journal
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.queue = Queue()
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.running = False
+        self.threads = []
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'retried': 0,
+            'recovered': 0,
+        }
+
+    def start(self):
+        """Start the worker pool."""
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.threads = [
+                threading.Thread(target=self._worker, name=f"PrintWorker-{i + 1}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the workers once they finish their current job."""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            threads = list(self.threads)
+        for _ in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, payload, deadline=None):
+        """Journal and queue a validated print request and return its job."""
+        self.start()
+        job = PrintJob(payload, deadline=deadline)
+        if self.journal is not None:
+            self.journal.add_job(job.id, job.payload)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.stats['submitted'] += 1
+            self._trim()
+        self.queue.put(job)
+        return job
+
+    def recover(self):
+        """Re-queue jobs the journal says were unfinished when the process stopped."""
+        if self.journal is None:
+            return 0
+        recovered = 0
+        for row in self.journal.pending_jobs():
+            with self.lock:
+                if row['id'] in self.jobs:
+                    continue
+                job = PrintJob(row['payload'], job_id=row['id'])
+                job.attempts = row['attempts']
+                job.message = "Recovered after restart"
+                self.jobs[job.id] = job
+                self.stats['recovered'] += 1
+            self.journal.update_job(job.id, QUEUED)
+            self.queue.put(job)
+            recovered += 1
+        if recovered:
+            self.start()
+            logger.info("Recovered %d unfinished print job(s) from the journal", recovered)
+        return recovered
+
+    def retry(self, job_id):
+        """Re-queue a failed (dead-letter) job. Returns the job or None.
+
+        The move out of FAILED happens under the lock, and in the journal only
+        while the row is still failed, so a concurrent retry or dismiss can
+        never queue the same job twice.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                if job.status != FAILED:
+                    return None
+                job.status = QUEUED
+        known = job is not None
+        if not known:
+            row = self.journal.get_job(job_id) if self.journal is not None else None
+            if row is None or row['status'] != FAILED:
+                return None
+            with self.lock:
+                if job_id in self.jobs:
+                    return None
+                job = self.jobs[job_id] = PrintJob(row['payload'], job_id=row['id'])
+        if self.journal is not None and not self.journal.update_job(
+                job.id, QUEUED, attempts=0, wait=True, expected=FAILED):
+            # Another process (or a journal-only dismiss) moved it first
+            with self.lock:
+                if known:
+                    job.status = FAILED
+                else:
+                    self.jobs.pop(job.id, None)
+            return None
+
+        job.message = "Queued for retry"
+        job.attempts = 0
+        job.deadline = None
+        job.started_at = job.finished_at = None
+        job.done.clear()
+        self.start()
+        self.queue.put(job)
+        return job
+
+    def dismiss(self, job_id):
+        """Remove a failed job from the dead-letter list."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                if job.status != FAILED:
+                    return False
+                job.status = DISMISSED
+        if self.journal is None:
+            return job is not None
+        if self.journal.update_job(job_id, DISMISSED, wait=True, expected=FAILED):
+            return True
+        if job is not None:
+            with self.lock:
+                job.status = FAILED
+        return False
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self, limit=50, status=None):
+        """Return the most recent jobs first, optionally filtered by status."""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        jobs.reverse()
+        if status:
+            jobs = [job for job in jobs if job.status == status]
+        return jobs[:limit]
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['workers'] = self.workers
+            stats['queued'] = sum(1 for job in self.jobs.values() if job.status == QUEUED)
+            stats['printing'] = sum(1 for job in self.jobs.values() if job.status == PRINTING)
+            stats['retrying'] = sum(1 for job in self.jobs.values() if job.status == RETRYING)
+        return stats
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond max_retained (lock held)."""
+        excess = len(self.jobs) - self.max_retained
+        if excess <= 0:
+            return
+        for job_id in list(self.jobs):
+            if excess <= 0:
+                break
+            if self.jobs[job_id].status in FINISHED_STATES:
+                del self.jobs[job_id]
+                excess -= 1
+
+    def _worker(self):
+        while self.running:
+            try:
+                job = self.queue.get(timeout=1)
+            except Empty:
+                continue
+            if job is None:
+                break
+            self._run(job)
+
+    def _run(self, job):
+        if job.status in FINISHED_STATES:
+            return
+        job.attempts += 1
+        job.started_at = job.started_at or time.time()
+        job.status = PRINTING
+        job.message = "Printing"
+        if self.journal is not None:
+            self._journal_update(job, PRINTING)
+
+        try:
+            message = self.handler(job)
+        except Exception as exc:
+            self._handle_failure(job, exc)
+            return
+
+        try:
+            if self.journal is not None:
+                with job.stage('record'):
+                    self.journal.complete_job(job.id, job.record)
+        except Exception as exc:
+            # Printed already; a journal failure must not trigger a reprint
+            logger.error("Failed to journal completion of print job %s: %s", job.id, exc)
+        job.status = DONE
+        job.message = message or "Printed"
+        with self.lock:
+            self.stats['completed'] += 1
+        self._finish(job)
+
+    def _handle_failure(self, job, exc):
+        transient = getattr(exc, 'transient', not isinstance(exc, PrintJobError))
+        error = str(exc) or type(exc).__name__
+        if not isinstance(exc, PrintJobError):
+            logger.error("Print job %s failed: %s", job.id, exc, exc_info=True)
+
+        retry = transient and job.attempts < self.max_attempts and self.running
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (job.attempts - 1)))
+        if retry and job.deadline is not None and job.deadline.remaining() <= delay:
+            # The retry would start after the job's deadline
+            job.deadline.record('print_retry')
+            retry = False
+            error = f"{error} - not retried, job deadline reached"
+
+        if retry:
+            job.status = RETRYING
+            job.message = f"{error} - retrying in {delay:g}s (attempt {job.attempts + 1}/{self.max_attempts})"
+            with self.lock:
+                self.stats['retried'] += 1
+            if self.journal is not None:
+                self._journal_update(job, RETRYING, error)
+            timer = threading.Timer(delay, self._requeue, args=(job,))
+            timer.daemon = True
+            timer.start()
+            return
+
+        job.status = FAILED
+        job.message = error
+        with self.lock:
+            self.stats['failed'] += 1
+        if self.journal is not None:
+            self._journal_update(job, FAILED, error)
+        self._finish(job)
+
+    def _requeue(self, job):
+        if self.running and job.status == RETRYING:
+            self.queue.put(job)
+
+    def _journal_update(self, job, status, error=None):
+        try:
+            self.journal.update_job(job.id, status, attempts=job.attempts, error=error)
+        except Exception as exc:
+            logger.error("Failed to journal print job %s (%s): %s", job.id, status, exc)
+
+    def _finish(self, job):
+        job.finished_at = time.time()
+        job.done.set()
@@ -1,8 +1,14 @@
 import sqlite3
 import os
 import sys
+import json
 import threading
-from datetime import datetime, timezone
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from queue import Queue, Empty
 
 # Use AppData for database when installed in Program Files
 app_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__)
@@ -14,95 +20,822 @@ if getattr(sys, 'frozen', False) or 'Program Files' in app_dir:
 else:
     DB_FILE = os.path.join(app_dir, 'printed_records.db')
 
-# Thread-local storage for database connections
-_thread_local = threading.local()
+class StorageConfig:
+    """SQLite tuning for the printed DB.
 
-def _get_connection():
-    """Get a thread-local database connection (connection reuse per thread)"""
-    if not hasattr(_thread_local, 'connection') or _thread_local.connection is None:
-        _thread_local.connection = sqlite3.connect(DB_FILE, check_same_thread=False)
-        _thread_local.connection.row_factory = sqlite3.Row
-    return _thread_local.connection
+    WAL lets history searches run while the writer commits, and
+    synchronous=NORMAL only fsyncs at checkpoints instead of every commit.
+    Every setting can be overridden with a PRINTED_DB_* environment variable.
+    """
 
-def init_db():
-    """Initialize the SQLite database and table if not exists."""
-    conn = _get_connection()
+    def __init__(self, journal_mode='WAL', synchronous='NORMAL', cache_size_kb=16384,
+                 mmap_size_mb=64, busy_timeout_ms=5000, read_pool_size=4,
+                 checkpoint_interval=60):
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self.busy_timeout_ms = busy_timeout_ms
+        self.read_pool_size = read_pool_size
+        self.checkpoint_interval = checkpoint_interval
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            journal_mode=env.get('PRINTED_DB_JOURNAL_MODE', 'WAL').upper(),
+            synchronous=env.get('PRINTED_DB_SYNCHRONOUS', 'NORMAL').upper(),
+            cache_size_kb=int(env.get('PRINTED_DB_CACHE_KB', '16384')),
+            mmap_size_mb=int(env.get('PRINTED_DB_MMAP_MB', '64')),
+            busy_timeout_ms=int(env.get('PRINTED_DB_BUSY_TIMEOUT_MS', '5000')),
+            read_pool_size=int(env.get('PRINTED_DB_READERS', '4')),
+            checkpoint_interval=int(env.get('PRINTED_DB_CHECKPOINT_SECONDS', '60'))
+        )
+
+    def apply(self, conn, writer=False):
+        """Apply connection pragmas (journal mode is persistent and set by the writer)."""
+        if writer:
+            conn.execute(f'PRAGMA journal_mode={self.journal_mode}')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size_mb) * 1024 * 1024}')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class ReadConnectionPool:
+    """Small pool of read-only connections for history searches and job lookups."""
+
+    def __init__(self, db_file, config):
+        self.db_file = db_file
+        self.config = config
+        self.pool = Queue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.waits = 0
+
+    def _connect(self):
+        uri = Path(self.db_file).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        self.config.apply(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a read-only connection, creating one while under the pool size."""
+        conn = None
+        try:
+            conn = self.pool.get_nowait()
+        except Empty:
+            with self.lock:
+                can_create = self.created < max(1, self.config.read_pool_size)
+                if can_create:
+                    self.created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            else:
+                with self.lock:
+                    self.waits += 1
+                conn = self.pool.get(timeout=self.config.busy_timeout_ms / 1000)
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self.pool.get_nowait()
+            except Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self.lock:
+                self.created -= 1
+
+    def get_stats(self):
+        with self.lock:
+            return {'size': self.config.read_pool_size, 'open': self.created,
+                    'idle': self.pool.qsize(), 'waits': self.waits}
+
+
+class Checkpointer:
+    """Background thread that runs wal_checkpoint(PASSIVE) periodically.
+
+    PASSIVE never blocks readers or the writer; it copies whatever it can from
+    the WAL back into the database so the WAL file stays small.
+    """
+
+    def __init__(self, db_file, config):
+        self.db_file = db_file
+        self.config = config
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stats = {'runs': 0, 'last_run': None, 'last_result': None, 'last_error': None}
+
+    def start(self):
+        if self.config.journal_mode != 'WAL' or self.config.checkpoint_interval <= 0:
+            return
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='PrintedDBCheckpoint', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def checkpoint(self, conn):
+        busy, log_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        with self.lock:
+            self.stats['runs'] += 1
+            self.stats['last_run'] = datetime.now().isoformat()
+            self.stats['last_result'] = {'busy': busy, 'wal_frames': log_frames, 'checkpointed': checkpointed}
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        try:
+            self.config.apply(conn)
+            while not self.stop_event.wait(self.config.checkpoint_interval):
+                try:
+                    self.checkpoint(conn)
+                except Exception as e:
+                    with self.lock:
+                        self.stats['last_error'] = str(e)
+            # Final checkpoint so a clean shutdown leaves a small WAL behind
+            try:
+                self.checkpoint(conn)
+            except Exception:
+                pass
+        finally:
+            conn.close()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+# Writer tuning (batch window, batch size and queue bound)
+WRITER_MAX_DELAY = float(os.environ.get('PRINTED_DB_WRITER_DELAY_MS', '5')) / 1000
+WRITER_MAX_BATCH = int(os.environ.get('PRINTED_DB_WRITER_BATCH', '200'))
+WRITER_QUEUE_SIZE = int(os.environ.get('PRINTED_DB_WRITER_QUEUE', '10000'))
+
+class GroupCommitWriter:
+    """Single writer thread that commits queued write operations in batches.
+
+    All writes to the printed DB go through one long-lived connection owned
+    by this thread. Each operation is a callable taking that connection.
+    Operations arriving within ``max_delay`` seconds of each other (up to
+    ``max_batch``) share one transaction, so one fsync covers the whole
+    batch. Every operation runs inside its own savepoint, so a failing
+    operation does not roll back the rest of the batch. The queue is bounded;
+    producers block briefly when the writer falls behind.
+    """
+
+    def __init__(self, db_file, config, max_batch=WRITER_MAX_BATCH, max_delay=WRITER_MAX_DELAY,
+                 max_queue=WRITER_QUEUE_SIZE):
+        self.db_file = db_file
+        self.config = config
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self.stats = {
+            'operations': 0,
+            'failed_operations': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_flush_ms': None,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+            'max_backlog': 0,
+        }
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('Printed DB writer is shut down')
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='PrintedDBWriter', daemon=True)
+                self.thread.start()
+
+    def submit(self, operation, wait=True, timeout=30):
+        """Queue an operation; when wait is True block until it is committed."""
+        self._ensure_started()
+        op = {'fn': operation, 'done': threading.Event(), 'result': None, 'error': None}
+        self.queue.put(op, timeout=timeout)
+        backlog = self.queue.qsize()
+        if backlog > self.stats['max_backlog']:
+            self.stats['max_backlog'] = backlog
+        if not wait:
+            return None
+        if not op['done'].wait(timeout):
+            raise TimeoutError('Timed out waiting for printed DB commit')
+        if op['error'] is not None:
+            raise op['error']
+        return op['result']
+
+    def flush(self, timeout=30):
+        """Block until everything queued so far has been committed."""
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.submit(lambda conn: None, wait=True, timeout=timeout)
+
+    def shutdown(self, timeout=30):
+        """Flush pending writes, then stop the writer thread and close its connection."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self.thread
+        if thread is None or not thread.is_alive():
+            return
+        self.queue.put(None, timeout=timeout)
+        thread.join(timeout)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        batches = stats['batches']
+        stats['backlog'] = self.queue.qsize()
+        stats['avg_batch_size'] = round(stats['operations'] / batches, 2) if batches else None
+        stats['avg_flush_ms'] = round(stats.pop('total_flush_ms') / batches, 2) if batches else None
+        stats['running'] = bool(self.thread and self.thread.is_alive())
+        return stats
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            self.config.apply(conn, writer=True)
+        except Exception:
+            pass  # Tuning is best-effort (e.g. WAL is unavailable on some network shares)
+        try:
+            stopping = False
+            while not stopping:
+                op = self.queue.get()
+                if op is None:
+                    break
+                batch = [op]
+                deadline = time.monotonic() + self.max_delay
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        op = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                    except Empty:
+                        break
+                    if op is None:
+                        stopping = True
+                        break
+                    batch.append(op)
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        start = time.perf_counter()
+        failed = 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for op in batch:
+                conn.execute('SAVEPOINT op')
+                try:
+                    op['result'] = op['fn'](conn)
+                    conn.execute('RELEASE op')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    op['error'] = e
+                    failed += 1
+            conn.execute('COMMIT')
+        except Exception as e:
+            try:
+                conn.execute('ROLLBACK')
+            except Exception:
+                pass
+            for op in batch:
+                if op['error'] is None:
+                    op['error'] = e
+                    failed += 1
+        finally:
+            flush_ms = (time.perf_counter() - start) * 1000
+            with self.lock:
+                self.stats['operations'] += len(batch)
+                self.stats['failed_operations'] += failed
+                self.stats['batches'] += 1
+                self.stats['last_batch_size'] = len(batch)
+                self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(batch))
+                self.stats['last_flush_ms'] = round(flush_ms, 2)
+                self.stats['max_flush_ms'] = round(max(self.stats['max_flush_ms'], flush_ms), 2)
+                self.stats['total_flush_ms'] += flush_ms
+            for op in batch:
+                op['done'].set()
+
+
+_config = StorageConfig.from_env()
+_writer = GroupCommitWriter(DB_FILE, _config)
+_readers = ReadConnectionPool(DB_FILE, _config)
+_checkpointer = Checkpointer(DB_FILE, _config)
+
+def configure(db_file=None, config=None):
+    """Switch to another database file and/or storage config.
+
+    Flushes and closes the current writer, readers and checkpointer; used by
+    tools and benchmarks. Call init_db() afterwards.
+    """
+    global DB_FILE, _config, _writer, _readers, _checkpointer
+    shutdown()
+    if db_file is not None:
+        DB_FILE = db_file
+    if config is not None:
+        _config = config
+    _writer = GroupCommitWriter(DB_FILE, _config)
+    _readers = ReadConnectionPool(DB_FILE, _config)
+    _checkpointer = Checkpointer(DB_FILE, _config)
+
+def flush(timeout=30):
+    """Wait until all queued printed DB writes are committed."""
+    _writer.flush(timeout)
+
+def shutdown(timeout=30):
+    """Flush queued writes, stop background threads and close connections (call on exit)."""
+    _writer.shutdown(timeout)
+    _checkpointer.stop()
+    _readers.close_all()
+
+def get_writer_stats():
+    """Backlog, batch size and flush latency metrics for the writer thread."""
+    return _writer.get_stats()
+
+def get_storage_stats():
+    """Storage configuration, read pool and checkpoint status."""
+    return {
+        'config': _config.to_dict(),
+        'readers': _readers.get_stats(),
+        'checkpoint': _checkpointer.get_stats(),
+        'search_backend': 'fts5' if _fts_enabled else 'like'
+    }
+
+def _create_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS printed (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quotation TEXT NOT NULL,
+            party TEXT,
+            address TEXT,
+            phone TEXT,
+            mobile TEXT,
+            printed_at TEXT NOT NULL
+        )
+    ''')
+    # Create index for faster searches
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_quotation ON printed(quotation)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_printed_at ON printed(printed_at DESC)
+    ''')
+    # Row counter kept by triggers so unfiltered totals never scan the table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS printed_stats (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS printed_count_ai AFTER INSERT ON printed BEGIN
+            UPDATE printed_stats SET value = value + 1 WHERE key = 'printed_count';
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS printed_count_ad AFTER DELETE ON printed BEGIN
+            UPDATE printed_stats SET value = value - 1 WHERE key = 'printed_count';
+        END
+    ''')
+    conn.execute('''
+        INSERT INTO printed_stats (key, value)
+        SELECT 'printed_count', (SELECT COUNT(*) FROM printed)
+        WHERE NOT EXISTS (SELECT 1 FROM printed_stats WHERE key = 'printed_count')
+    ''')
+    # Durable print job journal (replayed on startup)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS print_jobs (
+            id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_print_jobs_status ON print_jobs(status, created_at)
+    ''')
+    _create_search_index(conn)
+
+# =============================================================================
+# FULL-TEXT SEARCH
+# =============================================================================
+
+# Trigram FTS5 index over the searchable columns of printed. It is an
+# external-content table (no second copy of the text) kept in sync by
+# triggers; searches shorter than three characters, or interpreters whose
+# SQLite lacks FTS5/trigram (< 3.34), fall back to LIKE.
+_fts_enabled = False
+FTS_MIN_QUERY = 3
+
+_FTS_TRIGGERS = {
+    'printed_fts_ai': '''
+        CREATE TRIGGER printed_fts_ai AFTER INSERT ON printed BEGIN
+            INSERT INTO printed_fts(rowid, quotation, party, address)
+            VALUES (new.id, new.quotation, new.party, new.address);
+        END
+    ''',
+    'printed_fts_ad': '''
+        CREATE TRIGGER printed_fts_ad AFTER DELETE ON printed BEGIN
+            INSERT INTO printed_fts(printed_fts, rowid, quotation, party, address)
+            VALUES ('delete', old.id, old.quotation, old.party, old.address);
+        END
+    ''',
+    'printed_fts_au': '''
+        CREATE TRIGGER printed_fts_au AFTER UPDATE ON printed BEGIN
+            INSERT INTO printed_fts(printed_fts, rowid, quotation, party, address)
+            VALUES ('delete', old.id, old.quotation, old.party, old.address);
+            INSERT INTO printed_fts(rowid, quotation, party, address)
+            VALUES (new.id, new.quotation, new.party, new.address);
+        END
+    ''',
+}
+
+def _create_search_index(conn):
+    """Create the FTS index and triggers, backfilling existing history once.
+
+    The index is rebuilt whenever the table or any trigger was missing, which
+    covers databases created before the index existed and databases written
+    by an interpreter without FTS5 (which drops the triggers, see below).
+    """
+    global _fts_enabled
+    existing = {
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'printed_fts' OR name LIKE 'printed_fts_a_'"
+        )
+    }
     try:
-        cur = conn.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS printed (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                quotation TEXT NOT NULL,
-                party TEXT,
-                address TEXT,
-                phone TEXT,
-                mobile TEXT,
-                printed_at TEXT NOT NULL
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS printed_fts USING fts5(
+                quotation, party, address,
+                content='printed', content_rowid='id', tokenize='trigram'
             )
         ''')
-        # Create index for faster searches
-        cur.execute('''
-            CREATE INDEX IF NOT EXISTS idx_quotation ON printed(quotation)
-        ''')
-        cur.execute('''
-            CREATE INDEX IF NOT EXISTS idx_printed_at ON printed(printed_at DESC)
-        ''')
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise
-
-def record_print(quotation, party=None, address=None, phone=None, mobile=None):
-    """Record a printed quotation entry."""
-    conn = _get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
+    except sqlite3.OperationalError as e:
+        # No FTS5/trigram in this SQLite build: drop the sync triggers so
+        # inserts keep working, and search with LIKE instead.
+        for name in _FTS_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        _fts_enabled = False
+        print(f"Full-text search unavailable, using LIKE: {e}")
+        return
+
+    for name, sql in _FTS_TRIGGERS.items():
+        if name not in existing:
+            conn.execute(sql)
+    if not existing.issuperset({'printed_fts', *_FTS_TRIGGERS}):
+        conn.execute("INSERT INTO printed_fts(printed_fts) VALUES ('rebuild')")
+    _fts_enabled = True
+
+def rebuild_search_index():
+    """Rebuild the full-text index from the printed table."""
+    if not _fts_enabled:
+        return False
+    _writer.submit(lambda conn: conn.execute("INSERT INTO printed_fts(printed_fts) VALUES ('rebuild')"))
+    return True
+
+def _fts_query(q):
+    """Quote a user search string as a single FTS5 phrase (substring match)."""
+    return '"' + q.replace('"', '""') + '"'
+
+def _use_fts(q):
+    return _fts_enabled and len(q) >= FTS_MIN_QUERY
+
+def search(q, limit=50):
+    """Return the best matches for q, most relevant first.
+
+    Uses bm25 ranking over the FTS index; without FTS (or for very short
+    queries) falls back to LIKE ordered by newest first.
+    """
+    q = (q or '').strip()
+    if not q:
+        return []
+    with _readers.connection() as conn:
+        if _use_fts(q):
+            rows = conn.execute(
+                '''SELECT p.id, p.quotation, p.party, p.address, p.phone, p.mobile, p.printed_at,
+                          printed_fts.rank
+                   FROM printed_fts JOIN printed p ON p.id = printed_fts.rowid
+                   WHERE printed_fts MATCH ?
+                   ORDER BY printed_fts.rank, p.id DESC LIMIT ?''',
+                (_fts_query(q), limit)
+            ).fetchall()
+        else:
+            like = f"%{q}%"
+            rows = conn.execute(
+                '''SELECT id, quotation, party, address, phone, mobile, printed_at, NULL
+                   FROM printed WHERE quotation LIKE ? OR party LIKE ? OR address LIKE ?
+                   ORDER BY id DESC LIMIT ?''',
+                (like, like, like, limit)
+            ).fetchall()
+    results = []
+    for r in rows:
+        record = _record_row_to_dict(r)
+        record['rank'] = r[7]
+        results.append(record)
+    return results
+
+def init_db():
+    """Initialize the SQLite database and tables if not exists."""
+    _writer.submit(_create_schema)
+    _checkpointer.start()
+
+def record_print(quotation, party=None, address=None, phone=None, mobile=None, wait=True):
+    """Record a printed quotation entry through the group-commit writer.
+
+    Returns the new row id, or None when wait is False (the row is committed
+    with the next batch).
+    """
+    printed_at = datetime.now().isoformat()
+    def op(conn):
+        cur = conn.execute(
             'INSERT INTO printed (quotation, party, address, phone, mobile, printed_at) VALUES (?, ?, ?, ?, ?, ?)',
-            (str(quotation), party, address, phone, mobile, datetime.now().isoformat())
+            (str(quotation), party, address, phone, mobile, printed_at)
         )
-        conn.commit()
         return cur.lastrowid
-    except Exception as e:
-        conn.rollback()
-        raise
+    return _writer.submit(op, wait=wait)
+
+RECORD_COLUMNS = 'id, quotation, party, address, phone, mobile, printed_at'
+
+def _search_filter(q):
+    """SQL condition and parameters restricting printed to rows matching q."""
+    if not q:
+        return None, ()
+    if _use_fts(q):
+        return 'id IN (SELECT rowid FROM printed_fts WHERE printed_fts MATCH ?)', (_fts_query(q),)
+    like = f"%{q}%"
+    return '(quotation LIKE ? OR party LIKE ? OR address LIKE ?)', (like, like, like)
+
+def _count_printed(conn):
+    """Total history rows from the trigger-maintained counter."""
+    row = conn.execute("SELECT value FROM printed_stats WHERE key = 'printed_count'").fetchone()
+    return row[0] if row else conn.execute('SELECT COUNT(*) FROM printed').fetchone()[0]
+
+def get_printed_count():
+    """Total history rows, read from the counter through the read pool (no writes, no scan)."""
+    with _readers.connection() as conn:
+        return _count_printed(conn)
+
+# Filtered totals keyed by (query, row count, newest id): a search is counted
+# once per change to the table and reused while the user pages through it.
+_filtered_totals = OrderedDict()
+_filtered_totals_lock = threading.Lock()
+FILTERED_TOTALS_CACHED = 64
+
+def _count_matching(conn, q):
+    if not q:
+        return _count_printed(conn)
+    newest = conn.execute('SELECT MAX(id) FROM printed').fetchone()[0]
+    key = (q, _count_printed(conn), newest)
+    with _filtered_totals_lock:
+        if key in _filtered_totals:
+            _filtered_totals.move_to_end(key)
+            return _filtered_totals[key]
+    where, params = _search_filter(q)
+    total = conn.execute(f'SELECT COUNT(*) FROM printed WHERE {where}', params).fetchone()[0]
+    with _filtered_totals_lock:
+        _filtered_totals[key] = total
+        while len(_filtered_totals) > FILTERED_TOTALS_CACHED:
+            _filtered_totals.popitem(last=False)
+    return total
 
 def get_recent(limit=100, q=None, offset=0):
-    """Get recent printed records with optimized query"""
-    conn = _get_connection()
-    try:
-        cur = conn.cursor()
-        if q:
-            like = f"%{q}%"
-            # total matching count first
-            cur.execute('SELECT COUNT(*) FROM printed WHERE quotation LIKE ? OR party LIKE ? OR address LIKE ?', (like, like, like))
-            total = cur.fetchone()[0]
-            # then fetch page rows
-            cur.execute(
-                'SELECT id, quotation, party, address, phone, mobile, printed_at FROM printed WHERE quotation LIKE ? OR party LIKE ? OR address LIKE ? ORDER BY id DESC LIMIT ? OFFSET ?',
-                (like, like, like, limit, offset)
+    """Get recent printed records with LIMIT/OFFSET paging.
+
+    Kept for old clients; get_page() seeks on the primary key instead and
+    does not slow down on deep pages.
+    """
+    where, params = _search_filter(q)
+    with _readers.connection() as conn:
+        total = _count_matching(conn, q)
+        rows = conn.execute(
+            f'SELECT {RECORD_COLUMNS} FROM printed {"WHERE " + where if where else ""} '
+            'ORDER BY id DESC LIMIT ? OFFSET ?',
+            params + (limit, offset)
+        ).fetchall()
+    return {'total': total, 'records': [_record_row_to_dict(r) for r in rows]}
+
+def get_page(limit=50, q=None, before_id=None, after_id=None, with_total=True):
+    """Keyset-paginated history, newest first.
+
+    before_id returns the page of older rows (id < before_id), after_id the
+    page of newer rows (id > after_id); with neither, the newest page. Use
+    next_before_id / prev_after_id from the result to move between pages.
+    Unfiltered totals come from the counter; filtered totals are computed
+    once per search and cached, or skipped entirely with with_total=False.
+    """
+    where, params = _search_filter(q)
+    conditions = [where] if where else []
+    if after_id is not None:
+        conditions.append('id > ?')
+        params += (int(after_id),)
+        order = 'ASC'
+    else:
+        if before_id is not None:
+            conditions.append('id < ?')
+            params += (int(before_id),)
+        order = 'DESC'
+    sql = f'SELECT {RECORD_COLUMNS} FROM printed'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY id {order} LIMIT ?'
+
+    with _readers.connection() as conn:
+        rows = conn.execute(sql, params + (limit + 1,)).fetchall()
+        total = _count_matching(conn, q) if with_total else None
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is not None:
+        rows.reverse()
+    records = [_record_row_to_dict(r) for r in rows]
+
+    if after_id is not None:
+        has_newer, has_older = more, True
+    else:
+        has_newer, has_older = before_id is not None, more
+    return {
+        'records': records,
+        'total': total,
+        'has_more': bool(records) and has_older,
+        'has_newer': bool(records) and has_newer,
+        'next_before_id': records[-1]['id'] if records and has_older else None,
+        'prev_after_id': records[0]['id'] if records and has_newer else None
+    }
+
+def iter_records(q=None, date_from=None, date_to=None, batch_size=500):
+    """Yield matching history rows oldest first, batch_size rows at a time.
+
+    date_from/date_to are inclusive ISO dates (YYYY-MM-DD). Rows are fetched
+    with fetchmany on one read connection, so memory use does not grow with
+    the size of the export; closing the generator releases the connection.
+    """
+    where, params = _search_filter(q)
+    conditions = [where] if where else []
+    if date_from:
+        conditions.append('printed_at >= ?')
+        params += (date_from,)
+    if date_to:
+        conditions.append('printed_at < ?')
+        params += ((datetime.fromisoformat(date_to) + timedelta(days=1)).date().isoformat(),)
+    sql = f'SELECT {RECORD_COLUMNS} FROM printed'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY id'
+
+    with _readers.connection() as conn:
+        cur = conn.execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for r in rows:
+                    yield _record_row_to_dict(r)
+        finally:
+            cur.close()
+
+def _record_row_to_dict(r):
+    return {
+        'id': r[0],
+        'quotation': r[1],
+        'party': r[2],
+        'address': r[3],
+        'phone': r[4],
+        'mobile': r[5],
+        'printed_at': r[6]
+    }
+
+
+# =============================================================================
+# PRINT JOB JOURNAL
+# =============================================================================
+
+UNFINISHED_JOB_STATES = ('queued', 'printing', 'retrying')
+
+def _job_row_to_dict(r):
+    return {
+        'id': r['id'],
+        'payload': json.loads(r['payload']),
+        'status': r['status'],
+        'attempts': r['attempts'],
+        'last_error': r['last_error'],
+        'created_at': r['created_at'],
+        'updated_at': r['updated_at']
+    }
+
+def add_job(job_id, payload, status='queued'):
+    """Durably journal a new print job (returns once committed)."""
+    now = datetime.now().isoformat()
+    def op(conn):
+        conn.execute(
+            'INSERT OR IGNORE INTO print_jobs (id, payload, status, attempts, created_at, updated_at) VALUES (?, ?, ?, 0, ?, ?)',
+            (job_id, json.dumps(payload), status, now, now)
+        )
+    _writer.submit(op)
+
+def update_job(job_id, status, attempts=None, error=None, wait=False, expected=None):
+    """Record a job state change; finished jobs are never moved back.
+
+    With expected, the row only changes while its status is still expected
+    (e.g. 'failed' for a dead-letter retry). Returns the number of rows
+    changed when wait is True.
+    """
+    now = datetime.now().isoformat()
+    condition = " AND status = ?" if expected else ""
+    def op(conn):
+        cur = conn.execute(
+            "UPDATE print_jobs SET status = ?, attempts = COALESCE(?, attempts), last_error = ?, updated_at = ? "
+            "WHERE id = ? AND status != 'done'" + condition,
+            (status, attempts, error, now, job_id) + ((expected,) if expected else ())
+        )
+        return cur.rowcount
+    return _writer.submit(op, wait=wait)
+
+def complete_job(job_id, record=None):
+    """Mark a job done and, in the same transaction, add its history record.
+
+    Replaying a job that already completed is a no-op, so the history never
+    gets a duplicate row for one job.
+    """
+    now = datetime.now().isoformat()
+    def op(conn):
+        cur = conn.execute(
+            "UPDATE print_jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ? AND status != 'done'",
+            (now, job_id)
+        )
+        if cur.rowcount and record:
+            conn.execute(
+                'INSERT INTO printed (quotation, party, address, phone, mobile, printed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (str(record['quotation']), record.get('party'), record.get('address'),
+                 record.get('phone'), record.get('mobile'), now)
             )
-        else:
-            # total count
-            cur.execute('SELECT COUNT(*) FROM printed')
-            total = cur.fetchone()[0]
-            # then fetch page rows
-            cur.execute('SELECT id, quotation, party, address, phone, mobile, printed_at FROM printed ORDER BY id DESC LIMIT ? OFFSET ?', (limit, offset))
-
-        rows = cur.fetchall()
-        result = [
-            {
-                'id': r[0],
-                'quotation': r[1],
-                'party': r[2],
-                'address': r[3],
-                'phone': r[4],
-                'mobile': r[5],
-                'printed_at': r[6]
-            }
-            for r in rows
-        ]
-        return {'total': total, 'records': result}
-    except Exception as e:
-        raise
+        return cur.rowcount > 0
+    return _writer.submit(op)
+
+def get_job(job_id):
+    """Return a journaled job or None."""
+    with _readers.connection() as conn:
+        row = conn.execute('SELECT * FROM print_jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_row_to_dict(row) if row else None
 
+def pending_jobs():
+    """Jobs that were not finished when the process stopped, oldest first."""
+    with _readers.connection() as conn:
+        rows = conn.execute(
+            'SELECT * FROM print_jobs WHERE status IN (?, ?, ?) ORDER BY created_at',
+            UNFINISHED_JOB_STATES
+        ).fetchall()
+    return [_job_row_to_dict(r) for r in rows]
+
+def dead_letter_jobs(limit=50):
+    """Jobs that failed permanently and have not been dismissed, newest first."""
+    with _readers.connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM print_jobs WHERE status = 'failed' ORDER BY updated_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+    return [_job_row_to_dict(r) for r in rows]
+
+def purge_jobs(older_than_days=7):
+    """Delete finished (done/dismissed) journal entries older than the given age."""
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    def op(conn):
+        cur = conn.execute(
+            "DELETE FROM print_jobs WHERE status IN ('done', 'dismissed') AND updated_at < ?",
+            (cutoff,)
+        )
+        return cur.rowcount
+    return _writer.submit(op)
@@ -0,0 +1,238 @@
+"""
+In-memory index of existing quotation numbers for Label Print Server.
+
+Mistyped numbers and the partial prefixes fired by the debounced scan input
+each cost a pooled SQL Server round trip just to learn that no row exists.
+QuotationIndex keeps a bloom filter of every VchNo so those lookups can be
+answered from memory:
+- a full load reads all VchNo values in batches; later refreshes only fetch
+  values above the stored high-water mark (VchNo is right-aligned, so string
+  order is number order)
+- a number the filter has never seen is a definite miss, but only up to the
+  high-water mark: newer numbers may have been created since the last
+  refresh, so callers still query SQL Server for them
+- a periodic full rebuild drops deleted quotations and resizes the filter
+  once it holds more numbers than it was sized for
+
+``fetch(after_vch_no, limit)`` returns up to ``limit`` VchNo values greater
+than ``after_vch_no`` ('' for all) in ascending order.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+
+
+logger = logging.getLogger("quotation_index")
+
+
+class BloomFilter:
+    """Fixed-size bloom filter sized for ``capacity`` items at ``fp_rate``."""
+
+    def __init__(self, capacity, fp_rate=0.01):
+        self.capacity = max(1, int(capacity))
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        added = False
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def expected_fp_rate(self):
+        """False-positive probability for the current number of items."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class QuotationIndex:
+    """Bloom filter of existing VchNo values, refreshed in the background."""
+
+    def __init__(self, fetch, interval=30, capacity=500000, fp_rate=0.01, batch_size=50000,
+                 full_rebuild_interval=24 * 3600):
+        self.fetch = fetch
+        self.interval = interval
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.batch_size = batch_size
+        self.full_rebuild_interval = full_rebuild_interval
+        self.bloom = None
+        self.high_water = None
+        self.last_full_load = 0
+        self.last_refresh = None
+        self.rebuild_requested = False
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {
+            'checks': 0,
+            'definite_misses': 0,
+            'false_positives': 0,
+            'full_loads': 0,
+            'refreshes': 0,
+            'errors': 0,
+            'last_refresh_ms': None,
+            'last_refresh_rows': 0,
+            'last_error': None,
+        }
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def definitely_missing(self, vch_no):
+        """True only if vch_no is known not to exist (never for numbers newer than the index)."""
+        with self.lock:
+            bloom, high_water = self.bloom, self.high_water
+        if bloom is None or high_water is None or vch_no > high_water:
+            return False
+        missing = vch_no.strip() not in bloom
+        with self.lock:
+            self.stats['checks'] += 1
+            if missing:
+                self.stats['definite_misses'] += 1
+        return missing
+
+    def record_miss(self, vch_no):
+        """Called when SQL Server found no quotation for vch_no; counts filter false positives."""
+        with self.lock:
+            bloom, high_water = self.bloom, self.high_water
+        if bloom is None or high_water is None or vch_no > high_water:
+            return
+        if vch_no.strip() in bloom:
+            with self.lock:
+                self.stats['false_positives'] += 1
+
+    # -------------------------------------------------------------------------
+    # Refresh
+    # -------------------------------------------------------------------------
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="QuotationIndex", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def reset(self):
+        """Forget every number (e.g. after switching databases) and reload."""
+        with self.refresh_lock:
+            with self.lock:
+                self.bloom = None
+                self.high_water = None
+        self.wake.set()
+
+    def _run(self):
+        last_error = None
+        while not self.stop_event.is_set():
+            try:
+                self.refresh()
+                last_error = None
+            except Exception as e:
+                # Log once per distinct failure, not every interval while SQL Server is down
+                if str(e) != last_error:
+                    logger.warning("Quotation index refresh failed: %s", e)
+                last_error = str(e)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def refresh(self, full=False):
+        """Load new VchNo values from the source. Returns the number read."""
+        with self.refresh_lock:
+            start = time.time()
+            with self.lock:
+                bloom, high_water = self.bloom, self.high_water
+                full = full or self.rebuild_requested or bloom is None
+                full = full or time.time() - self.last_full_load > self.full_rebuild_interval
+                self.rebuild_requested = False
+            if full:
+                # Build a new filter off to the side; lookups keep using the old one
+                capacity = self.capacity
+                if bloom is not None:
+                    capacity = max(capacity, bloom.count * 2)
+                bloom = BloomFilter(capacity, self.fp_rate)
+                high_water = ''
+
+            read = 0
+            try:
+                while not self.stop_event.is_set():
+                    rows = self.fetch(high_water, self.batch_size)
+                    # Only this thread writes; setting bits while lookups read is safe
+                    for vch_no in rows:
+                        bloom.add(vch_no.strip())
+                    if rows:
+                        high_water = max(high_water, max(rows))
+                    read += len(rows)
+                    if len(rows) < self.batch_size:
+                        break
+            except Exception as e:
+                with self.lock:
+                    self.stats['errors'] += 1
+                    self.stats['last_error'] = str(e)
+                raise
+
+            with self.lock:
+                # '' means the source had no quotations at all
+                self.bloom, self.high_water = bloom, high_water
+                self.last_refresh = time.time()
+                if full:
+                    self.last_full_load = self.last_refresh
+                    self.stats['full_loads'] += 1
+                if bloom.count > bloom.capacity:
+                    # Over capacity the false-positive rate climbs; resize on the next cycle
+                    self.rebuild_requested = True
+                self.stats['refreshes'] += 1
+                self.stats['last_refresh_ms'] = round((time.time() - start) * 1000, 2)
+                self.stats['last_refresh_rows'] = read
+                self.stats['last_error'] = None
+            if full:
+                logger.info("Quotation index loaded %d number(s)", bloom.count)
+            return read
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            bloom = self.bloom
+            stats['ready'] = bloom is not None
+            stats['high_water'] = (self.high_water or '').strip() or None
+            stats['lag_seconds'] = round(time.time() - self.last_refresh, 1) if self.last_refresh else None
+        stats['interval'] = self.interval
+        stats['items'] = bloom.count if bloom else 0
+        stats['capacity'] = bloom.capacity if bloom else self.capacity
+        stats['hash_functions'] = bloom.num_hashes if bloom else None
+        stats['memory_bytes'] = len(bloom.bits) if bloom else 0
+        stats['target_fp_rate'] = self.fp_rate
+        stats['expected_fp_rate'] = round(bloom.expected_fp_rate(), 6) if bloom else None
+        # Observed: share of absent numbers the filter let through to SQL Server
+        absent = stats['false_positives'] + stats['definite_misses']
+        stats['observed_fp_rate'] = round(stats['false_positives'] / absent, 6) if absent else None
+        return stats
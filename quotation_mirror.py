@@ -0,0 +1,266 @@
+"""
+Local SQLite mirror of ERP quotations for Label Print Server.
+
+Lookups normally cross the network to the ERP's SQL Server; when that server
+is slow or rebooting, printing stops. A background thread copies recent
+quotations (Tran2 joined to Master1/MasterAddressInfo) into a local indexed
+table so lookups can be answered without the network:
+- the first sync loads the newest ``initial_rows`` quotations
+- later syncs are incremental: only VchNo values above the stored high-water
+  mark are fetched (VchNo is right-aligned, so string order is number order)
+- a periodic full resync picks up edited customers and out-of-order numbers
+- misses are not authoritative; callers fall back to SQL Server
+
+``fetch(after_vch_no, limit)`` supplies the rows. With ``after_vch_no`` None
+it returns the newest ``limit`` quotations, otherwise those with a greater
+VchNo in ascending order. Each row is ``(vch_no, party_info)``.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from printed_db import ReadConnectionPool, StorageConfig
+
+
+logger = logging.getLogger("quotation_mirror")
+
+PARTY_FIELDS = ('name', 'code', 'address1', 'address2', 'address3', 'address4', 'phone', 'mobile')
+
+
+class QuotationMirror:
+    """Incrementally synced local copy of the quotation -> party index."""
+
+    def __init__(self, db_file, fetch, interval=60, batch_size=5000, initial_rows=50000,
+                 full_resync_interval=24 * 3600, config=None):
+        self.db_file = db_file
+        self.fetch = fetch
+        self.interval = interval
+        self.batch_size = batch_size
+        self.initial_rows = initial_rows
+        self.full_resync_interval = full_resync_interval
+        self.config = config or StorageConfig(read_pool_size=2, checkpoint_interval=0)
+        self.readers = None
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.resync_requested = False
+        self.stats = {
+            'syncs': 0,
+            'full_resyncs': 0,
+            'errors': 0,
+            'hits': 0,
+            'misses': 0,
+            'last_sync_ms': None,
+            'last_sync_rows': 0,
+            'last_error': None,
+        }
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.config.apply(conn, writer=True)
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS quotations (
+                    vch_no TEXT PRIMARY KEY,
+                    name TEXT,
+                    code TEXT,
+                    address1 TEXT,
+                    address2 TEXT,
+                    address3 TEXT,
+                    address4 TEXT,
+                    phone TEXT,
+                    mobile TEXT,
+                    synced_at TEXT NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS mirror_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+        self.readers = ReadConnectionPool(self.db_file, self.config)
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def get(self, vch_no):
+        """Return mirrored party info for a VchNo, or None if it is not mirrored."""
+        with self.readers.connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(PARTY_FIELDS)} FROM quotations WHERE vch_no = ?",
+                (vch_no.strip(),)
+            ).fetchone()
+        with self.lock:
+            self.stats['hits' if row else 'misses'] += 1
+        if row is None:
+            return None
+        return {field: row[field] or '' for field in PARTY_FIELDS}
+
+    # -------------------------------------------------------------------------
+    # Sync
+    # -------------------------------------------------------------------------
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="QuotationMirror", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout)
+        if self.readers:
+            self.readers.close_all()
+
+    def request_full_resync(self):
+        """Drop the mirror and reload it on the sync thread (returns immediately)."""
+        with self.lock:
+            self.resync_requested = True
+        self.wake.set()
+
+    def reset(self):
+        """Forget everything mirrored (e.g. after switching databases) and resync."""
+        with self.sync_lock:
+            conn = self._connect()
+            try:
+                conn.execute('DELETE FROM quotations')
+                conn.execute('DELETE FROM mirror_state')
+                conn.commit()
+            finally:
+                conn.close()
+        self.wake.set()
+
+    def _run(self):
+        last_error = None
+        while not self.stop_event.is_set():
+            with self.lock:
+                full = self.resync_requested
+                self.resync_requested = False
+            try:
+                self.sync(full=full)
+                last_error = None
+            except Exception as e:
+                # Log once per distinct failure, not every interval while SQL Server is down
+                if str(e) != last_error:
+                    logger.warning("Quotation mirror sync failed: %s", e)
+                last_error = str(e)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def sync(self, full=False):
+        """Fetch new quotations from the source. Returns the number of rows stored."""
+        with self.sync_lock:
+            start = time.time()
+            conn = self._connect()
+            try:
+                state = dict(conn.execute('SELECT key, value FROM mirror_state').fetchall())
+                last_full = float(state.get('last_full_sync') or 0)
+                if not full and time.time() - last_full > self.full_resync_interval:
+                    full = True
+                high_water = None if full else state.get('high_water')
+
+                stored = 0
+                if high_water is None:
+                    rows = self.fetch(None, self.initial_rows)
+                    conn.execute('DELETE FROM quotations')
+                    stored += self._store(conn, rows)
+                    high_water = max((vch_no for vch_no, _ in rows), default=None)
+                    self._set_state(conn, last_full_sync=str(time.time()))
+                    with self.lock:
+                        self.stats['full_resyncs'] += 1
+                else:
+                    while True:
+                        rows = self.fetch(high_water, self.batch_size)
+                        stored += self._store(conn, rows)
+                        if rows:
+                            high_water = max(high_water, max(vch_no for vch_no, _ in rows))
+                        if len(rows) < self.batch_size or self.stop_event.is_set():
+                            break
+                        # Commit each batch so a long catch-up is not one huge transaction
+                        self._set_state(conn, high_water=high_water)
+                        conn.commit()
+
+                self._set_state(conn, high_water=high_water, last_sync=str(time.time()))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                with self.lock:
+                    self.stats['errors'] += 1
+                    self.stats['last_error'] = str(e)
+                raise
+            finally:
+                conn.close()
+
+            with self.lock:
+                self.stats['syncs'] += 1
+                self.stats['last_sync_ms'] = round((time.time() - start) * 1000, 2)
+                self.stats['last_sync_rows'] = stored
+                self.stats['last_error'] = None
+            if stored:
+                logger.info("Quotation mirror synced %d row(s)%s", stored, " (full resync)" if full else "")
+            return stored
+
+    @staticmethod
+    def _store(conn, rows):
+        """Insert rows and return how many were new (duplicate VchNos are ignored)."""
+        now = datetime.now().isoformat()
+        before = conn.total_changes
+        # First row per VchNo wins, as in the live lookup
+        conn.executemany(
+            f"INSERT OR IGNORE INTO quotations (vch_no, {', '.join(PARTY_FIELDS)}, synced_at) "
+            f"VALUES (?, {', '.join('?' * len(PARTY_FIELDS))}, ?)",
+            [
+                (vch_no.strip(), *('' if info.get(field) is None else str(info[field]) for field in PARTY_FIELDS), now)
+                for vch_no, info in rows
+            ]
+        )
+        return conn.total_changes - before
+
+    @staticmethod
+    def _set_state(conn, **values):
+        conn.executemany(
+            'INSERT OR REPLACE INTO mirror_state (key, value) VALUES (?, ?)',
+            [(key, value) for key, value in values.items() if value is not None]
+        )
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        try:
+            with self.readers.connection() as conn:
+                stats['rows'] = conn.execute('SELECT COUNT(*) FROM quotations').fetchone()[0]
+                state = dict(conn.execute('SELECT key, value FROM mirror_state').fetchall())
+        except Exception as e:
+            stats['rows'] = None
+            state = {}
+            stats['last_error'] = stats['last_error'] or str(e)
+        stats['high_water'] = (state.get('high_water') or '').strip() or None
+        last_sync = float(state['last_sync']) if state.get('last_sync') else None
+        last_full = float(state['last_full_sync']) if state.get('last_full_sync') else None
+        stats['last_sync_at'] = datetime.fromtimestamp(last_sync).isoformat() if last_sync else None
+        stats['last_full_sync_at'] = datetime.fromtimestamp(last_full).isoformat() if last_full else None
+        # Freshness lag: how old the newest successful sync is
+        stats['lag_seconds'] = round(time.time() - last_sync, 1) if last_sync else None
+        stats['interval'] = self.interval
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
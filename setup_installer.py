@@ -291,6 +291,19 @@ class SetupInstaller:
             'tray_app_v2.py',
             'tray_gui.py',
             'printed_db.py',
+            'db_pool.py',
+            'connection_profile.py',
+            'circuit_breaker.py',
+            'deadline.py',
+            'bulkhead.py',
+            'print_engine.py',
+            'print_jobs.py',
+            'wave_print.py',
+            'lookup_cache.py',
+            'quotation_mirror.py',
+            'quotation_index.py',
+            'party_master.py',
+            'warmup.py',
             'update_manager.py',
             'wsgi.py',
             'requirements.txt',
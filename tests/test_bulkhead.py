@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from bulkhead import Bulkhead, BulkheadFull, WaitQueue
+
+
+def hold(bulkhead, release):
+    bulkhead.acquire()
+    release.wait(5)
+    bulkhead.release()
+
+
+def start_holders(bulkhead, count, release):
+    threads = [threading.Thread(target=hold, args=(bulkhead, release)) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while bulkhead.get_stats()["active"] < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return threads
+
+
+def test_waiter_gets_a_released_slot():
+    bulkhead = Bulkhead("lookup", 1, max_queue=1, queue_timeout=2)
+    release = threading.Event()
+    holders = start_holders(bulkhead, 1, release)
+    threading.Timer(0.05, release.set).start()
+
+    bulkhead.acquire()
+    bulkhead.release()
+    for thread in holders:
+        thread.join()
+    stats = bulkhead.get_stats()
+    assert (stats["admitted"], stats["queued"], stats["rejected"]) == (2, 1, 0)
+
+
+def test_rejects_when_the_class_queue_is_full_or_the_wait_times_out():
+    bulkhead = Bulkhead("lookup", 1, max_queue=0, queue_timeout=0.05)
+    release = threading.Event()
+    holders = start_holders(bulkhead, 1, release)
+    with pytest.raises(BulkheadFull) as excinfo:
+        bulkhead.acquire()
+    assert excinfo.value.retry_after == 1
+
+    bulkhead.max_queue = 1
+    with pytest.raises(BulkheadFull):
+        bulkhead.acquire()
+    release.set()
+    for thread in holders:
+        thread.join()
+    stats = bulkhead.get_stats()
+    assert (stats["rejected_full"], stats["rejected_timeout"]) == (1, 1)
+
+
+def test_shared_queue_caps_waiters_across_classes():
+    shared = WaitQueue(1)
+    lookup = Bulkhead("lookup", 1, max_queue=2, queue_timeout=2, shared_queue=shared)
+    history = Bulkhead("history", 1, max_queue=2, queue_timeout=2, shared_queue=shared)
+    release = threading.Event()
+    holders = start_holders(lookup, 1, release) + start_holders(history, 1, release)
+    waiter = threading.Thread(target=lambda: (lookup.acquire(), lookup.release()))
+    waiter.start()
+    time.sleep(0.05)
+
+    # The only shared waiting slot is taken by the lookup: history is refused at once
+    start = time.monotonic()
+    with pytest.raises(BulkheadFull):
+        history.acquire()
+    assert time.monotonic() - start < 0.5
+    assert shared.get_stats()["waiting"] == 1
+
+    release.set()
+    for thread in holders + [waiter]:
+        thread.join()
+    stats = shared.get_stats()
+    assert (stats["waiting"], stats["peak_waiting"], stats["rejected"]) == (0, 1, 1)
@@ -0,0 +1,49 @@
+import pytest
+
+from connection_profile import ConnectionResolver
+
+
+class RecordingConnect:
+    def __init__(self, fail_drivers=()):
+        self.calls = []
+        self.fail_drivers = fail_drivers
+
+    def __call__(self, conn_str, timeout=None):
+        self.calls.append((conn_str, timeout))
+        if any(driver in conn_str for driver in self.fail_drivers):
+            raise RuntimeError("HYT00: Login timeout expired")
+        return object()
+
+
+DRIVERS = ["ODBC Driver 18 for SQL Server", "ODBC Driver 17 for SQL Server"]
+
+
+def test_timeout_reaches_the_connect_call_as_login_timeout():
+    connect = RecordingConnect()
+    resolver = ConnectionResolver(lambda: DRIVERS, connect)
+
+    # The circuit breaker probe: short timeout, preferred driver only
+    resolver.connect("erp-host", "erp", timeout=3, fallback=False)
+
+    conn_str, timeout = connect.calls[0]
+    assert timeout == 3
+    assert "Connection Timeout=3;" in conn_str
+
+
+def test_every_fallback_driver_gets_the_timeout():
+    connect = RecordingConnect(fail_drivers=("Driver 18",))
+    resolver = ConnectionResolver(lambda: DRIVERS, connect)
+
+    _, profile = resolver.connect("erp-host", "erp", timeout=10)
+
+    assert profile.driver == "ODBC Driver 17 for SQL Server"
+    assert [timeout for _, timeout in connect.calls] == [10, 10]
+
+
+def test_probe_without_fallback_raises_the_driver_error():
+    connect = RecordingConnect(fail_drivers=("Driver 18",))
+    resolver = ConnectionResolver(lambda: DRIVERS, connect)
+
+    with pytest.raises(RuntimeError, match="HYT00"):
+        resolver.connect("erp-host", "erp", timeout=3, fallback=False)
+    assert len(connect.calls) == 1
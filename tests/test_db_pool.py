@@ -0,0 +1,239 @@
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, FakeDriver, FakeDriverError, PoolError, PoolManager, PoolTimeout
+
+
+def make_pool(driver, conn_string="Server=a", **kwargs):
+    kwargs.setdefault("keepalive_interval", 0)  # maintain() is called by the tests
+    pool = ConnectionPool(driver.connect, **kwargs)
+    pool.initialize(conn_string)
+    return pool
+
+
+def test_initialize_opens_min_size():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=3, max_size=5)
+
+    stats = pool.get_stats()
+    assert (stats["idle"], stats["total"], stats["created"]) == (3, 3, 3)
+    assert driver.open_connections == 3
+
+
+def test_initialize_counts_creation_failures():
+    driver = FakeDriver(fail_connects=True)
+    pool = make_pool(driver, min_size=2)
+
+    stats = pool.get_stats()
+    assert stats["total"] == 0
+    assert stats["creation_failures"] == 2
+    assert "08001" in stats["last_creation_error"]
+    with pytest.raises(FakeDriverError):
+        pool.get_connection(timeout=1)
+
+
+def test_checkout_requires_initialize():
+    pool = ConnectionPool(FakeDriver().connect, keepalive_interval=0)
+    with pytest.raises(PoolError, match="not initialized"):
+        pool.get_connection(timeout=1)
+
+
+def test_recently_used_connections_are_not_validated():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1, validate_idle=30)
+    for _ in range(3):
+        pool.return_connection(pool.get_connection())
+
+    assert driver.statements == 0
+    assert pool.get_stats()["validations"] == 0
+
+
+def test_idle_connections_are_validated_and_replaced_when_broken():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1, validate_idle=0.05)
+    conn = pool.get_connection()
+    pool.return_connection(conn)
+    time.sleep(0.1)
+    assert pool.get_connection() is conn
+    assert driver.statements == 1
+    pool.return_connection(conn)
+
+    driver.restart_server()
+    time.sleep(0.1)
+    replacement = pool.get_connection()
+
+    stats = pool.get_stats()
+    assert replacement is not conn
+    assert conn.closed
+    assert (stats["validations"], stats["validation_failures"]) == (2, 1)
+
+
+def test_max_lifetime_recycles_connections():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1, max_lifetime=0.05)
+    first = pool.get_connection()
+    pool.return_connection(first)
+    time.sleep(0.1)
+    second = pool.get_connection()
+
+    assert second is not first
+    assert first.closed
+    assert pool.get_stats()["retired_lifetime"] == 1
+
+    # Expired while checked out: closed on return instead of going back to idle
+    time.sleep(0.1)
+    pool.return_connection(second)
+    assert second.closed
+    assert pool.get_stats()["idle"] == 0
+
+
+def test_waits_for_a_return_before_growing():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1, max_size=3, grow_after=0.5)
+    held = pool.get_connection()
+    threading.Timer(0.05, pool.return_connection, args=(held,)).start()
+
+    assert pool.get_connection(timeout=5) is held
+    assert pool.get_stats()["created"] == 1
+
+
+def test_grows_when_the_wait_drags_on():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1, max_size=2, grow_after=0.05)
+    held = pool.get_connection()
+    start = time.monotonic()
+    grown = pool.get_connection(timeout=5)
+
+    assert grown is not held
+    assert time.monotonic() - start >= 0.05
+    stats = pool.get_stats()
+    assert (stats["created"], stats["in_use"], stats["total"]) == (2, 2, 2)
+
+
+def test_checkout_times_out_at_max_size():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1, max_size=1, grow_after=0)
+    pool.get_connection()
+    start = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.get_connection(timeout=0.1)
+
+    assert 0.1 <= time.monotonic() - start < 1
+    stats = pool.get_stats()
+    assert stats["timeouts"] == 1
+    assert stats["checkouts"] == 1
+
+
+def test_discarded_connections_are_closed():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1)
+    conn = pool.get_connection()
+    pool.return_connection(conn, discard=True)
+
+    assert conn.closed
+    assert pool.get_stats()["total"] == 0
+
+
+def test_maintain_retires_idle_surplus_and_refills_min_size():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=1, max_size=3, grow_after=0, idle_timeout=0.05)
+    conns = [pool.get_connection() for _ in range(3)]
+    for conn in conns:
+        pool.return_connection(conn)
+    time.sleep(0.1)
+    pool.maintain()
+    stats = pool.get_stats()
+    assert stats["total"] == 1
+    assert stats["retired_idle"] == 2
+    # keepalive_interval=0: the survivor is pinged on every pass
+    assert (stats["keepalive_pings"], stats["validation_failures"]) == (1, 0)
+
+    # A broken connection is dropped and replaced to keep min_size
+    driver.restart_server()
+    pool.maintain()
+    stats = pool.get_stats()
+    assert (stats["idle"], stats["total"]) == (1, 1)
+    assert (stats["keepalive_pings"], stats["validation_failures"]) == (2, 1)
+    assert stats["created"] == 4
+
+
+def test_shutdown_refuses_checkouts_and_closes_returned_connections():
+    driver = FakeDriver()
+    pool = make_pool(driver, min_size=2)
+    conn = pool.get_connection()
+    pool.shutdown()
+
+    assert driver.open_connections == 1
+    with pytest.raises(PoolError, match="closed"):
+        pool.get_connection()
+    pool.return_connection(conn)
+    assert conn.closed
+    assert driver.open_connections == 0
+
+
+def test_pool_manager_switch_swaps_pool_and_drains_the_old_one():
+    driver = FakeDriver()
+    opened_for = []
+
+    def connect(conn_string):
+        opened_for.append(conn_string)
+        return driver.connect(conn_string)
+
+    switched = []
+    manager = PoolManager(lambda: ConnectionPool(connect, min_size=2, keepalive_interval=0),
+                          on_switch=lambda: switched.append(True))
+    manager.start("Server=a")
+    old_pool = manager.pool
+    borrowed = manager.get_connection()
+    idle_before = list(old_pool.idle)
+
+    manager.switch("Server=b")
+    manager.wait_for_switch(5)
+
+    assert manager.pool is not old_pool
+    assert manager.conn_string == "Server=b"
+    assert switched == [True]
+    assert opened_for == ["Server=a", "Server=a", "Server=b", "Server=b"]
+    # Idle connections of the old pool are closed at once, borrowed ones on return
+    assert all(entry.conn.closed for entry in idle_before)
+    assert not borrowed.closed
+    stats = manager.get_stats()
+    assert stats["switches"] == 1
+    assert stats["draining_connections"] == 1
+
+    manager.return_connection(borrowed)
+    assert borrowed.closed
+    assert manager.get_stats()["draining_connections"] == 0
+    manager.get_connection()
+    assert manager.pool.get_stats()["in_use"] == 1
+    manager.shutdown()
+
+
+def test_pool_manager_switch_without_notify():
+    driver = FakeDriver()
+    switched = []
+    manager = PoolManager(lambda: ConnectionPool(driver.connect, min_size=1, keepalive_interval=0),
+                          on_switch=lambda: switched.append(True))
+    manager.start("Server=a;Driver=17")
+    manager.switch("Server=a;Driver=18", notify=False)
+    manager.wait_for_switch(5)
+
+    assert manager.conn_string == "Server=a;Driver=18"
+    assert switched == []
+    manager.shutdown()
+
+
+def test_limit_login_caps_the_login_of_a_grown_connection():
+    driver = FakeDriver(connect_latency=3)
+    pool = make_pool(driver, min_size=0, max_size=2)
+    start = time.monotonic()
+    with pytest.raises(FakeDriverError, match="HYT00"):
+        pool.get_connection(timeout=0.5, limit_login=True)
+
+    # Login timeouts are whole seconds: rounded up to 1s, not the driver's 3s
+    assert time.monotonic() - start < 2
+    stats = pool.get_stats()
+    assert stats["creation_failures"] == 1
+    assert stats["total"] == 0
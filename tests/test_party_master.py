@@ -0,0 +1,33 @@
+from party_master import PartyMaster
+
+
+def info(code, address):
+    return {"code": code, "name": f"Party {code}", "address1": address, "phone": "", "mobile": ""}
+
+
+def test_reload_stores_a_new_record_and_current_returns_it():
+    master = PartyMaster()
+    old = master.put(info("5", "Old street"))
+
+    new = master.put(info("5", "New street"))
+
+    assert new is not old
+    assert old.address1 == "Old street"
+    assert master.current(old) is new
+    assert master.current(old).to_dict()["address1"] == "New street"
+
+
+def test_current_keeps_a_record_that_is_no_longer_resident():
+    master = PartyMaster(maxsize=1)
+    record = master.put(info("5", "Street"))
+    master.invalidate("5")
+
+    assert master.current(record) is record
+
+
+def test_setdefault_never_replaces_a_resident_record():
+    master = PartyMaster()
+    fresh = master.put(info("5", "New street"))
+
+    assert master.setdefault(info("5", "Mirrored old street")) is fresh
+    assert master.setdefault(info("6", "Street")).address1 == "Street"
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+
+import pytest
+
+from print_engine import FakeBarTenderBackend, PrintEngine, PrintEngineError, PrintEngineTimeout
+
+
+VALUES = [("quotation_number", "9171"), ("customer_name", "ABC Trading")]
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / "label.btw"
+    path.write_text("format")
+    return str(path)
+
+
+@pytest.fixture
+def make_engine():
+    engines = []
+
+    def make(**kwargs):
+        backend = kwargs.pop("backend", None) or FakeBarTenderBackend()
+        engine = PrintEngine(backend=backend, **kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.stop()
+
+
+def test_prints_on_one_dedicated_thread(make_engine, template):
+    engine = make_engine()
+    results = []
+
+    def client():
+        results.append(engine.print_label(template, VALUES, printer="Zebra", timeout=5))
+
+    clients = [threading.Thread(target=client) for _ in range(5)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+
+    backend = engine.backend
+    assert results == [True] * 5
+    assert len(backend.printed) == 5
+    assert backend.printed[0] == (template, dict(VALUES), "Zebra")
+    assert len(backend.thread_ids) == 1
+    assert backend.thread_ids != {threading.get_ident()}
+    assert backend.applications_created == 1
+    assert engine.get_stats()["jobs_completed"] == 5
+
+
+def test_recycles_application_after_max_jobs(make_engine, template):
+    engine = make_engine(max_jobs_per_engine=3)
+    for _ in range(7):
+        engine.print_label(template, VALUES, timeout=5)
+
+    stats = engine.get_stats()
+    assert engine.backend.applications_created == 3
+    assert stats["engine_restarts"] == 2
+    assert stats["jobs_since_start"] == 1
+
+
+def test_restarts_application_after_failed_job(make_engine, template):
+    engine = make_engine(backend=FakeBarTenderBackend(fail_on={2}))
+    engine.print_label(template, VALUES, timeout=5)
+    with pytest.raises(PrintEngineError, match="Simulated BarTender failure"):
+        engine.print_label(template, VALUES, timeout=5)
+    engine.print_label(template, VALUES, timeout=5)
+
+    stats = engine.get_stats()
+    assert engine.backend.applications_created == 2
+    assert stats["jobs_failed"] == 1
+    assert stats["engine_restarts"] == 1
+    assert "Simulated" in stats["last_error"]
+    # The format of the failed job was discarded and reopened in the new application
+    assert engine.backend.formats_opened == 2
+
+
+class FailingStartBackend(FakeBarTenderBackend):
+    """BarTender that fails to start the first time."""
+
+    def create_application(self):
+        if not self.applications_created and not getattr(self, "start_failed", False):
+            self.start_failed = True
+            raise RuntimeError("Simulated BarTender start failure")
+        return super().create_application()
+
+
+def test_failed_start_is_not_counted_as_a_restart(make_engine, template):
+    engine = make_engine(backend=FailingStartBackend())
+    with pytest.raises(PrintEngineError, match="start failure"):
+        engine.print_label(template, VALUES, timeout=5)
+    engine.print_label(template, VALUES, timeout=5)
+
+    stats = engine.get_stats()
+    assert stats["jobs_failed"] == 1
+    assert stats["engine_restarts"] == 0
+    assert stats["engine_starts"] == 1
+
+
+def test_timeout_while_printing(make_engine, template):
+    engine = make_engine(backend=FakeBarTenderBackend(print_delay=0.5))
+    with pytest.raises(PrintEngineTimeout, match="while BarTender was printing"):
+        engine.print_label(template, VALUES, timeout=0.1)
+    # The job was not cancelled: it still prints
+    time.sleep(0.6)
+    assert len(engine.backend.printed) == 1
+
+
+def test_timeout_before_pickup_cancels_job(make_engine, template):
+    engine = make_engine(backend=FakeBarTenderBackend(print_delay=0.4))
+    first = engine.submit(template, VALUES)
+    with pytest.raises(PrintEngineTimeout, match="before BarTender picked it up"):
+        engine.print_label(template, VALUES, timeout=0.1)
+    first.wait(5)
+    time.sleep(0.1)
+
+    assert len(engine.backend.printed) == 1
+    assert engine.get_stats()["jobs_cancelled"] == 1
+
+
+def test_format_cache_reuses_open_formats(make_engine, template):
+    engine = make_engine()
+    for _ in range(3):
+        engine.print_label(template, VALUES, timeout=5)
+
+    cache = engine.get_stats()["format_cache"]
+    assert engine.backend.formats_opened == 1
+    assert (cache["hits"], cache["misses"]) == (2, 1)
+
+
+def test_format_cache_reopens_template_changed_on_disk(make_engine, template):
+    engine = make_engine()
+    engine.print_label(template, VALUES, timeout=5)
+
+    # Same size, newer mtime
+    stat = os.stat(template)
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    engine.print_label(template, VALUES, timeout=5)
+    # Same mtime, different size
+    stat = os.stat(template)
+    with open(template, "a") as f:
+        f.write(" edited")
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    engine.print_label(template, VALUES, timeout=5)
+
+    assert engine.backend.formats_opened == 3
+    assert engine.get_stats()["format_cache"]["invalidations"] == 2
+
+
+def test_invalidate_formats(make_engine, template):
+    engine = make_engine()
+    engine.print_label(template, VALUES, timeout=5)
+    engine.invalidate_formats(template)
+    engine.print_label(template, VALUES, timeout=5)
+    engine.invalidate_formats()
+    engine.print_label(template, VALUES, timeout=5)
+
+    assert engine.backend.formats_opened == 3
+
+
+def test_format_cache_evicts_least_recently_used(make_engine, tmp_path):
+    engine = make_engine(max_formats=2)
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.btw"
+        path.write_text(name)
+        paths.append(str(path))
+    for path in paths + [paths[0]]:
+        engine.print_label(path, VALUES, timeout=5)
+
+    cache = engine.get_stats()["format_cache"]
+    assert cache["resident"] == 2
+    assert cache["evictions"] == 2
+    assert engine.backend.formats_opened == 4
+
+
+def test_stop_fails_pending_jobs(make_engine, template):
+    engine = make_engine(backend=FakeBarTenderBackend(print_delay=0.3))
+    engine.submit(template, VALUES)
+    time.sleep(0.05)
+    pending = engine.submit(template, VALUES)
+    engine.stop()
+
+    with pytest.raises(PrintEngineError):
+        pending.wait(5)
+    assert engine.get_stats()["running"] is False
+
+
+def test_start_during_stop_never_leaves_an_orphaned_engine_thread(make_engine, template):
+    engine = make_engine(backend=FakeBarTenderBackend(print_delay=0.3))
+    engine.submit(template, VALUES)
+    time.sleep(0.05)
+    stopper = threading.Thread(target=engine.stop)
+    stopper.start()
+    time.sleep(0.05)
+
+    # Stop is still waiting for the job being printed
+    engine.start()
+    stopper.join()
+    time.sleep(0.1)
+
+    engine_threads = [t for t in threading.enumerate() if t.name == "PrintEngine"]
+    assert engine_threads == [engine.thread]
+    engine.print_label(template, VALUES, timeout=5)
+    engine.stop()
+    assert not engine.thread.is_alive()
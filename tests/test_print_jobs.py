@@ -0,0 +1,123 @@
+import threading
+
+from print_jobs import DISMISSED, FAILED, QUEUED, PrintJobError, PrintJobManager
+
+
+class FakeJournal:
+    """In-memory stand-in for the printed_db job journal."""
+
+    def __init__(self):
+        self.rows = {}
+        self.lock = threading.Lock()
+
+    def add_job(self, job_id, payload, status=QUEUED):
+        with self.lock:
+            self.rows[job_id] = {'id': job_id, 'payload': payload, 'status': status}
+
+    def update_job(self, job_id, status, attempts=None, error=None, wait=False, expected=None):
+        with self.lock:
+            row = self.rows.get(job_id)
+            if row is None or row['status'] == 'done' or (expected and row['status'] != expected):
+                return 0
+            row['status'] = status
+            return 1
+
+    def complete_job(self, job_id, record=None):
+        self.update_job(job_id, 'done')
+
+    def get_job(self, job_id):
+        with self.lock:
+            row = self.rows.get(job_id)
+            return dict(row) if row else None
+
+    def pending_jobs(self):
+        return []
+
+
+def race(manager, job_id, threads=8):
+    """Call retry and dismiss on one job from several threads at once."""
+    start = threading.Barrier(threads)
+    results = []
+
+    def call(i):
+        start.wait()
+        if i % 2:
+            results.append(('retry', manager.retry(job_id) is not None))
+        else:
+            results.append(('dismiss', manager.dismiss(job_id)))
+
+    workers = [threading.Thread(target=call, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [name for name, won in results if won]
+
+
+def failing_manager(journal, calls, release):
+    """Jobs fail permanently once release is set (so a retried job stays busy during a race)."""
+    def handler(job):
+        calls.append(job.id)
+        release.wait(2)
+        raise PrintJobError("Template missing")
+    return PrintJobManager(handler, workers=1, journal=journal, max_attempts=1)
+
+
+def test_concurrent_retry_and_dismiss_of_a_failed_job_only_one_wins():
+    journal = FakeJournal()
+    calls = []
+    release = threading.Event()
+    release.set()
+    manager = failing_manager(journal, calls, release)
+    job = manager.submit({'quotation': '9171'})
+    assert job.done.wait(2) and job.status == FAILED
+    release.clear()
+
+    winners = race(manager, job.id)
+    release.set()
+
+    assert len(winners) == 1
+    if winners == ['retry']:
+        assert job.done.wait(2)
+        assert calls == [job.id, job.id]
+        assert journal.rows[job.id]['status'] == FAILED
+    else:
+        assert job.status == DISMISSED
+        assert journal.rows[job.id]['status'] == DISMISSED
+        assert calls == [job.id]
+    manager.stop()
+
+
+def test_journal_only_job_is_retried_or_dismissed_once():
+    journal = FakeJournal()
+    journal.add_job('old-job', {'quotation': '9171'}, status=FAILED)
+    calls = []
+    release = threading.Event()
+    manager = failing_manager(journal, calls, release)
+
+    winners = race(manager, 'old-job')
+    release.set()
+
+    assert len(winners) == 1
+    expected = FAILED if winners == ['retry'] else DISMISSED
+    if winners == ['retry']:
+        assert manager.get('old-job').done.wait(2)
+        assert calls == ['old-job']
+    assert journal.rows['old-job']['status'] == expected
+    manager.stop()
+
+
+def test_retry_is_refused_when_the_journal_row_moved_on():
+    journal = FakeJournal()
+    calls = []
+    release = threading.Event()
+    release.set()
+    manager = failing_manager(journal, calls, release)
+    job = manager.submit({'quotation': '9171'})
+    assert job.done.wait(2)
+    journal.rows[job.id]['status'] = DISMISSED  # e.g. dismissed by another server process
+
+    assert manager.retry(job.id) is None
+    assert job.status == FAILED
+    assert calls == [job.id]
+    manager.stop()
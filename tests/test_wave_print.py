@@ -0,0 +1,151 @@
+import threading
+
+from wave_print import CANCELLED, DONE, FAILED, FINISHED, PRINTING, SKIPPED, WaveItemError, WaveManager
+
+
+class FakeJob:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"
+        self.message = None
+        self.done = threading.Event()
+
+    def finish(self, status, message):
+        self.status = status
+        self.message = message
+        self.done.set()
+
+
+def fields(quotation):
+    return {"party": f"Party {quotation}", "address": "", "phone": "", "mobile": ""}
+
+
+def wait_finished(wave, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if wave.finished_at is not None:
+            break
+        wave.wait_for_change(wave.version, timeout=0.01)
+    assert wave.finished_at is not None
+
+
+def run(manager, entries):
+    wave = manager.start(entries)
+    wait_finished(wave)
+    return wave
+
+
+def lookup_all(quotations):
+    return {q: fields(q) for q in quotations}
+
+
+def test_batches_lookups_and_prints_in_order():
+    batches = []
+    printed = []
+
+    def lookup(quotations):
+        batches.append(list(quotations))
+        return {q: WaveItemError(f"No customer found for quotation {q}") if q == "404" else fields(q)
+                for q in quotations}
+
+    def submit(quotation, label, copies):
+        printed.append((quotation, copies))
+        job = FakeJob(len(printed))
+        job.finish(DONE, "printed")
+        return job
+
+    manager = WaveManager(lookup, submit, lookup_workers=2, batch_size=2)
+    wave = run(manager, [("1", 1), ("2", 2), ("404", 1), ("3", 1), ("4", 1)])
+
+    assert sorted(batches) == [["1", "2"], ["4"], ["404", "3"]]
+    assert printed == [("1", 1), ("2", 2), ("3", 1), ("4", 1)]
+    assert [item.status for item in wave.items] == [DONE, DONE, FAILED, DONE, DONE]
+    assert wave.items[2].message == "No customer found for quotation 404"
+    assert wave.status == FINISHED
+    assert manager.get_stats()["lookup_batches"] == 3
+
+
+def test_a_failed_batch_fails_its_items_and_the_wave_carries_on():
+    def lookup(quotations):
+        if "1" in quotations:
+            raise RuntimeError("SQL Server is unreachable")
+        return {q: fields(q) for q in quotations}
+
+    def submit(quotation, label, copies):
+        job = FakeJob(quotation)
+        job.finish(DONE, "printed")
+        return job
+
+    wave = run(WaveManager(lookup, submit, batch_size=2), [("1", 1), ("2", 1), ("3", 1)])
+
+    assert [item.status for item in wave.items] == [FAILED, FAILED, DONE]
+    assert wave.items[0].message == "SQL Server is unreachable"
+
+
+def test_cancel_while_printing_follows_the_job_to_a_terminal_status():
+    jobs = []
+    submitted = threading.Event()
+
+    def submit(quotation, label, copies):
+        jobs.append(FakeJob(quotation))
+        jobs[-1].status = PRINTING
+        submitted.set()
+        return jobs[-1]
+
+    manager = WaveManager(lookup_all, submit)
+    wave = manager.start([("1", 1), ("2", 1), ("3", 1)])
+    assert submitted.wait(2)
+    assert manager.cancel(wave.id)
+    assert wave.finished_at is None
+
+    jobs[0].finish(DONE, "printed")
+    wait_finished(wave)
+
+    assert wave.status == CANCELLED
+    assert [item.status for item in wave.items] == [DONE, SKIPPED, SKIPPED]
+    assert len(jobs) == 1
+
+
+def test_cancel_does_not_wait_for_a_job_still_in_the_queue():
+    jobs = []
+    submitted = threading.Event()
+
+    def submit(quotation, label, copies):
+        jobs.append(FakeJob(quotation))
+        submitted.set()
+        return jobs[-1]
+
+    manager = WaveManager(lookup_all, submit)
+    wave = manager.start([("1", 1), ("2", 1)])
+    assert submitted.wait(2)
+    manager.cancel(wave.id)
+    wait_finished(wave)
+
+    assert [item.status for item in wave.items] == [SKIPPED, SKIPPED]
+    assert wave.items[0].message == "Wave cancelled - print job 1 is still queued"
+
+
+def test_a_job_that_never_finishes_is_skipped_after_the_print_timeout():
+    manager = WaveManager(lookup_all, lambda quotation, label, copies: FakeJob(quotation), print_timeout=0.1)
+    wave = run(manager, [("1", 1), ("2", 1)])
+
+    assert wave.status == FINISHED
+    assert [item.status for item in wave.items] == [SKIPPED, SKIPPED]
+    assert wave.items[0].message == "No result from print job 1 after 0.1s"
+
+
+def test_stop_releases_a_wave_waiting_on_a_dropped_job():
+    submitted = threading.Event()
+
+    def submit(quotation, label, copies):
+        submitted.set()
+        return FakeJob(quotation)
+
+    manager = WaveManager(lookup_all, submit)
+    wave = manager.start([("1", 1), ("2", 1)])
+    assert submitted.wait(2)
+    manager.stop()
+    wait_finished(wave)
+
+    assert wave.status == CANCELLED
+    assert wave.items[0].message == "Server stopping - print job 1 not finished"
+    assert wave.items[1].status == SKIPPED
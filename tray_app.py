@@ -18,10 +18,11 @@ from datetime import datetime
 # Add app directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from app import app
+from app import app, Config
+import app as server_app_module
 from waitress import serve
 from update_manager import UpdateManager
-from printed_db import init_db, get_recent
+from printed_db import init_db, get_page
 
 # =============================================================================
 # CONFIGURATION
@@ -32,6 +33,14 @@ LOCK_FILE = APP_DIR / '.tray_running'
 SERVER_HOST = '0.0.0.0'
 SERVER_PORT = 5000
 
+
+def db_status_text():
+    """ERP database state from the lookup circuit breaker, as (text, colour)."""
+    status = server_app_module.db_breaker.get_status()
+    if status['state'] == 'open':
+        return f"ERP Database: unreachable ({int(status['open_for_seconds'] or 0)}s)", '#e74c3c'
+    return "ERP Database: reachable", '#27ae60'
+
 # =============================================================================
 # SERVER MANAGER
 # =============================================================================
@@ -88,7 +97,7 @@ class ServerManager:
                 app,
                 host=SERVER_HOST,
                 port=SERVER_PORT,
-                threads=4,
+                threads=Config.THREADS,
                 channel_timeout=30
             )
             
@@ -125,6 +134,7 @@ class GUIManager:
         # Database pagination
         self.db_page = 0
         self.db_page_size = 50
+        self.db_cursors = [None]  # before_id of each visited page (keyset paging)
         self.db_search_query = ""
     
     def show(self):
@@ -212,6 +222,10 @@ class GUIManager:
                                      font=('Arial', 11), bg='white', fg='#7f8c8d')
         self.status_label.pack(pady=5)
         
+        self.db_status_label = tk.Label(status_frame, text="",
+                                        font=('Arial', 10), bg='white', fg='#7f8c8d')
+        self.db_status_label.pack()
+        
         # Control buttons
         btn_frame = tk.Frame(parent, bg='white')
         btn_frame.pack(pady=10)
@@ -261,6 +275,8 @@ class GUIManager:
                 self.status_label.config(text="⏹️ Stopped", fg='#e74c3c')
                 self.start_btn.config(state='normal')
                 self.stop_btn.config(state='disabled')
+            text, color = db_status_text()
+            self.db_status_label.config(text=text, fg=color)
     
     def _schedule_status_update(self):
         """Schedule periodic status updates"""
@@ -439,8 +455,8 @@ class GUIManager:
             init_db()
             
             # Get records
-            offset = self.db_page * self.db_page_size
-            result = get_recent(limit=self.db_page_size, q=self.db_search_query or None, offset=offset)
+            result = get_page(limit=self.db_page_size, q=self.db_search_query or None,
+                              before_id=self.db_cursors[self.db_page])
             
             # Clear existing items
             for item in self.db_tree.get_children():
@@ -474,7 +490,10 @@ class GUIManager:
             
             # Enable/disable pagination buttons
             self.prev_btn.config(state='normal' if self.db_page > 0 else 'disabled')
-            self.next_btn.config(state='normal' if (self.db_page + 1) < total_pages else 'disabled')
+            self.next_btn.config(state='normal' if result['has_more'] else 'disabled')
+            del self.db_cursors[self.db_page + 1:]
+            if result['has_more']:
+                self.db_cursors.append(result['next_before_id'])
             
         except Exception as e:
             self.db_results_label.config(text=f"Error loading records: {e}")
@@ -483,6 +502,7 @@ class GUIManager:
         """Search database"""
         self.db_search_query = self.db_search_entry.get().strip()
         self.db_page = 0
+        self.db_cursors = [None]
         self._load_database_records()
     
     def _clear_search(self):
@@ -490,12 +510,14 @@ class GUIManager:
         self.db_search_entry.delete(0, 'end')
         self.db_search_query = ""
         self.db_page = 0
+        self.db_cursors = [None]
         self._load_database_records()
     
     def _next_page(self):
         """Next page"""
-        self.db_page += 1
-        self._load_database_records()
+        if self.db_page + 1 < len(self.db_cursors):
+            self.db_page += 1
+            self._load_database_records()
     
     def _prev_page(self):
         """Previous page"""
@@ -653,6 +675,8 @@ class TrayApp:
             item('Open Control Panel', self._show_gui, default=True),
             item('Open in Browser', self._open_browser),
             pystray.Menu.SEPARATOR,
+            item(lambda _: db_status_text()[0], None, enabled=False),
+            pystray.Menu.SEPARATOR,
             item('Start Server', self._start_server, visible=lambda _: not self.server_mgr.is_running()),
             item('Stop Server', self._stop_server, visible=lambda _: self.server_mgr.is_running()),
             pystray.Menu.SEPARATOR,
@@ -665,10 +689,17 @@ class TrayApp:
             "Label Print Server",
             menu
         )
+        server_app_module.circuit_listeners.append(self._on_db_circuit_change)
         
         # Start server
         self.server_mgr.start()
     
+    def _on_db_circuit_change(self, state):
+        """Reflect SQL Server outages in the tray tooltip and menu."""
+        if self.icon:
+            self.icon.title = "Label Print Server" if state == 'closed' else "Label Print Server - ERP database unreachable"
+            self.icon.update_menu()
+    
     def _load_icon(self):
         """Load the tray icon image"""
         icon_path = APP_DIR / 'icons' / 'app_icon.ico'
@@ -25,7 +25,7 @@ import app as server_app_module
 from app import app
 from waitress import serve
 from update_manager import UpdateManager
-from printed_db import init_db, get_recent
+from printed_db import init_db, get_page
 
 # =============================================================================
 # CONFIGURATION
@@ -49,6 +49,14 @@ STARTUP_CONNECTIVITY_RETRY_SECONDS = 15
 STARTUP_MAX_WAIT_SECONDS = 180
 INSTANCE_MUTEX_NAME = "Local\\LabelPrintServerTrayApp"
 
+
+def db_status_text():
+    """ERP database state from the lookup circuit breaker, as (text, colour)."""
+    status = server_app_module.db_breaker.get_status()
+    if status['state'] == 'open':
+        return f"ERP Database: unreachable ({int(status['open_for_seconds'] or 0)}s)", '#e74c3c'
+    return "ERP Database: reachable", '#27ae60'
+
 # =============================================================================
 # SERVER MANAGER
 # =============================================================================
@@ -105,7 +113,7 @@ class ServerManager:
                 app,
                 host=SERVER_HOST,
                 port=SERVER_PORT,
-                threads=4,
+                threads=server_app_module.Config.THREADS,
                 channel_timeout=30
             )
             
@@ -145,6 +153,7 @@ class GUIManager:
         # Database pagination
         self.db_page = 0
         self.db_page_size = 50
+        self.db_cursors = [None]  # before_id of each visited page (keyset paging)
         self.db_search_query = ""
 
         self.start_background_update_checks()
@@ -234,6 +243,10 @@ class GUIManager:
                                      font=('Arial', 11), bg='white', fg='#7f8c8d')
         self.status_label.pack(pady=5)
         
+        self.db_status_label = tk.Label(status_frame, text="",
+                                        font=('Arial', 10), bg='white', fg='#7f8c8d')
+        self.db_status_label.pack()
+        
         # Control buttons
         btn_frame = tk.Frame(parent, bg='white')
         btn_frame.pack(pady=10)
@@ -283,6 +296,8 @@ class GUIManager:
                 self.status_label.config(text="⏹️ Stopped", fg='#e74c3c')
                 self.start_btn.config(state='normal')
                 self.stop_btn.config(state='disabled')
+            text, color = db_status_text()
+            self.db_status_label.config(text=text, fg=color)
     
     def _schedule_status_update(self):
         """Schedule periodic status updates"""
@@ -502,8 +517,8 @@ class GUIManager:
             init_db()
             
             # Get records
-            offset = self.db_page * self.db_page_size
-            result = get_recent(limit=self.db_page_size, q=self.db_search_query or None, offset=offset)
+            result = get_page(limit=self.db_page_size, q=self.db_search_query or None,
+                              before_id=self.db_cursors[self.db_page])
             
             # Clear existing items
             for item in self.db_tree.get_children():
@@ -537,7 +552,10 @@ class GUIManager:
             
             # Enable/disable pagination buttons
             self.prev_btn.config(state='normal' if self.db_page > 0 else 'disabled')
-            self.next_btn.config(state='normal' if (self.db_page + 1) < total_pages else 'disabled')
+            self.next_btn.config(state='normal' if result['has_more'] else 'disabled')
+            del self.db_cursors[self.db_page + 1:]
+            if result['has_more']:
+                self.db_cursors.append(result['next_before_id'])
             
         except Exception as e:
             self.db_results_label.config(text=f"Error loading records: {e}")
@@ -546,6 +564,7 @@ class GUIManager:
         """Search database"""
         self.db_search_query = self.db_search_entry.get().strip()
         self.db_page = 0
+        self.db_cursors = [None]
         self._load_database_records()
     
     def _clear_search(self):
@@ -553,12 +572,14 @@ class GUIManager:
         self.db_search_entry.delete(0, 'end')
         self.db_search_query = ""
         self.db_page = 0
+        self.db_cursors = [None]
         self._load_database_records()
     
     def _next_page(self):
         """Next page"""
-        self.db_page += 1
-        self._load_database_records()
+        if self.db_page + 1 < len(self.db_cursors):
+            self.db_page += 1
+            self._load_database_records()
     
     def _prev_page(self):
         """Previous page"""
@@ -833,6 +854,7 @@ class TrayApp:
         menu = pystray.Menu(
             item('Open Control Panel', self._show_gui, default=True),
             item('Open in Browser', self._open_browser),
+            item(lambda _: db_status_text()[0], None, enabled=False),
             pystray.Menu.SEPARATOR,
             item('Start Server', self._start_server, visible=lambda _: not self.server_mgr.is_running()),
             item('Stop Server', self._stop_server, visible=lambda _: self.server_mgr.is_running()),
@@ -849,8 +871,16 @@ class TrayApp:
             menu
         )
 
+        server_app_module.circuit_listeners.append(self._on_db_circuit_change)
+
         self._start_server_with_boot_logic()
     
+    def _on_db_circuit_change(self, state):
+        """Reflect SQL Server outages in the tray tooltip and menu."""
+        if self.icon:
+            self.icon.title = "Label Print Server" if state == 'closed' else "Label Print Server - ERP database unreachable"
+            self.icon.update_menu()
+    
     def _load_icon(self):
         """Load the tray icon image"""
         icon_path = APP_DIR / 'icons' / 'app_icon.ico'
@@ -1016,53 +1046,16 @@ class TrayApp:
         if not server or not database:
             return False
 
+        # Same driver detection and connection strings as the server's lookups
+        resolver = server_app_module.conn_resolver
         try:
-            available_drivers = server_app_module.pyodbc.drivers()
-        except Exception as e:
-            print(f"Unable to inspect SQL drivers during startup: {e}")
+            conn, profile = resolver.connect(server, database, timeout=5)
+            conn.close()
+            print(f"Startup SQL check passed using {profile.driver}.")
             return True
-
-        driver_name = None
-        conn_str = None
-
-        if 'ODBC Driver 18 for SQL Server' in available_drivers:
-            driver_name = 'ODBC Driver 18 for SQL Server'
-            conn_str = (
-                f"DRIVER={{{driver_name}}};"
-                f"SERVER={server};"
-                f"DATABASE={database};"
-                f"Trusted_Connection=yes;"
-                f"TrustServerCertificate=yes;"
-                f"Connection Timeout=5;"
-            )
-        elif 'ODBC Driver 17 for SQL Server' in available_drivers:
-            driver_name = 'ODBC Driver 17 for SQL Server'
-            conn_str = (
-                f"DRIVER={{{driver_name}}};"
-                f"SERVER={server};"
-                f"DATABASE={database};"
-                f"Integrated Security=SSPI;"
-                f"Connection Timeout=5;"
-            )
-        elif 'SQL Server' in available_drivers:
-            driver_name = 'SQL Server'
-            conn_str = (
-                f"DRIVER={{{driver_name}}};"
-                f"SERVER={server};"
-                f"DATABASE={database};"
-                f"Trusted_Connection=yes;"
-                f"Connection Timeout=5;"
-            )
-
-        if not conn_str:
+        except server_app_module.NoDriverError:
             print("No SQL Server ODBC driver found during startup check. Continuing.")
             return True
-
-        try:
-            conn = server_app_module.pyodbc.connect(conn_str)
-            conn.close()
-            print(f"Startup SQL check passed using {driver_name}.")
-            return True
         except Exception as e:
             print(
                 f"Startup SQL check failed for {server}\\{database}: {e}. "
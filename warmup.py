@@ -0,0 +1,102 @@
+"""
+Background warm-up for Label Print Server.
+
+After a reboot or update the first scans of the day used to miss every cache
+and wait for the connection pool to be built. Warm-up runs a list of named
+stages (open pool connections, preload lookups, ...) on a daemon thread right
+after start, so the HTTP listener comes up immediately, and reports how far it
+has got for /health.
+
+Each stage is ``fn(progress)``; it may call ``progress(done, total)`` to
+report partial progress. A failing stage is recorded and the next one runs.
+"""
+
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger("warmup")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class WarmUp:
+    """Runs startup stages in order on a background thread."""
+
+    def __init__(self):
+        self.stages = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.started_at = None
+        self.finished_at = None
+
+    def add_stage(self, name, fn):
+        self.stages.append({
+            'name': name,
+            'fn': fn,
+            'state': PENDING,
+            'done': 0,
+            'total': None,
+            'elapsed_ms': None,
+            'error': None,
+        })
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self._run, name="WarmUp", daemon=True)
+        self.thread.start()
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _run(self):
+        for stage in self.stages:
+            def progress(done, total=None, stage=stage):
+                with self.lock:
+                    stage['done'] = done
+                    if total is not None:
+                        stage['total'] = total
+
+            with self.lock:
+                stage['state'] = RUNNING
+            start = time.time()
+            try:
+                stage['fn'](progress)
+                state, error = DONE, None
+            except Exception as e:
+                logger.warning("Warm-up stage %s failed: %s", stage['name'], e)
+                state, error = FAILED, str(e)
+            with self.lock:
+                stage['state'] = state
+                stage['error'] = error
+                stage['elapsed_ms'] = round((time.time() - start) * 1000, 2)
+        with self.lock:
+            self.finished_at = time.time()
+        logger.info("Warm-up finished in %.2fs", self.finished_at - self.started_at)
+
+    def get_status(self):
+        with self.lock:
+            stages = [{k: v for k, v in stage.items() if k != 'fn'} for stage in self.stages]
+            started_at, finished_at = self.started_at, self.finished_at
+        if started_at is None:
+            state = PENDING
+        elif finished_at is None:
+            state = RUNNING
+        else:
+            state = FAILED if any(s['state'] == FAILED for s in stages) else DONE
+        completed = sum(1 for s in stages if s['state'] in (DONE, FAILED))
+        return {
+            'state': state,
+            'stages_completed': completed,
+            'stages_total': len(stages),
+            'elapsed_ms': round(((finished_at or time.time()) - started_at) * 1000, 2) if started_at else None,
+            'stages': stages,
+        }
@@ -0,0 +1,324 @@
+"""
+Wave printing for Label Print Server.
+
+At dispatch time 50-200 quotations are printed in a row. A wave takes the
+whole list at once and works through it in the background:
+- quotations are looked up up front in batches of ``batch_size`` (one query
+  per batch), a few batches at a time on a small thread pool (bounded so a
+  wave never takes all pooled SQL Server connections)
+- labels are printed strictly in list order: item N+1 is only queued once
+  item N has finished printing, while the lookups of later batches carry on
+- an item that cannot be looked up or printed is marked failed and the wave
+  moves on to the next one
+- a cancelled wave queues no further labels; the label already queued is
+  still followed while it is printing, but not while it waits in the queue
+- an item whose job gives no result within ``print_timeout`` (or its job
+  deadline, or before stop()) is marked skipped with the job id, so a job the
+  print queue dropped never holds the wave
+- every change bumps the wave's version so /waves/<id>/events can stream
+  progress to the browser
+
+``lookup(quotations)`` returns a dict mapping each quotation to its label
+fields (party, address, phone, mobile) or to a WaveItemError that fails the
+item; an exception fails the whole batch. ``submit(quotation, fields,
+copies)`` queues a print job and returns it (see print_jobs.PrintJob: ``id``,
+``status``, ``message`` and the ``done`` event).
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger("wave_print")
+
+PENDING = "pending"
+LOOKING_UP = "looking_up"
+READY = "ready"
+PRINTING = "printing"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+RUNNING = "running"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+
+
+class WaveItemError(Exception):
+    """Fails one wave item with a user-facing message."""
+
+
+class WaveItem:
+    """One quotation of a wave."""
+
+    def __init__(self, index, quotation, copies=1):
+        self.index = index
+        self.quotation = quotation
+        self.copies = copies
+        self.status = PENDING
+        self.message = None
+        self.party = None
+        self.job_id = None
+        self.lookup_ms = None
+        self.print_ms = None
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'quotation': self.quotation,
+            'copies': self.copies,
+            'status': self.status,
+            'message': self.message,
+            'party': self.party,
+            'job_id': self.job_id,
+            'lookup_ms': self.lookup_ms,
+            'print_ms': self.print_ms,
+        }
+
+
+class Wave:
+    """A list of quotations printed in order."""
+
+    def __init__(self, items):
+        self.id = uuid.uuid4().hex[:12]
+        self.items = items
+        self.status = RUNNING
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0
+        self.cond = threading.Condition()
+
+    def changed(self):
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the wave changes after ``version``; returns the current version."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_dict(self, include_items=True):
+        counts = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        finished = counts.get(DONE, 0) + counts.get(FAILED, 0) + counts.get(SKIPPED, 0)
+        data = {
+            'wave_id': self.id,
+            'status': self.status,
+            'version': self.version,
+            'total': len(self.items),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'skipped': counts.get(SKIPPED, 0),
+            'looked_up': sum(1 for item in self.items if item.status not in (PENDING, LOOKING_UP)),
+            'progress': round(finished / len(self.items), 3) if self.items else 1.0,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'elapsed_ms': round(((self.finished_at or time.time()) - self.created_at) * 1000, 2),
+        }
+        if include_items:
+            data['items'] = [item.to_dict() for item in self.items]
+        return data
+
+
+class WaveManager:
+    """Runs waves on background threads; keeps the latest ones for status queries."""
+
+    def __init__(self, lookup, submit, lookup_workers=4, batch_size=25, print_timeout=600, max_retained=20):
+        self.lookup = lookup
+        self.submit = submit
+        self.lookup_workers = max(1, lookup_workers)
+        self.batch_size = max(1, batch_size)
+        self.print_timeout = print_timeout
+        self.stopping = threading.Event()
+        self.max_retained = max_retained
+        self.waves = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            'waves': 0,
+            'items': 0,
+            'printed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'lookup_batches': 0,
+        }
+
+    def start(self, entries):
+        """Start a wave for [(quotation, copies), ...] and return it."""
+        wave = Wave([WaveItem(i, quotation, copies) for i, (quotation, copies) in enumerate(entries)])
+        with self.lock:
+            self.waves[wave.id] = wave
+            self.stats['waves'] += 1
+            self.stats['items'] += len(wave.items)
+            self._trim()
+        threading.Thread(target=self._run, args=(wave,), name=f"Wave-{wave.id}", daemon=True).start()
+        logger.info("Wave %s started with %d quotation(s)", wave.id, len(wave.items))
+        return wave
+
+    def get(self, wave_id):
+        with self.lock:
+            return self.waves.get(wave_id)
+
+    def list_waves(self):
+        with self.lock:
+            waves = list(self.waves.values())
+        waves.reverse()
+        return waves
+
+    def cancel(self, wave_id):
+        """Stop queueing further labels; the label being printed still finishes."""
+        wave = self.get(wave_id)
+        if wave is None or wave.status != RUNNING:
+            return False
+        wave.status = CANCELLED
+        with self.lock:
+            self.stats['cancelled'] += 1
+        wave.changed()
+        return True
+
+    def stop(self):
+        """Stop following print jobs; running waves skip their remaining items."""
+        self.stopping.set()
+        for wave in self.list_waves():
+            if wave.status == RUNNING:
+                wave.status = CANCELLED
+                wave.changed()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['running'] = sum(1 for wave in self.waves.values() if wave.status == RUNNING)
+        stats['lookup_workers'] = self.lookup_workers
+        stats['batch_size'] = self.batch_size
+        return stats
+
+    def _trim(self):
+        """Forget the oldest finished waves beyond max_retained (lock held)."""
+        excess = len(self.waves) - self.max_retained
+        for wave_id in list(self.waves):
+            if excess <= 0:
+                break
+            if self.waves[wave_id].status != RUNNING:
+                del self.waves[wave_id]
+                excess -= 1
+
+    def _run(self, wave):
+        executor = ThreadPoolExecutor(max_workers=self.lookup_workers, thread_name_prefix=f"WaveLookup-{wave.id}")
+        try:
+            batches = [wave.items[i:i + self.batch_size] for i in range(0, len(wave.items), self.batch_size)]
+            futures = [executor.submit(self._lookup_batch, wave, batch) for batch in batches]
+            for batch, future in zip(batches, futures):
+                if wave.status != RUNNING:
+                    break
+                # Later batches keep looking up on the pool while this one prints
+                found = future.result()
+                for item in batch:
+                    if wave.status != RUNNING:
+                        break
+                    if item.index in found:
+                        self._print_item(wave, item, found[item.index])
+        except Exception as e:
+            logger.error("Wave %s stopped: %s", wave.id, e, exc_info=True)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for item in wave.items:
+                if item.status in (PENDING, LOOKING_UP, READY):
+                    item.status = SKIPPED
+                elif item.status == PRINTING:
+                    item.status = SKIPPED
+                    item.message = item.message or "Wave stopped while printing"
+            wave.finished_at = time.time()
+            if wave.status == RUNNING:
+                wave.status = FINISHED
+            wave.changed()
+            logger.info("Wave %s %s: %d printed, %d failed", wave.id, wave.status,
+                        sum(1 for item in wave.items if item.status == DONE),
+                        sum(1 for item in wave.items if item.status == FAILED))
+
+    def _lookup_batch(self, wave, batch):
+        """Look up a batch with one call; returns {item index: fields} for the items found."""
+        if wave.status != RUNNING:
+            return {}
+        for item in batch:
+            item.status = LOOKING_UP
+        wave.changed()
+        start = time.time()
+        try:
+            results = self.lookup([item.quotation for item in batch])
+        except Exception as e:
+            results = {item.quotation: e for item in batch}
+        lookup_ms = round((time.time() - start) * 1000, 2)
+        with self.lock:
+            self.stats['lookup_batches'] += 1
+        found = {}
+        for item in batch:
+            item.lookup_ms = lookup_ms
+            fields = results.get(item.quotation)
+            if fields is None:
+                fields = WaveItemError(f"No label fields for quotation {item.quotation}")
+            if isinstance(fields, Exception):
+                self._fail(wave, item, str(fields) or type(fields).__name__)
+                continue
+            item.party = fields.get('party')
+            item.status = READY
+            found[item.index] = fields
+        wave.changed()
+        return found
+
+    def _print_item(self, wave, item, fields):
+        item.status = PRINTING
+        start = time.time()
+        wave.changed()
+        try:
+            job = self.submit(item.quotation, fields, item.copies)
+        except Exception as e:
+            self._fail(wave, item, f"Print job failed: {e}")
+            return
+        item.job_id = job.id
+        wave.changed()
+        # In order: the next label is queued once this one has printed (retries included)
+        message = None
+        while not job.done.wait(1):
+            message = self._stop_waiting(wave, job, start)
+            if message:
+                break
+        item.print_ms = round((time.time() - start) * 1000, 2)
+        if message:
+            item.status = SKIPPED
+            item.message = message
+            wave.changed()
+            return
+        if job.status == DONE:
+            item.status = DONE
+            item.message = job.message
+            with self.lock:
+                self.stats['printed'] += 1
+            wave.changed()
+        else:
+            self._fail(wave, item, job.message)
+
+    def _stop_waiting(self, wave, job, start):
+        """Why the wave should stop waiting for an unfinished job, or None to keep waiting."""
+        if self.stopping.is_set():
+            return f"Server stopping - print job {job.id} not finished"
+        if wave.status != RUNNING and job.status != PRINTING:
+            return f"Wave cancelled - print job {job.id} is still {job.status}"
+        deadline = getattr(job, 'deadline', None)
+        if deadline is not None and deadline.expired():
+            return f"Print job {job.id} passed its deadline"
+        if self.print_timeout and time.time() - start > self.print_timeout:
+            return f"No result from print job {job.id} after {self.print_timeout}s"
+        return None
+
+    def _fail(self, wave, item, message):
+        item.status = FAILED
+        item.message = message
+        with self.lock:
+            self.stats['failed'] += 1
+        wave.changed()
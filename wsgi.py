@@ -7,7 +7,7 @@ import os
 import sys
 import logging
 from waitress import serve
-from app import app
+from app import app, Config
 
 # Configure production logging for waitress
 logging.basicConfig(
@@ -33,7 +33,7 @@ def main():
     # Get configuration from environment
     host = os.environ.get('HOST', '0.0.0.0')
     port = int(os.environ.get('PORT', 5000))
-    threads = int(os.environ.get('THREADS', 4))
+    threads = Config.THREADS  # THREADS env, sized from the bulkhead limits by default
     
     print("=" * 60)
     print("LABEL PRINT SERVER - PRODUCTION MODE")